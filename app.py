@@ -6,19 +6,22 @@ Run with: streamlit run app.py
 """
 
 import streamlit as st
-import sys
-from pathlib import Path
 import numpy as np
 from PIL import Image
 import io
-import json
-
-# Add src to path
-sys.path.append(str(Path(__file__).parent / "src"))
 
 # Import configurations and modules
-from config import UI_CONFIG, TACTILE_CONFIG, IMAGE_CONFIG, VLM_CONFIG
+from config import (UI_CONFIG, TACTILE_CONFIG, IMAGE_CONFIG, VLM_CONFIG, CACHE_CONFIG,
+                    HARDWARE_CONFIG, SERVICE_CONFIG, DEBUG)
 from src.tactile_converter import TactileImageConverter
+from src.pattern_cache import PatternCache, image_hash
+from src.actuator_scheduler import RefreshScheduler
+from src.pattern_format import matrix_hash
+from src.exporters import export_bytes, export_filename, get_exporter
+from src.pattern_renderer import render_png
+from src.instrumentation import configure_logging
+
+configure_logging()
 
 # Page Configuration
 st.set_page_config(
@@ -27,6 +30,52 @@ st.set_page_config(
     layout=UI_CONFIG["layout"]
 )
 
+@st.cache_resource
+def get_pattern_cache() -> PatternCache:
+    """Conversion cache shared by every session of this server"""
+    disk_dir = CACHE_CONFIG["disk_dir"] if CACHE_CONFIG["use_disk"] else None
+    return PatternCache(disk_dir=disk_dir)
+
+@st.cache_resource
+def get_converter(grid_size: int, use_vlm: bool) -> TactileImageConverter:
+    """One converter per configuration, shared across reruns and sessions"""
+    return TactileImageConverter(grid_size=grid_size, use_vlm=use_vlm, cache=get_pattern_cache())
+
+@st.cache_resource
+def get_vlm_handler(backend: str, api_key: str = ""):
+    """One VLM handler (event loop, limits, description cache) per backend"""
+    from src.vlm_handler import VLMHandler, create_backend
+    options = {"api_key": api_key} if backend == "openai" and api_key else {}
+    return VLMHandler(create_backend(backend, **options))
+
+@st.cache_resource
+def get_service_client():
+    """Client for a shared conversion service, when TACTILE_SERVICE_URL is set"""
+    from src.service import ServiceClient
+    return ServiceClient(SERVICE_CONFIG["url"]) if SERVICE_CONFIG["url"] else None
+
+VLM_BACKENDS = {"OpenAI GPT-4V": "openai", "Hugging Face (Local)": "huggingface"}
+
+@st.cache_resource
+def get_scheduler() -> RefreshScheduler:
+    return RefreshScheduler()
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def build_export(matrix_key: str, export_format: str, ball_diameter: float,
+                 ball_spacing: float, _matrix: np.ndarray):
+    """
+    Hardware file for a pattern, memoized per (matrix hash, format)
+    
+    _matrix is not hashed by Streamlit; matrix_key identifies it instead.
+    
+    Returns:
+        (file_content, file_name, mime_type)
+    """
+    rows, cols = _matrix.shape
+    file_content = export_bytes(_matrix, export_format,
+                                ball_diameter=ball_diameter, ball_spacing=ball_spacing)
+    return file_content, export_filename(export_format, rows, cols), get_exporter(export_format).mime
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -34,23 +83,6 @@ st.markdown("""
     font-size:20px !important;
     font-weight: bold;
 }
-.tactile-point-on {
-    display: inline-block;
-    width: 20px;
-    height: 20px;
-    border-radius: 50%;
-    background: #4CAF50;
-    margin: 2px;
-}
-.tactile-point-off {
-    display: inline-block;
-    width: 20px;
-    height: 20px;
-    border-radius: 50%;
-    background: #ddd;
-    border: 1px solid #999;
-    margin: 2px;
-}
 </style>
 """, unsafe_allow_html=True)
 
@@ -69,7 +101,7 @@ st.sidebar.header("⚙️ Configuration")
 st.sidebar.subheader("Grid Size")
 grid_size = st.sidebar.selectbox(
     "Select grid resolution:",
-    options=TACTILE_CONFIG["grid_sizes"],
+    options=TACTILE_CONFIG["grid_sizes"] + TACTILE_CONFIG["large_grid_sizes"],
     index=TACTILE_CONFIG["grid_sizes"].index(TACTILE_CONFIG["default_grid_size"]),
     help="Higher resolution = more detail but more complex hardware"
 )
@@ -102,6 +134,7 @@ use_vlm = st.sidebar.checkbox(
     help="Requires API key or GPU. Provides intelligent object extraction."
 )
 
+api_key = ""
 if use_vlm:
     vlm_backend = st.sidebar.selectbox(
         "VLM Backend:",
@@ -116,12 +149,23 @@ if use_vlm:
 else:
     vlm_backend = "None (Traditional CV)"
 
+# Cache statistics
+cache_stats = get_pattern_cache().stats()
+st.sidebar.caption(
+    f"Cache: {cache_stats['entries']} patterns | "
+    f"hit rate {cache_stats['hit_rate']:.0%} "
+    f"({cache_stats['hits'] + cache_stats['disk_hits']} hits, {cache_stats['misses']} misses)"
+)
+
+if SERVICE_CONFIG["url"]:
+    st.sidebar.caption(f"Conversion service: {SERVICE_CONFIG['url']}")
+
 # Export Format
 st.sidebar.subheader("📁 Export Format")
 export_format = st.sidebar.selectbox(
     "Hardware file format:",
-    options=["arduino", "txt", "json", "csv"],
-    index=0
+    options=HARDWARE_CONFIG["formats"],
+    index=HARDWARE_CONFIG["formats"].index(HARDWARE_CONFIG["default_format"])
 )
 
 # Main Content
@@ -148,15 +192,16 @@ with col2:
     st.subheader("👆 Tactile Pattern Preview")
     
     if uploaded_file is not None:
-        # Automatically process image if any relevant option changes or new file is uploaded
+        # Re-run the pipeline only when the image, method or VLM settings change;
+        # grid size and invert are served from the precomputed pyramid
+        # (large grids are added to it when first selected)
+        pyramid_sizes = sorted(set(TACTILE_CONFIG["grid_sizes"]) | {grid_size})
         process_needed = False
-        # Check if any relevant parameter or file has changed
         if (
             'last_uploaded_file' not in st.session_state or
+            grid_size not in st.session_state.get('pyramid', {}) or
             st.session_state.get('last_uploaded_file') != uploaded_file or
-            st.session_state.get('last_grid_size') != grid_size or
             st.session_state.get('last_processing_method') != processing_method or
-            st.session_state.get('last_invert_pattern') != invert_pattern or
             st.session_state.get('last_use_vlm') != use_vlm or
             st.session_state.get('last_vlm_backend') != vlm_backend
         ):
@@ -164,39 +209,65 @@ with col2:
 
         if process_needed:
             with st.spinner("Processing image..."):
-                # Initialize converter
-                converter = TactileImageConverter(
-                    grid_size=grid_size,
-                    use_vlm=use_vlm
-                )
+                # Reuse the shared converter for this configuration
+                converter = get_converter(grid_size, use_vlm)
                 
-                # VLM description (placeholder)
+                # Start the VLM description; it runs while the image is decoded
+                upload_bytes = uploaded_file.getvalue()
                 vlm_description = None
-                if use_vlm and vlm_backend != "None (Traditional CV)":
+                if use_vlm and vlm_backend in VLM_BACKENDS:
                     st.info("🤖 AI Analysis: Analyzing image with Vision-Language Model...")
-                    # TODO: Add actual VLM integration
-                    vlm_description = "This image contains shapes and objects."
+                    try:
+                        handler = get_vlm_handler(VLM_BACKENDS[vlm_backend], api_key)
+                        vlm_description = handler.submit(upload_bytes)
+                    except ImportError as e:
+                        st.warning(f"VLM unavailable: {e}")
                 
-                # Process image
-                matrix = converter.process_image(
-                    image,
-                    method=processing_method.lower(),
-                    invert=invert_pattern,
-                    vlm_description=vlm_description
-                )
+                # Process image at every grid size in one pass
+                # (identical uploads are served from the cache)
+                # Pass the encoded upload so large JPEGs can be draft-decoded
+                # Without a VLM description, a configured conversion service
+                # does the work (shared cache and worker pool); fall back to
+                # converting locally if it is busy, unreachable or answers
+                # with something other than patterns
+                pyramid = None
+                client = get_service_client()
+                if client is not None and vlm_description is None:
+                    try:
+                        pyramid = client.convert(upload_bytes, method=processing_method.lower(),
+                                                 grid_sizes=pyramid_sizes)
+                    except (OSError, RuntimeError, ValueError) as e:
+                        st.caption(f"Conversion service unavailable ({e}); converting locally")
+                if pyramid is None:
+                    pyramid = converter.process_pyramid(
+                        io.BytesIO(upload_bytes),
+                        method=processing_method.lower(),
+                        grid_sizes=pyramid_sizes,
+                        vlm_description=vlm_description,
+                        content_hash=image_hash(upload_bytes)
+                    )
+                
+                if vlm_description is not None:
+                    try:
+                        st.caption(f"🤖 {vlm_description.result()}")
+                    except Exception as e:
+                        st.warning(f"VLM description failed: {e}")
                 
                 # Store in session state
-                st.session_state['matrix'] = matrix
+                st.session_state['pyramid'] = pyramid
                 st.session_state['converter'] = converter
                 st.session_state['processed'] = True
                 st.session_state['last_uploaded_file'] = uploaded_file
-                st.session_state['last_grid_size'] = grid_size
                 st.session_state['last_processing_method'] = processing_method
-                st.session_state['last_invert_pattern'] = invert_pattern
                 st.session_state['last_use_vlm'] = use_vlm
                 st.session_state['last_vlm_backend'] = vlm_backend
                 st.success("✓ Conversion complete!")
 
+        # Grid size and invert changes are lookups
+        if 'pyramid' in st.session_state:
+            base = st.session_state['pyramid'][grid_size]
+            st.session_state['matrix'] = 1 - base if invert_pattern else base
+
     # Display results if processed
     if 'processed' in st.session_state and st.session_state['processed']:
         matrix = st.session_state['matrix']
@@ -205,20 +276,14 @@ with col2:
         # Visual representation
         st.markdown("**Pattern Visualization:**")
         
-        # Create visual grid
+        # Single cached image instead of one HTML element per cell
         rows, cols = matrix.shape
-        html_grid = "<div style='background:#f0f0f0; padding:10px; border-radius:5px;'>"
-        for i in range(rows):
-            html_grid += "<div>"
-            for j in range(cols):
-                if matrix[i][j] == 1:
-                    html_grid += "<span class='tactile-point-on' title='Raised'></span>"
-                else:
-                    html_grid += "<span class='tactile-point-off' title='Lowered'></span>"
-            html_grid += "</div>"
-        html_grid += "</div>"
+        st.image(render_png(matrix), caption=f"{rows}×{cols} pattern (green = raised, grey = lowered)")
         
-        st.markdown(html_grid, unsafe_allow_html=True)
+        # Stage timings (instrumentation is enabled with DEBUG=true)
+        if DEBUG:
+            with st.expander("⏱️ Stage Timings"):
+                st.json(converter.metrics.report())
         
         # Text representation
         with st.expander("📝 Text Representation"):
@@ -241,57 +306,30 @@ with col2:
         st.markdown("---")
         st.subheader("💾 Download Hardware Files")
         
-        # Generate hardware file
-        output_buffer = io.StringIO()
-        
-        if export_format == 'txt':
-            for row in matrix:
-                output_buffer.write(''.join(map(str, row)) + '\\n')
-            file_content = output_buffer.getvalue()
-            file_name = f"tactile_pattern_{grid_size}x{grid_size}.txt"
-            mime_type = "text/plain"
-            
-        elif export_format == 'arduino':
-            rows, cols = matrix.shape
-            output_buffer.write(f"// Tactile Display - {rows}×{cols}\\n")
-            output_buffer.write(f"const int ROWS = {rows};\\n")
-            output_buffer.write(f"const int COLS = {cols};\\n\\n")
-            output_buffer.write(f"const int pattern[ROWS][COLS] = {{\\n")
-            for i, row in enumerate(matrix):
-                row_str = '  {' + ', '.join(map(str, row)) + '}'
-                if i < len(matrix) - 1:
-                    row_str += ','
-                output_buffer.write(row_str + '\\n')
-            output_buffer.write("};\\n")
-            file_content = output_buffer.getvalue()
-            file_name = f"tactile_pattern_{grid_size}x{grid_size}.ino"
-            mime_type = "text/plain"
-            
-        elif export_format == 'json':
-            data = {
-                'grid_size': {'rows': int(rows), 'cols': int(cols)},
-                'pattern': matrix.tolist(),
-                'statistics': stats
-            }
-            file_content = json.dumps(data, indent=2)
-            file_name = f"tactile_pattern_{grid_size}x{grid_size}.json"
-            mime_type = "application/json"
-            
-        elif export_format == 'csv':
-            for row in matrix:
-                output_buffer.write(','.join(map(str, row)) + '\\n')
-            file_content = output_buffer.getvalue()
-            file_name = f"tactile_pattern_{grid_size}x{grid_size}.csv"
-            mime_type = "text/csv"
+        # Export bytes are only generated once the user asks for them,
+        # then memoized per (pattern, format)
+        export_key = (matrix_hash(matrix), export_format)
+        if st.session_state.get('export_key') != export_key:
+            if st.button(f"📦 Prepare {export_format.upper()} File"):
+                st.session_state['export_key'] = export_key
         
-        # Download button
-        st.download_button(
-            label=f"⬇️ Download {export_format.upper()} File",
-            data=file_content,
-            file_name=file_name,
-            mime=mime_type,
-            type="primary"
-        )
+        if st.session_state.get('export_key') == export_key:
+            file_content, file_name, mime_type = build_export(
+                export_key[0], export_format, converter.ball_diameter,
+                converter.ball_spacing, matrix)
+
+            # Download button
+            st.download_button(
+                label=f"⬇️ Download {export_format.upper()} File",
+                data=file_content,
+                file_name=file_name,
+                mime=mime_type,
+                type="primary"
+            )
+
+        # Refresh plan from a blank board under the coil/power budget
+        scheduler = get_scheduler()
+        refresh_plan = scheduler.schedule(np.zeros_like(matrix), matrix)
         
         # Additional info
         with st.expander("ℹ️ Hardware Implementation Guide"):
@@ -310,6 +348,11 @@ with col2:
             - Weight: ~{stats['display_weight_g']}g
             - Ball spacing: 3.5mm center-to-center
             
+            **Refresh Plan (from blank):**
+            - {refresh_plan.toggles} coil pulses in {len(refresh_plan.batches)} batches
+            - At most {scheduler.max_active_coils} coils energized at once
+            - Estimated refresh time: {refresh_plan.duration_ms:.0f}ms
+            
             **Next Steps:**
             1. Download the hardware file
             2. Upload to your microcontroller
@@ -369,7 +412,7 @@ with tab3:
     - Ball weight: {TACTILE_CONFIG['ball_weight_g']}g each
     
     **Grid Sizes Available:**
-    {', '.join([f"{s}×{s}" for s in TACTILE_CONFIG['grid_sizes']])}
+    {', '.join([f"{s}×{s}" for s in TACTILE_CONFIG['grid_sizes'] + TACTILE_CONFIG['large_grid_sizes']])}
     
     **Supported Image Formats:**
     {', '.join(IMAGE_CONFIG['supported_formats'])}
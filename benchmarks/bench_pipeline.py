@@ -0,0 +1,302 @@
+"""
+Conversion Pipeline Benchmarks
+Time each stage across image sizes, grid sizes, methods and export formats
+
+Run from the project root:
+    python -m benchmarks.bench_pipeline                 # full suite
+    python -m benchmarks.bench_pipeline --quick         # small sizes only
+    python -m benchmarks.bench_pipeline --compare outputs/benchmarks/old.json
+
+Every case reports latency (mean/p50/p99 ms), throughput (ops/s, and
+megapixels/s for image stages) and the peak of memory traced by
+tracemalloc during one extra run. tracemalloc sees NumPy buffers but not
+PIL's internal image memory, so peak_mem_mb is a lower bound for the
+load and PIL-backed stages.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from config import BENCHMARK_CONFIG, HARDWARE_CONFIG, IMAGE_CONFIG, PROJECT_ROOT
+from src.dithering import DITHER_METHODS, dither
+from src.instrumentation import configure_logging
+from src.tactile_converter import TactileImageConverter
+from src.utils import ensure_parent
+
+QUICK_IMAGE_SIZES = [256, 1024]
+QUICK_GRID_SIZES = [4, 32, 256]
+IMAGE_STAGES = ("load_image", "ingest", "preprocess_image")
+
+
+def synthetic_image(size: int, seed: int = 0) -> Image.Image:
+    """
+    Deterministic RGB test card: gradient background, filled shapes and thin strokes
+
+    Built in uint8 so 8K² images stay around 200 MB.
+    """
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(96, 255, size, dtype=np.float32).astype(np.uint8)
+    gray = np.maximum(ramp[:, np.newaxis], ramp[np.newaxis, ::-1])
+    image = Image.fromarray(gray, mode='L').convert('RGB')
+    del gray
+    draw = ImageDraw.Draw(image)
+    stroke = max(1, size // 512)
+    for _ in range(12):
+        x0, y0 = rng.integers(0, size * 3 // 4, 2)
+        extent = int(rng.integers(size // 16, size // 4))
+        color = tuple(int(c) for c in rng.integers(0, 120, 3))
+        if rng.random() < 0.5:
+            draw.ellipse([x0, y0, x0 + extent, y0 + extent], fill=color)
+        else:
+            draw.rectangle([x0, y0, x0 + extent, y0 + extent], outline=color, width=stroke * 3)
+    for _ in range(24):
+        x0, y0, x1, y1 = (int(v) for v in rng.integers(0, size, 4))
+        draw.line([x0, y0, x1, y1], fill=(0, 0, 0), width=stroke)
+    return image
+
+
+def measure(fn: Callable[[], object], repeats: int, max_seconds: float,
+            trace_memory: bool = True) -> Dict:
+    """
+    Time fn() after one warm-up call
+
+    Stops early once max_seconds have been spent (keeping at least 3 runs),
+    then runs fn() once more under tracemalloc for the memory peak.
+    """
+    fn()
+    samples: List[float] = []
+    budget_end = time.perf_counter() + max_seconds
+    for i in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e3)
+        if i >= 2 and time.perf_counter() > budget_end:
+            break
+
+    peak_mb = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_mb = round(peak / 2 ** 20, 3)
+
+    arr = np.asarray(samples)
+    mean_ms = float(arr.mean())
+    return {
+        "runs": len(samples),
+        "mean_ms": round(mean_ms, 4),
+        "p50_ms": round(float(np.percentile(arr, 50)), 4),
+        "p99_ms": round(float(np.percentile(arr, 99)), 4),
+        "ops_per_s": round(1e3 / mean_ms, 2) if mean_ms > 0 else None,
+        "peak_mem_mb": peak_mb,
+    }
+
+
+def case_key(record: Dict) -> str:
+    """Stable identifier used to match cases between result files"""
+    parts = [record["stage"]] + [f"{k}={record[k]}" for k in ("image", "grid", "variant")
+                                 if record.get(k) is not None]
+    return "|".join(parts)
+
+
+class PipelineBenchmark:
+    """Runs every stage for the configured sizes and collects result records"""
+
+    def __init__(self, image_sizes: List[int], grid_sizes: List[int], methods: List[str],
+                 formats: List[str], repeats: int, max_seconds: float,
+                 trace_memory: bool = True, verbose: bool = True):
+        self.image_sizes = image_sizes
+        self.grid_sizes = grid_sizes
+        self.methods = methods
+        self.formats = formats
+        self.repeats = repeats
+        self.max_seconds = max_seconds
+        self.trace_memory = trace_memory
+        self.verbose = verbose
+        self.records: List[Dict] = []
+
+    def _run(self, stage: str, fn: Callable[[], object], image: Optional[int] = None,
+             grid: Optional[int] = None, variant: Optional[str] = None):
+        record = {"stage": stage, "image": image, "grid": grid, "variant": variant}
+        try:
+            record.update(measure(fn, self.repeats, self.max_seconds, self.trace_memory))
+        except ImportError as exc:  # optional backends (e.g. OpenCV for 'adaptive')
+            record["skipped"] = str(exc)
+        if stage in IMAGE_STAGES and record.get("mean_ms"):
+            record["mpix_per_s"] = round(image * image / 1e6 / (record["mean_ms"] / 1e3), 2)
+        record["key"] = case_key(record)
+        self.records.append(record)
+        if self.verbose:
+            if "skipped" in record:
+                print(f"  {record['key']:<58} skipped ({record['skipped']})")
+            else:
+                print(f"  {record['key']:<58} p50 {record['p50_ms']:>10.3f} ms  "
+                      f"p99 {record['p99_ms']:>10.3f} ms  peak {record['peak_mem_mb']} MB")
+
+    def run(self, workdir: Path) -> List[Dict]:
+        converters = {g: TactileImageConverter(grid_size=g) for g in self.grid_sizes}
+        loader = converters[self.grid_sizes[0]]
+
+        for size in self.image_sizes:
+            if self.verbose:
+                print(f"Image {size}×{size}")
+            image = synthetic_image(size)
+            for fmt, ext, options in (("png", "png", {}), ("jpeg", "jpg", {"quality": 90})):
+                path = workdir / f"bench_{size}.{ext}"
+                image.save(path, **options)
+                self._run("load_image", lambda p=path: loader.load_image(p).load(),
+                          image=size, variant=fmt)
+                # Reduced decode for the largest benchmarked grid
+                shape = (self.grid_sizes[-1],) * 2
+                self._run("load_image",
+                          lambda p=path: loader.load_image(p, grid_size=shape).load(),
+                          image=size, variant=f"{fmt}_reduced")
+                path.unlink()
+
+            # Pixels already in memory (camera, rasterizer): used in place vs
+            # wrapped in a PIL image first
+            pixels = np.asarray(image)
+            self._run("ingest", lambda: loader.process_image(pixels), image=size, variant="array")
+            self._run("ingest", lambda: loader.process_image(Image.fromarray(pixels)),
+                      image=size, variant="pil_wrap")
+            del pixels
+
+            for method in self.methods:
+                self._run("preprocess_image",
+                          lambda m=method: loader.preprocess_image(image, method=m),
+                          image=size, variant=method)
+            binary = loader.preprocess_image(image, method=IMAGE_CONFIG["default_method"])
+            del image
+
+            for grid in self.grid_sizes:
+                if grid > size:
+                    continue
+                self._run("convert_to_grid",
+                          lambda c=converters[grid]: c.convert_to_grid(binary),
+                          image=size, grid=grid)
+            del binary
+
+        rng = np.random.default_rng(0)
+        for grid in self.grid_sizes:
+            if self.verbose:
+                print(f"Grid {grid}×{grid}")
+            converter = converters[grid]
+            matrix = (rng.random((grid, grid)) < 0.5).astype(np.uint8)
+            self._run("get_statistics", lambda: converter.get_statistics(matrix), grid=grid)
+            tone = rng.random((grid, grid), dtype=np.float32)
+            for method in DITHER_METHODS:
+                self._run("dither", lambda m=method: dither(tone, m), grid=grid, variant=method)
+            for fmt in self.formats:
+                path = workdir / f"pattern_{grid}.{fmt}"
+                self._run("generate_hardware_file",
+                          lambda f=fmt, p=path: converter.generate_hardware_file(matrix, p, f),
+                          grid=grid, variant=fmt)
+                path.unlink(missing_ok=True)
+        return self.records
+
+
+def environment() -> Dict:
+    """Machine and revision details stored with the results"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pillow": Image.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(current: List[Dict], baseline_path: Path, tolerance: float) -> int:
+    """
+    Print p50 ratios against a previous results file
+
+    Returns:
+        Number of cases slower than baseline by more than `tolerance`
+    """
+    with open(baseline_path) as f:
+        baseline = {r["key"]: r for r in json.load(f)["results"] if "p50_ms" in r}
+    regressions = 0
+    print(f"\nComparison with {baseline_path} (p50, ratio > 1 = slower)")
+    for record in current:
+        old = baseline.get(record["key"])
+        if old is None or "p50_ms" not in record or not old["p50_ms"]:
+            continue
+        ratio = record["p50_ms"] / old["p50_ms"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"  {record['key']:<58} {old['p50_ms']:>10.3f} → {record['p50_ms']:>10.3f} ms"
+              f"  ×{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the image → tactile pipeline")
+    parser.add_argument("--image-sizes", type=int, nargs="+",
+                        default=BENCHMARK_CONFIG["image_sizes"])
+    parser.add_argument("--grid-sizes", type=int, nargs="+",
+                        default=BENCHMARK_CONFIG["grid_sizes"])
+    parser.add_argument("--methods", nargs="+", default=IMAGE_CONFIG["processing_methods"])
+    parser.add_argument("--formats", nargs="+", default=HARDWARE_CONFIG["formats"])
+    parser.add_argument("--repeats", type=int, default=BENCHMARK_CONFIG["repeats"])
+    parser.add_argument("--max-seconds", type=float, default=BENCHMARK_CONFIG["max_seconds"])
+    parser.add_argument("--quick", action="store_true",
+                        help=f"images {QUICK_IMAGE_SIZES}, grids {QUICK_GRID_SIZES}")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc runs")
+    parser.add_argument("--output", type=Path, help="results JSON path")
+    parser.add_argument("--compare", type=Path, help="previous results JSON to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed p50 slowdown before a case counts as a regression")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    if args.quick:
+        args.image_sizes, args.grid_sizes = QUICK_IMAGE_SIZES, QUICK_GRID_SIZES
+
+    bench = PipelineBenchmark(sorted(args.image_sizes), sorted(args.grid_sizes), args.methods,
+                              args.formats, args.repeats, args.max_seconds,
+                              trace_memory=not args.no_memory)
+    with tempfile.TemporaryDirectory() as workdir:
+        records = bench.run(Path(workdir))
+
+    output = args.output
+    if output is None:
+        output = BENCHMARK_CONFIG["output_dir"] / f"bench_{datetime.now():%Y%m%d_%H%M%S}.json"
+    ensure_parent(output)
+    settings = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+    with open(output, "w") as f:
+        json.dump({"environment": environment(), "settings": settings, "results": records},
+                  f, indent=2, default=str)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        return 1 if compare(records, args.compare, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
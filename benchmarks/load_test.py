@@ -0,0 +1,151 @@
+"""
+Conversion Service Load Test
+Throughput and latency percentiles of src/service.py under concurrent clients
+
+Run from the project root:
+    python -m benchmarks.load_test                          # in-process server
+    python -m benchmarks.load_test --concurrency 1 8 32 --requests 200
+    python -m benchmarks.load_test --url http://127.0.0.1:8765
+
+Each level sends --requests conversions from that many client threads.
+A --repeat fraction of requests reuse one of a few popular images (these
+exercise coalescing and the cache); the rest are unique images. Requests
+rejected with 503 are counted, not retried.
+"""
+
+import argparse
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.bench_pipeline import environment, synthetic_image
+from config import BENCHMARK_CONFIG, SERVICE_CONFIG
+from src.instrumentation import configure_logging
+from src.service import ConversionServer, ConversionService, ServiceBusy, ServiceClient
+from src.utils import ensure_parent
+
+POPULAR_IMAGES = 4
+
+
+def encode_images(count: int, size: int, seed: int) -> List[bytes]:
+    """PNG-encoded synthetic images"""
+    images = []
+    for i in range(count):
+        buffer = io.BytesIO()
+        synthetic_image(size, seed=seed + i).save(buffer, format='PNG')
+        images.append(buffer.getvalue())
+    return images
+
+
+def run_level(client: ServiceClient, payloads: List[bytes], concurrency: int,
+              grid_sizes: List[int], method: str) -> Dict:
+    """Send every payload from `concurrency` threads; latency stats for successes"""
+    latencies: List[float] = []
+    outcomes = {"ok": 0, "busy": 0, "error": 0}
+    lock = threading.Lock()
+
+    def send(data: bytes):
+        start = time.perf_counter()
+        try:
+            client.convert(data, method=method, grid_sizes=grid_sizes)
+            outcome = "ok"
+        except ServiceBusy:
+            outcome = "busy"
+        except Exception:
+            outcome = "error"
+        elapsed = (time.perf_counter() - start) * 1e3
+        with lock:
+            outcomes[outcome] += 1
+            if outcome == "ok":
+                latencies.append(elapsed)
+
+    before = client.stats()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, payloads))
+    wall = time.perf_counter() - start
+    after = client.stats()
+
+    record = {"concurrency": concurrency, "requests": len(payloads), **outcomes,
+              "wall_s": round(wall, 3), "throughput_rps": round(outcomes["ok"] / wall, 2)}
+    if latencies:
+        samples = np.array(latencies)
+        record.update({f"p{q}_ms": round(float(np.percentile(samples, q)), 2)
+                       for q in (50, 95, 99)})
+        record["mean_ms"] = round(float(samples.mean()), 2)
+    for counter in ("coalesced", "cache_hits", "rejected", "timeouts"):
+        record[counter] = after.get(counter, 0) - before.get(counter, 0)
+    return record
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the conversion service")
+    parser.add_argument("--url", help="existing service (default: start one in-process)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=128, help="requests per level")
+    parser.add_argument("--image-size", type=int, default=1024)
+    parser.add_argument("--grid-sizes", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--method", default="threshold")
+    parser.add_argument("--repeat", type=float, default=0.25,
+                        help=f"fraction of requests reusing one of {POPULAR_IMAGES} images")
+    parser.add_argument("--workers", type=int, default=SERVICE_CONFIG["workers"])
+    parser.add_argument("--max-queue", type=int, default=SERVICE_CONFIG["max_queue"])
+    parser.add_argument("--output", type=Path, help="results JSON path")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    server = None
+    if args.url:
+        client = ServiceClient(args.url)
+    else:
+        service = ConversionService(workers=args.workers, max_queue=args.max_queue)
+        server = ConversionServer(("127.0.0.1", 0), service)
+        server.start()
+        client = ServiceClient(server.url)
+    print(f"Target {client.url}: {client.health()}")
+
+    rng = np.random.default_rng(0)
+    popular = encode_images(POPULAR_IMAGES, args.image_size, seed=0)
+    records = []
+    try:
+        for level, concurrency in enumerate(args.concurrency):
+            repeats = rng.random(args.requests) < args.repeat
+            # Unique images get fresh seeds per level so earlier levels never warm the cache
+            unique = iter(encode_images(int((~repeats).sum()), args.image_size,
+                                        seed=1000 * (level + 1)))
+            payloads = [popular[rng.integers(POPULAR_IMAGES)] if r else next(unique)
+                        for r in repeats]
+            record = run_level(client, payloads, concurrency, args.grid_sizes, args.method)
+            records.append(record)
+            print(f"  c={concurrency:<4} {record['throughput_rps']:>8.1f} req/s  "
+                  f"p50 {record.get('p50_ms', 0):>8.1f}  p95 {record.get('p95_ms', 0):>8.1f}  "
+                  f"p99 {record.get('p99_ms', 0):>8.1f} ms  503s {record['busy']:>4}  "
+                  f"coalesced {record['coalesced']:>4}  cached {record['cache_hits']:>4}")
+        server_stats = client.stats()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    output = args.output
+    if output is None:
+        output = BENCHMARK_CONFIG["output_dir"] / f"load_{datetime.now():%Y%m%d_%H%M%S}.json"
+    ensure_parent(output)
+    settings = {k: v for k, v in vars(args).items() if k != "output"}
+    with open(output, "w") as f:
+        json.dump({"environment": environment(), "settings": settings, "results": records,
+                   "server": server_stats}, f, indent=2, default=str)
+    print(f"\nResults written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
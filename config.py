@@ -12,34 +12,76 @@ ASSETS_DIR = PROJECT_ROOT / "assets"
 OUTPUTS_DIR = PROJECT_ROOT / "outputs"
 MODELS_DIR = PROJECT_ROOT / "models"
 
-# Create directories if they don't exist
-ASSETS_DIR.mkdir(parents=True, exist_ok=True)
-OUTPUTS_DIR.mkdir(parents=True, exist_ok=True)
-(OUTPUTS_DIR / "patterns").mkdir(parents=True, exist_ok=True)
-(OUTPUTS_DIR / "hardware_files").mkdir(parents=True, exist_ok=True)
+# Directories are created on first write (src.utils.ensure_dir), not at import
+PATTERNS_DIR = OUTPUTS_DIR / "patterns"
+HARDWARE_FILES_DIR = OUTPUTS_DIR / "hardware_files"
 
 # Tactile Display Settings
 TACTILE_CONFIG = {
     "ball_diameter_mm": 3.0,
     "ball_spacing_mm": 3.5,
     "grid_sizes": [4, 8, 16, 32],  # Powers of 2
+    "large_grid_sizes": [64, 128, 256],  # High-density pin boards (converted on demand)
     "default_grid_size": 4,
     "ball_weight_g": 0.11,  # Weight of 3mm steel ball
 }
 
+# Tiled Conversion Settings (see src/tiling.py)
+TILING_CONFIG = {
+    "tile_shape": (32, 32),  # Cells per physical display module (rows, cols)
+    "workers": None,  # Threads converting/exporting tiles (None = CPU count)
+}
+
 # Image Processing Settings
 IMAGE_CONFIG = {
     "max_upload_size_mb": 10,
     "supported_formats": ["png", "jpg", "jpeg", "bmp", "tiff"],
-    "processing_methods": ["edge", "threshold", "high_contrast", "adaptive"],
+    "processing_methods": ["edge", "threshold", "high_contrast", "adaptive",
+                           "bayer", "floyd_steinberg", "atkinson"],
     "default_method": "threshold",
+    # Binarization defaults per method (cutoff and contrast factor)
+    "method_params": {
+        "edge": {"threshold": 20, "contrast": 2.0},
+        "threshold": {"threshold": 200, "contrast": 1.0},
+        "high_contrast": {"threshold": 200, "contrast": 2.5},
+        "adaptive": {"threshold": 200, "contrast": 1.0},
+        # Dithering works on per-cell tone at grid resolution; threshold is unused
+        "bayer": {"threshold": 128, "contrast": 1.0},
+        "floyd_steinberg": {"threshold": 128, "contrast": 1.0},
+        "atkinson": {"threshold": 128, "contrast": 1.0},
+    },
+    "bayer_size": 4,  # Ordered-dither matrix (2, 4 or 8)
+    # Grid downsampling: "area" (per-cell coverage) or "lanczos" (legacy resize)
+    "downsample_mode": "area",
+    "coverage_threshold": 0.5,  # Raise a cell when its dark coverage exceeds this
+    "prereduce_factor": 0,  # >0: area-shrink to grid × factor before binarizing
+    # Reduced-resolution decode (JPEG draft mode, Image.reduce) for a known target grid
+    "reduced_decode": True,
+    "decode_min_cell_px": 8,  # Never shrink below this many pixels per cell
+    "decode_max_reduce": 4,  # Cap: a 1-px black stroke averaged 4× stays darker than 200
+}
+
+# Viewport (crop/pan/zoom) Settings (see src/viewport.py)
+VIEWPORT_CONFIG = {
+    "max_pixels": 16_000_000,  # Larger sources are reduced before building the integral image
+    "max_views": 64,  # Recent viewports kept (LRU)
 }
 
 # VLM (Vision-Language Model) Settings
 VLM_CONFIG = {
-    # Choose VLM backend: "openai", "huggingface", "local", "none"
+    # Choose VLM backend: "openai", "huggingface", "local", "fake", "none"
     "backend": "none",  # Start with none, upgrade to openai or huggingface later
     
+    # Request handling (see src/vlm_handler.py)
+    "max_concurrency": 4,  # Backend calls in flight at once
+    "timeout_s": 60.0,  # Per backend call
+    "retries": 3,  # Extra attempts after a timeout or transient error
+    "backoff_s": 0.5,  # Base of the exponential backoff between attempts
+    "batch_size": 8,  # Images per call for batching backends (Hugging Face)
+    "batch_window_ms": 25,  # How long to wait for a batch to fill
+    "max_image_side": 768,  # Images are downscaled to this before sending
+    "cache_path": OUTPUTS_DIR / "cache" / "vlm_descriptions.jsonl",
+    
     # OpenAI Settings (if using GPT-4V)
     "openai": {
         "model": "gpt-4-vision-preview",
@@ -55,6 +97,11 @@ VLM_CONFIG = {
         "max_new_tokens": 200,
     },
     
+    # Deterministic offline backend for tests and demos
+    "fake": {
+        "latency_s": 0.0,
+    },
+    
     # VLM Prompts
     "prompts": {
         "describe": "Describe the main objects and shapes in this image in simple terms.",
@@ -63,6 +110,23 @@ VLM_CONFIG = {
     }
 }
 
+# Conversion Result Cache
+CACHE_CONFIG = {
+    "max_entries": 1024,  # In-memory LRU entries
+    "max_bytes": 64 * 1024 * 1024,  # In-memory LRU size limit
+    "use_disk": False,  # Persist matrices under disk_dir as well
+    "disk_dir": OUTPUTS_DIR / "cache",
+    "max_disk_bytes": 512 * 1024 * 1024,
+}
+
+# Pattern Library Settings (see src/pattern_library.py)
+PATTERN_LIBRARY_CONFIG = {
+    "path": OUTPUTS_DIR / "library",
+    "scan_chunk": 65536,  # Codes compared per vectorized step in a full scan
+    # Multi-index candidates above this fraction of the library fall back to a scan
+    "max_candidate_fraction": 0.25,
+}
+
 # Streamlit UI Settings
 UI_CONFIG = {
     "page_title": "AI Visual Accessibility - Tactile Graphics",
@@ -73,14 +137,73 @@ UI_CONFIG = {
         "backgroundColor": "#FFFFFF",
         "secondaryBackgroundColor": "#F0F2F6",
         "textColor": "#262730",
-    }
+    },
+    # Pattern preview image (see src/pattern_renderer.py)
+    "preview": {
+        "cell_px": 24,  # Sprite size for small grids
+        "min_cell_px": 4,  # Floor for very large grids
+        "max_px": 768,  # Target preview width/height
+        "margin_px": 2,
+        "border_px": 1,
+        "background": "#f0f0f0",
+        "raised": "#4CAF50",
+        "lowered": "#dddddd",
+        "border": "#999999",
+    },
 }
 
 # Hardware Export Settings
 HARDWARE_CONFIG = {
-    "formats": ["txt", "arduino", "json", "csv"],
+    "formats": ["txt", "arduino", "json", "csv", "arduino_packed", "bin"],
     "default_format": "arduino",
     "microcontrollers": ["Arduino Mega", "ESP32", "Raspberry Pi Pico"],
+    # Actuator power budget and timing (see src/actuator_scheduler.py)
+    "supply_current_a": 5.0,  # 12V supply rating
+    "coil_current_a": 0.25,  # Current drawn by one energized coil
+    "max_active_coils": None,  # None = derive from supply/coil current
+    "pulse_ms": 20.0,  # Energize time per batch
+    "settle_ms": 5.0,  # Dead time between batches
+    "row_scan": False,  # Restrict each batch to one row (multiplexed drivers)
+    "sequence_keyframe_interval": 32,  # Frames between full keyframes in .tseq files
+}
+
+# Serial Device Settings (see src/device_driver.py)
+DEVICE_CONFIG = {
+    "baudrate": 115200,
+    "window": 8,  # Messages in flight before waiting for ACKs
+    "ack_timeout_s": 2.0,  # Must exceed a full refresh (ACKs follow actuation)
+    "retries": 3,
+}
+
+# Command-Line Converter Settings (see src/cli.py)
+CLI_CONFIG = {
+    "output_dir": HARDWARE_FILES_DIR,
+    "manifest_name": ".tactile_manifest.json",  # Stored in the output directory
+    "watch_dir": ASSETS_DIR,
+    "watch_interval_s": 2.0,  # Polling period in watch mode
+    "settle_s": 1.0,  # Ignore files modified more recently (still being written)
+    "manifest_flush_every": 500,  # Save the manifest after this many conversions
+}
+
+# Conversion Service Settings (see src/service.py)
+SERVICE_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "workers": None,  # Conversion threads (None = CPU count)
+    "max_queue": 32,  # Requests waiting for a worker before answering 503
+    "request_timeout_s": 30.0,  # Server gives up waiting on a conversion (504)
+    # Set TACTILE_SERVICE_URL (e.g. http://127.0.0.1:8765) to make app.py use the service
+    "url": os.getenv("TACTILE_SERVICE_URL", ""),
+    "client_timeout_s": 60.0,
+}
+
+# Benchmark Suite Settings (see benchmarks/bench_pipeline.py)
+BENCHMARK_CONFIG = {
+    "image_sizes": [256, 1024, 2048, 4096, 8192],  # Square synthetic images (px)
+    "grid_sizes": [4, 8, 16, 32, 64, 128, 256],
+    "repeats": 20,  # Timed runs per case (after one warm-up)
+    "max_seconds": 5.0,  # Stop repeating a case after this long (min 3 runs)
+    "output_dir": OUTPUTS_DIR / "benchmarks",
 }
 
 # Development Settings
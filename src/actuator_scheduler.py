@@ -0,0 +1,183 @@
+"""
+Actuator Refresh Scheduler
+Plan power-limited batches of coil pulses to move the display between patterns
+"""
+
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+from config import HARDWARE_CONFIG, TACTILE_CONFIG
+
+
+class ActuatorBatch(NamedTuple):
+    """Coils energized together in one pulse"""
+    cells: np.ndarray  # (k, 2) array of (row, col)
+    state: int         # 1 = raise, 0 = lower
+
+
+class RefreshSchedule(NamedTuple):
+    """Ordered batches plus the timing they imply"""
+    batches: List[ActuatorBatch]
+    toggles: int
+    duration_ms: float
+
+    @property
+    def peak_coils(self) -> int:
+        return max((len(b.cells) for b in self.batches), default=0)
+
+
+def max_coils_for_budget(supply_current_a: float, coil_current_a: float) -> int:
+    """Largest number of coils the supply can hold energized at once"""
+    return max(1, int(supply_current_a // coil_current_a))
+
+
+class RefreshScheduler:
+    """
+    Turn (current, target) matrices into batches of actuator toggles
+
+    Only cells that differ are pulsed. Every batch stays under
+    max_active_coils, and batches never mix raise and lower pulses (the
+    drivers switch polarity per pulse). Under those rules the schedule is
+    optimal: each polarity gets exactly ceil(n / limit) pulses. With
+    row_scan=True a batch is also confined to one row, for
+    row/column-multiplexed drivers.
+    """
+
+    def __init__(self, max_active_coils: Optional[int] = None,
+                 pulse_ms: Optional[float] = None, settle_ms: Optional[float] = None,
+                 row_scan: Optional[bool] = None):
+        """
+        Args:
+            max_active_coils: coil limit per batch (defaults to the power budget)
+            pulse_ms: how long each batch is energized
+            settle_ms: dead time between batches
+            row_scan: restrict every batch to a single row
+        """
+        if max_active_coils is None:
+            max_active_coils = HARDWARE_CONFIG["max_active_coils"] or max_coils_for_budget(
+                HARDWARE_CONFIG["supply_current_a"], HARDWARE_CONFIG["coil_current_a"])
+        self.max_active_coils = int(max_active_coils)
+        self.pulse_ms = HARDWARE_CONFIG["pulse_ms"] if pulse_ms is None else pulse_ms
+        self.settle_ms = HARDWARE_CONFIG["settle_ms"] if settle_ms is None else settle_ms
+        self.row_scan = HARDWARE_CONFIG["row_scan"] if row_scan is None else row_scan
+        if self.max_active_coils < 1:
+            raise ValueError("max_active_coils must be at least 1")
+
+    def batch_time_ms(self, n_batches: int) -> float:
+        """Refresh time for a number of batches"""
+        if n_batches == 0:
+            return 0.0
+        return n_batches * self.pulse_ms + (n_batches - 1) * self.settle_ms
+
+    def _split(self, cells: np.ndarray, state: int) -> Iterable[ActuatorBatch]:
+        if self.row_scan:
+            rows = np.flatnonzero(np.diff(cells[:, 0])) + 1
+            groups = np.split(cells, rows)
+        else:
+            groups = [cells]
+        limit = self.max_active_coils
+        for group in groups:
+            for start in range(0, len(group), limit):
+                yield ActuatorBatch(group[start:start + limit], state)
+
+    def schedule(self, current: np.ndarray, target: np.ndarray) -> RefreshSchedule:
+        """
+        Plan the pulses that turn `current` into `target`
+
+        Lowering pulses come first so the raise pulses never add to a
+        crowded board. Cells inside each polarity are row-major.
+
+        Returns:
+            RefreshSchedule with batches in execution order
+        """
+        current = np.asarray(current)
+        target = np.asarray(target)
+        if current.shape != target.shape:
+            raise ValueError(f"Shape mismatch: {current.shape} vs {target.shape}")
+
+        diff = current != target
+        batches: List[ActuatorBatch] = []
+        for state in (0, 1):
+            cells = np.argwhere(diff & (target == state))
+            batches.extend(self._split(cells, state))
+
+        toggles = int(diff.sum())
+        return RefreshSchedule(batches, toggles, self.batch_time_ms(len(batches)))
+
+
+class RefreshSimulator:
+    """
+    Pure-Python model of the display used to benchmark refresh latency
+
+    Applies each batch to a simulated board, checks the coil/current budget
+    and that the board ends in the target state.
+    """
+
+    def __init__(self, scheduler: Optional[RefreshScheduler] = None,
+                 coil_current_a: Optional[float] = None,
+                 supply_current_a: Optional[float] = None):
+        self.scheduler = scheduler or RefreshScheduler()
+        self.coil_current_a = coil_current_a or HARDWARE_CONFIG["coil_current_a"]
+        self.supply_current_a = supply_current_a or HARDWARE_CONFIG["supply_current_a"]
+
+    def run(self, current: np.ndarray, target: np.ndarray) -> Dict:
+        """Schedule and simulate one refresh"""
+        t0 = time.perf_counter()
+        plan = self.scheduler.schedule(current, target)
+        plan_ms = (time.perf_counter() - t0) * 1e3
+
+        board = np.array(current, copy=True)
+        peak_current = 0.0
+        for batch in plan.batches:
+            load = len(batch.cells) * self.coil_current_a
+            if load > self.supply_current_a + 1e-9:
+                raise RuntimeError(f"Batch draws {load:.2f}A, supply is {self.supply_current_a}A")
+            peak_current = max(peak_current, load)
+            board[batch.cells[:, 0], batch.cells[:, 1]] = batch.state
+        if not np.array_equal(board, target):
+            raise RuntimeError("Simulated board does not match target pattern")
+
+        # Naive full rewrite: every raised cell energized in one pulse
+        naive_current = float(np.sum(target)) * self.coil_current_a
+        return {
+            "grid_size": f"{board.shape[0]}×{board.shape[1]}",
+            "toggles": plan.toggles,
+            "batches": len(plan.batches),
+            "refresh_ms": round(plan.duration_ms, 2),
+            "peak_current_a": round(peak_current, 3),
+            "naive_peak_current_a": round(naive_current, 3),
+            "plan_ms": round(plan_ms, 3),
+        }
+
+    def benchmark(self, grid_sizes: Optional[Iterable[int]] = None, trials: int = 20,
+                  density: float = 0.5, seed: int = 0) -> List[Dict]:
+        """
+        Average refresh latency between random patterns for each grid size
+
+        Args:
+            grid_sizes: square grid sizes (defaults to TACTILE_CONFIG)
+            trials: random refreshes per size
+            density: probability that a cell is raised
+            seed: RNG seed for repeatable runs
+        """
+        rng = np.random.default_rng(seed)
+        results = []
+        for size in grid_sizes or TACTILE_CONFIG["grid_sizes"]:
+            board = np.zeros((size, size), dtype=int)
+            runs = []
+            for _ in range(trials):
+                target = (rng.random((size, size)) < density).astype(int)
+                runs.append(self.run(board, target))
+                board = target
+            results.append({
+                "grid_size": f"{size}×{size}",
+                "mean_toggles": round(float(np.mean([r["toggles"] for r in runs])), 1),
+                "mean_batches": round(float(np.mean([r["batches"] for r in runs])), 1),
+                "mean_refresh_ms": round(float(np.mean([r["refresh_ms"] for r in runs])), 2),
+                "max_refresh_ms": max(r["refresh_ms"] for r in runs),
+                "peak_current_a": max(r["peak_current_a"] for r in runs),
+                "mean_plan_ms": round(float(np.mean([r["plan_ms"] for r in runs])), 3),
+            })
+        return results
@@ -0,0 +1,149 @@
+"""
+Batch Conversion
+Spread image decoding and conversion over a process pool
+"""
+
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class BatchResult(NamedTuple):
+    """Outcome of converting one batch item"""
+    index: int
+    source: str
+    matrix: Optional[np.ndarray]
+    error: Optional[str] = None
+    stat: Optional[os.stat_result] = None  # Path inputs: the source as converted
+    content_hash: Optional[str] = None     # image_hash() of the bytes converted
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# Per-worker converter, built once by the pool initializer
+_worker_converter = None
+
+
+def _init_worker(settings: Dict):
+    global _worker_converter
+    from src.tactile_converter import TactileImageConverter
+    _worker_converter = TactileImageConverter(**settings)
+
+
+def _describe(item) -> str:
+    if isinstance(item, (str, os.PathLike)):
+        return os.fspath(item)
+    return f"<{type(item).__name__}>"
+
+
+def _convert_one(index: int, item, options: Dict) -> BatchResult:
+    """Convert one input, capturing its error"""
+    try:
+        if not isinstance(item, (str, os.PathLike)):
+            return BatchResult(index, _describe(item),
+                               _worker_converter.process_image(item, **options))
+        from src.pattern_cache import image_hash
+
+        # Stat, hash and decode from one read, so the result describes exactly
+        # the contents that were converted even if the file changes meanwhile
+        stat = os.stat(item)
+        with open(item, 'rb') as f:
+            data = f.read()
+        content_hash = image_hash(data)
+        matrix = _worker_converter.process_image(data, content_hash=content_hash, **options)
+        return BatchResult(index, _describe(item), matrix, None, stat, content_hash)
+    except Exception as exc:
+        return BatchResult(index, _describe(item), None, f"{type(exc).__name__}: {exc}")
+
+
+def _convert_chunk(chunk: Sequence[Tuple[int, object]], options: Dict) -> List[BatchResult]:
+    """Convert a chunk of (index, input) pairs, capturing per-item errors"""
+    return [_convert_one(index, item, options) for index, item in chunk]
+
+
+def _chunks(items: List[Tuple[int, object]], size: int) -> Iterator[List[Tuple[int, object]]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _failed(chunk: Sequence[Tuple[int, object]], error: str) -> List[BatchResult]:
+    return [BatchResult(index, _describe(item), None, error) for index, item in chunk]
+
+
+def iter_batch(inputs: Iterable, settings: Dict, workers: Optional[int] = None,
+               chunksize: Optional[int] = None, **options) -> Iterator[BatchResult]:
+    """
+    Convert many images, yielding results as they complete
+
+    A worker process that dies (crash, OOM kill) fails only the tasks in
+    flight at the time; the pool is rebuilt for the rest of the batch.
+
+    Args:
+        inputs: image paths or PIL Images (must be picklable)
+        settings: TactileImageConverter constructor arguments for the workers
+        workers: process count (None = all cores, <= 1 = run in this process)
+        chunksize: items per task (None = 1); a chunk's results arrive together
+        **options: forwarded to process_image (method, invert, ...)
+
+    Yields:
+        BatchResult per input, in completion order
+    """
+    items = list(enumerate(inputs))
+    if not items:
+        return
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(items))
+
+    if workers <= 1:
+        _init_worker(settings)
+        for index, item in items:
+            yield _convert_one(index, item, options)
+        return
+
+    pending = deque(_chunks(items, chunksize or 1))
+    while pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(settings,)) as pool:
+            # A bounded window keeps a dead worker's collateral to the tasks
+            # already handed to the pool
+            in_flight: Dict = {}
+            broken = False
+            while not broken and (pending or in_flight):
+                while pending and len(in_flight) < 2 * workers:
+                    chunk = pending.popleft()
+                    in_flight[pool.submit(_convert_chunk, chunk, options)] = chunk
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = in_flight.pop(future)
+                    try:
+                        yield from future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        yield from _failed(chunk, "BrokenProcessPool: worker process died")
+            # Once the pool breaks, every task still in it fails the same way
+            for future, chunk in in_flight.items():
+                try:
+                    yield from future.result()
+                except BrokenProcessPool:
+                    yield from _failed(chunk, "BrokenProcessPool: worker process died")
+
+
+def process_batch(inputs: Iterable, settings: Dict, workers: Optional[int] = None,
+                  chunksize: Optional[int] = None, **options) -> List[BatchResult]:
+    """
+    Convert many images and return results in input order
+
+    Failed items carry an error message and a None matrix; they never stop
+    the rest of the batch.
+    """
+    results = list(iter_batch(inputs, settings, workers=workers,
+                              chunksize=chunksize, **options))
+    results.sort(key=lambda r: r.index)
+    return results
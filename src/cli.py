@@ -0,0 +1,333 @@
+"""
+Command-Line Converter
+Batch-convert files, directories or globs to hardware files, incrementally
+
+Usage:
+    python -m src.cli convert assets/ "photos/**/*.jpg" -f arduino bin -g 32
+    python -m src.cli watch                      # follow ASSETS_DIR
+    python -m src.cli watch incoming/ -o out/ -f bin --interval 5
+    python -m src.cli library add outputs/patterns/      # .bin files and images
+    python -m src.cli library find icon.png -k 5
+
+Outputs go to <output_dir>/<path relative to the input root>/<stem>_<R>x<C><suffix>
+(<stem>_r<i>c<j>_<R>x<C><suffix> per module with --tile).
+A manifest in the output directory records each source's mtime, size and
+content hash, so reruns only convert new or changed images.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import CLI_CONFIG, IMAGE_CONFIG, TACTILE_CONFIG
+from src.instrumentation import configure_logging, log_event
+from src.manifest import ConversionManifest
+from src.pattern_cache import make_key
+from src.tiling import TileLayout, grid_shape
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {f".{ext.lower()}" for ext in IMAGE_CONFIG["supported_formats"]}
+
+
+def is_image(path: Path) -> bool:
+    return path.suffix.lower() in IMAGE_EXTENSIONS
+
+
+def expand_inputs(specs: Sequence[str], recursive: bool = True,
+                  match: Callable[[Path], bool] = is_image) -> List[Tuple[Path, Path]]:
+    """
+    Resolve files, directories and glob patterns to image files
+
+    Args:
+        match: which files directories and globs contribute
+
+    Returns:
+        Sorted, de-duplicated (file, root) pairs; outputs mirror the file's
+        path relative to root
+    """
+    found: Dict[Path, Path] = {}
+    for spec in specs:
+        path = Path(spec)
+        if path.is_dir():
+            walker = path.rglob('*') if recursive else path.glob('*')
+            for f in walker:
+                if f.is_file() and match(f):
+                    found.setdefault(f, path)
+        elif path.is_file():
+            found.setdefault(path, path.parent)
+        elif glob.has_magic(spec):
+            root = Path(spec.split('*')[0].split('?')[0].split('[')[0] or '.')
+            root = root if root.is_dir() else root.parent
+            for name in glob.iglob(spec, recursive=True):
+                f = Path(name)
+                if f.is_file() and match(f):
+                    found.setdefault(f, root)
+        else:
+            log_event(logger, logging.WARNING, "input_not_found", path=spec)
+    return sorted(found.items())
+
+
+class BatchConverter:
+    """
+    Incremental, parallel conversion of image files to export formats
+
+    Conversion runs on worker processes (TactileImageConverter.iter_batch);
+    export and manifest updates stay in this process.
+    """
+
+    def __init__(self, output_dir: Path, formats: Sequence[str], grid_size: Tuple[int, int],
+                 method: str = 'threshold', invert: bool = False,
+                 threshold: Optional[int] = None, contrast: Optional[float] = None,
+                 workers: Optional[int] = None, force: bool = False,
+                 tile_shape: Optional[Tuple[int, int]] = None):
+        from src.exporters import get_exporter
+        from src.tactile_converter import TactileImageConverter
+
+        for fmt in formats:
+            get_exporter(fmt)  # Fail fast on unknown formats
+        self.output_dir = Path(output_dir)
+        self.formats = list(formats)
+        self.converter = TactileImageConverter(grid_size=grid_size)
+        self.options = dict(method=method, invert=invert, threshold=threshold,
+                            contrast=contrast)
+        self.workers = workers
+        self.force = force
+        self.layout = TileLayout(grid_size, tile_shape) if tile_shape else None
+        self.manifest = ConversionManifest(self.output_dir / CLI_CONFIG["manifest_name"])
+        self.settings_key = make_key("cli", {**self.converter.settings(), **self.options,
+                                             "formats": self.formats,
+                                             "tile_shape": tile_shape})
+
+    def output_paths(self, source: Path, root: Path) -> List[Path]:
+        from src.exporters import export_filename
+
+        try:
+            relative = source.parent.relative_to(root)
+        except ValueError:
+            relative = Path()
+        if self.layout is None:
+            rows, cols = self.converter.grid_size
+            return [self.output_dir / relative / export_filename(fmt, rows, cols,
+                                                                 stem=source.stem)
+                    for fmt in self.formats]
+        # One file per module and format, in layout order
+        return [self.output_dir / relative / export_filename(fmt, *tile.shape,
+                                                             stem=f"{source.stem}_{tile.name}")
+                for tile in self.layout for fmt in self.formats]
+
+    def pending(self, inputs: Sequence[Tuple[Path, Path]]) -> Iterator[Tuple[Path, Path]]:
+        """Inputs whose outputs are missing or stale"""
+        for source, root in inputs:
+            if self.force or not self.manifest.is_current(source, self.settings_key):
+                yield source, root
+
+    def run(self, inputs: Sequence[Tuple[Path, Path]], verbose: bool = False) -> Dict:
+        """
+        Convert every stale input
+
+        Returns:
+            Summary counts and elapsed seconds
+        """
+        from src.exporters import export_patterns
+
+        start = time.perf_counter()
+        todo = list(self.pending(inputs))
+        roots = dict(todo)
+        converted = failed = 0
+        flush_every = CLI_CONFIG["manifest_flush_every"]
+
+        if todo:
+            sources = [os.fspath(source) for source, _ in todo]
+            results = self.converter.iter_batch(sources, workers=self.workers, **self.options)
+            for result in results:
+                source = Path(result.source)
+                if not result.ok:
+                    failed += 1
+                    log_event(logger, logging.ERROR, "convert_failed", path=source,
+                              error=result.error)
+                    continue
+                outputs = self.output_paths(source, roots[source])
+                parts = ([part for _, part in self.layout.split(result.matrix)]
+                         if self.layout else [result.matrix])
+                jobs = [(fmt, part) for part in parts for fmt in self.formats]
+                for (fmt, matrix), path in zip(jobs, outputs):
+                    export_patterns(path, matrix, fmt,
+                                    ball_diameter=self.converter.ball_diameter,
+                                    ball_spacing=self.converter.ball_spacing)
+                self.manifest.record(source, self.settings_key, outputs,
+                                     content_hash=result.content_hash, stat=result.stat)
+                converted += 1
+                if verbose:
+                    print(f"✓ {source} → {', '.join(p.name for p in outputs)}")
+                if converted % flush_every == 0:
+                    self.manifest.save()
+        self.manifest.save()
+
+        return {"inputs": len(inputs), "converted": converted, "failed": failed,
+                "skipped": len(inputs) - len(todo),
+                "seconds": round(time.perf_counter() - start, 3)}
+
+
+def watch(batch: BatchConverter, directory: Path, interval: float, settle: float,
+          verbose: bool = False, max_cycles: Optional[int] = None):
+    """
+    Poll a directory and convert images that appear or change
+
+    Files modified within the last `settle` seconds are left for the next
+    cycle so half-copied uploads are not converted.
+    """
+    print(f"👀 Watching {directory} every {interval}s (Ctrl+C to stop)")
+    cycles = 0
+    try:
+        while max_cycles is None or cycles < max_cycles:
+            cutoff = time.time() - settle
+            inputs = [(f, root) for f, root in expand_inputs([os.fspath(directory)])
+                      if f.stat().st_mtime <= cutoff]
+            summary = batch.run(inputs, verbose=verbose)
+            batch.force = False  # --force applies to the first scan only
+            if summary["converted"] or summary["failed"]:
+                print(_format_summary(summary))
+            cycles += 1
+            if max_cycles is None or cycles < max_cycles:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+
+
+def _format_summary(summary: Dict) -> str:
+    return (f"Converted {summary['converted']}, skipped {summary['skipped']} up to date, "
+            f"{summary['failed']} failed ({summary['inputs']} inputs, {summary['seconds']}s)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from src.exporters import available_formats
+
+    parser = argparse.ArgumentParser(prog="python -m src.cli",
+                                     description="Convert images to tactile hardware files")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-o", "--output-dir", type=Path, default=CLI_CONFIG["output_dir"])
+    common.add_argument("-f", "--formats", nargs="+", default=["arduino"],
+                        choices=available_formats())
+    common.add_argument("-g", "--grid", type=grid_shape,
+                        default=(TACTILE_CONFIG["default_grid_size"],) * 2,
+                        help="grid size, e.g. 32 or 24x40")
+    common.add_argument("-t", "--tile", type=grid_shape,
+                        help="write one file per module of this size (e.g. 32 or 16x32)")
+    common.add_argument("-m", "--method", default=IMAGE_CONFIG["default_method"],
+                        choices=IMAGE_CONFIG["processing_methods"])
+    common.add_argument("--invert", action="store_true")
+    common.add_argument("--threshold", type=int)
+    common.add_argument("--contrast", type=float)
+    common.add_argument("-j", "--workers", type=int, help="processes (default: all cores)")
+    common.add_argument("--force", action="store_true", help="ignore the manifest")
+    common.add_argument("-v", "--verbose", action="store_true")
+
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", parents=[common], help="convert files, dirs or globs")
+    convert.add_argument("inputs", nargs="+")
+    convert.add_argument("--no-recursive", action="store_true",
+                         help="do not descend into subdirectories")
+
+    watch_cmd = sub.add_parser("watch", parents=[common], help="convert new files as they appear")
+    watch_cmd.add_argument("directory", nargs="?", type=Path, default=CLI_CONFIG["watch_dir"])
+    watch_cmd.add_argument("--interval", type=float, default=CLI_CONFIG["watch_interval_s"])
+    watch_cmd.add_argument("--settle", type=float, default=CLI_CONFIG["settle_s"])
+
+    library = sub.add_parser("library", help="store patterns or find the closest stored ones")
+    library.add_argument("action", choices=["add", "find", "stats"])
+    library.add_argument("inputs", nargs="*", help=".bin pattern files, images, dirs or globs")
+    library.add_argument("-l", "--library", type=Path, help="library directory")
+    library.add_argument("-g", "--grid", type=grid_shape,
+                         default=(TACTILE_CONFIG["default_grid_size"],) * 2,
+                         help="grid size for images, e.g. 32 or 24x40")
+    library.add_argument("-m", "--method", default=IMAGE_CONFIG["default_method"],
+                         choices=IMAGE_CONFIG["processing_methods"])
+    library.add_argument("-k", type=int, default=5, help="matches per pattern (find)")
+    library.add_argument("-d", "--max-distance", type=int,
+                         help="find: ignore farther patterns; add: skip near duplicates")
+    return parser
+
+
+def iter_library_inputs(specs: Sequence[str], grid: Tuple[int, int],
+                        method: str) -> Iterator[Tuple[str, np.ndarray]]:
+    """(name, matrix) for every pattern in .bin files and every image converted at grid"""
+    from src.pattern_format import load_patterns
+
+    converter = None
+    inputs = expand_inputs(specs, match=lambda p: is_image(p) or p.suffix == '.bin')
+    for path, _ in inputs:
+        if path.suffix == '.bin':
+            patterns = load_patterns(path)
+            for i, matrix in enumerate(patterns):
+                yield (path.stem if len(patterns) == 1 else f"{path.stem}#{i}"), matrix
+        else:
+            if converter is None:
+                from src.tactile_converter import TactileImageConverter
+                converter = TactileImageConverter(grid_size=grid)
+            yield path.stem, converter.process_image(str(path), method=method)
+
+
+def run_library(args) -> int:
+    from src.pattern_library import PatternLibrary
+
+    library = PatternLibrary(args.library)
+    if args.action == "stats":
+        print(json.dumps(library.stats(), indent=2))
+        return 0
+    if not args.inputs:
+        print("No inputs given", file=sys.stderr)
+        return 1
+    patterns = list(iter_library_inputs(args.inputs, args.grid, args.method))
+    if args.action == "add":
+        names = [name for name, _ in patterns]
+        results = library.add_many([m for _, m in patterns], names,
+                                   max_distance=args.max_distance)
+        added = sum(new for _, new in results)
+        print(f"Added {added} of {len(results)} patterns ({len(library)} in library)")
+        return 0
+    for name, matrix in patterns:
+        matches = library.nearest(matrix, k=args.k, max_distance=args.max_distance)
+        print(f"{name} ({matrix.shape[0]}x{matrix.shape[1]}):")
+        for match in matches:
+            print(f"  {match.distance:>5}  #{match.record.id}  {match.record.name or ''}")
+        if not matches:
+            print("  no match")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    configure_logging()
+
+    if args.command == "library":
+        return run_library(args)
+
+    batch = BatchConverter(args.output_dir, args.formats, args.grid, method=args.method,
+                           invert=args.invert, threshold=args.threshold,
+                           contrast=args.contrast, workers=args.workers, force=args.force,
+                           tile_shape=args.tile)
+
+    if args.command == "watch":
+        watch(batch, args.directory, args.interval, args.settle, verbose=args.verbose)
+        return 0
+
+    inputs = expand_inputs(args.inputs, recursive=not args.no_recursive)
+    if not inputs:
+        print("No images found", file=sys.stderr)
+        return 1
+    summary = batch.run(inputs, verbose=args.verbose)
+    print(_format_summary(summary))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+"""
+Tactile Display Device Driver
+Framed serial protocol with sequence numbers, ACKs, pipelining and a loopback stand-in
+"""
+
+import binascii
+import os
+import select
+import struct
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from config import DEVICE_CONFIG
+from src.pattern_format import pack_pattern, row_bytes
+from src.pattern_sequence import apply_delta, encode_delta
+
+# Frame: SYNC(2) | type(1) | seq(1) | length(2) | payload | crc16(2), little-endian
+SYNC = b'\xA5\x5A'
+FRAME_HEADER = struct.Struct('<2sBBH')
+CRC = struct.Struct('<H')
+
+MSG_HELLO = 0x01    # payload: rows u16, cols u16 (host → device, resets the board)
+MSG_PATTERN = 0x10  # payload: packed rows of the full pattern
+MSG_DELTA = 0x11    # payload: encode_delta() against the previous pattern
+MSG_ACK = 0x80      # payload: status u8 (0 = applied)
+MSG_NAK = 0x81      # payload: status u8 (error code)
+
+_DIMS = struct.Struct('<HH')
+MAX_PAYLOAD = 16384  # 256×256 packed pattern plus headroom; larger lengths mean corruption
+
+
+class Message(NamedTuple):
+    kind: int
+    seq: int
+    payload: bytes
+
+
+def crc16(data: bytes) -> int:
+    """CRC-16/CCITT-FALSE, cheap to compute on AVR/ESP32"""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(kind: int, seq: int, payload: bytes = b'') -> bytes:
+    """Serialize one protocol frame"""
+    body = FRAME_HEADER.pack(SYNC, kind, seq & 0xFF, len(payload)) + payload
+    return body + CRC.pack(crc16(body[2:]))
+
+
+class FrameParser:
+    """Incremental decoder that resynchronizes on the SYNC bytes after corruption"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.errors = 0
+
+    def feed(self, data: bytes) -> List[Message]:
+        self._buffer += data
+        messages = []
+        while True:
+            start = self._buffer.find(SYNC)
+            if start < 0:
+                del self._buffer[:-1]
+                return messages
+            del self._buffer[:start]
+            if len(self._buffer) < FRAME_HEADER.size:
+                return messages
+            _, kind, seq, length = FRAME_HEADER.unpack_from(self._buffer)
+            if length > MAX_PAYLOAD:
+                self.errors += 1
+                del self._buffer[:2]
+                continue
+            end = FRAME_HEADER.size + length + CRC.size
+            if len(self._buffer) < end:
+                return messages
+            (crc,) = CRC.unpack_from(self._buffer, end - CRC.size)
+            if crc != crc16(bytes(self._buffer[2:end - CRC.size])):
+                self.errors += 1
+                del self._buffer[:2]
+                continue
+            messages.append(Message(kind, seq, bytes(self._buffer[FRAME_HEADER.size:end - CRC.size])))
+            del self._buffer[:end]
+
+
+class FdTransport:
+    """Byte transport over a raw file descriptor (pty, pipe or opened tty)"""
+
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    def write(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            written = os.write(self.fd, view)
+            view = view[written:]
+
+    def read(self, size: int, timeout: float) -> bytes:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return b''
+        try:
+            return os.read(self.fd, size)
+        except OSError:
+            return b''
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SerialTransport:
+    """Byte transport over pyserial (imported on first use)"""
+
+    def __init__(self, port: str, baudrate: Optional[int] = None):
+        import serial
+        self._serial = serial.Serial(port, baudrate or DEVICE_CONFIG["baudrate"], timeout=0)
+
+    def write(self, data: bytes):
+        self._serial.write(data)
+
+    def read(self, size: int, timeout: float) -> bytes:
+        self._serial.timeout = timeout
+        return self._serial.read(max(1, min(size, self._serial.in_waiting or 1)))
+
+    def close(self):
+        self._serial.close()
+
+
+class DeviceError(RuntimeError):
+    """Raised when the display does not acknowledge a message"""
+
+
+class TactileDevice:
+    """
+    Host side of the display protocol
+
+    Patterns are sent as deltas against the previously sent pattern
+    whenever that is smaller than the full packed pattern. Up to `window`
+    messages are in flight at once; the device's ACKs carry the sequence
+    number they confirm. After a NAK or timeout the newest pattern is
+    resent in full, since only the final display state matters.
+    """
+
+    def __init__(self, transport, rows: int, cols: int, window: Optional[int] = None,
+                 timeout: Optional[float] = None, retries: Optional[int] = None):
+        """
+        Args:
+            transport: object with write(bytes) and read(size, timeout)
+            rows, cols: display dimensions
+            window: maximum unacknowledged messages
+            timeout: seconds to wait for an ACK
+            retries: resend attempts before giving up
+        """
+        self.transport = transport
+        self.rows, self.cols = rows, cols
+        self.window = window or DEVICE_CONFIG["window"]
+        self.timeout = DEVICE_CONFIG["ack_timeout_s"] if timeout is None else timeout
+        self.retries = DEVICE_CONFIG["retries"] if retries is None else retries
+        self._parser = FrameParser()
+        self._seq = 0
+        self._sent_state: Optional[np.ndarray] = None  # last pattern queued (packed)
+        self.latencies_ms: Deque[float] = deque(maxlen=1000)
+        self.bytes_sent = 0
+
+    @classmethod
+    def open(cls, port: str, rows: int, cols: int, baudrate: Optional[int] = None,
+             **kwargs) -> "TactileDevice":
+        """Connect over a serial port and reset the display"""
+        device = cls(SerialTransport(port, baudrate), rows, cols, **kwargs)
+        device.hello()
+        return device
+
+    def _next_seq(self) -> int:
+        self._seq = (self._seq + 1) & 0xFF
+        return self._seq
+
+    def _write(self, data: bytes):
+        self.transport.write(data)
+        self.bytes_sent += len(data)
+
+    def _await(self, pending: Dict[int, Tuple[int, bytes, float, np.ndarray]], limit: int):
+        """Read ACKs until at most `limit` messages remain unacknowledged"""
+        deadline = time.perf_counter() + self.timeout
+        attempts = 0
+        while len(pending) > limit:
+            remaining = deadline - time.perf_counter()
+            data = self.transport.read(4096, max(0.0, remaining))
+            failed = False
+            for msg in self._parser.feed(data):
+                if msg.seq not in pending:
+                    continue
+                if msg.kind == MSG_ACK:
+                    sent_at = pending.pop(msg.seq)[2]
+                    self.latencies_ms.append((time.perf_counter() - sent_at) * 1e3)
+                elif msg.kind == MSG_NAK:
+                    failed = True
+            if not failed and (time.perf_counter() < deadline or len(pending) <= limit):
+                continue
+            attempts += 1
+            if attempts > self.retries:
+                raise DeviceError(f"Display did not acknowledge {len(pending)} message(s)")
+            self._resync(pending)
+            deadline = time.perf_counter() + self.timeout
+
+    def _resync(self, pending: Dict):
+        """Replace everything in flight with one full pattern of the newest state"""
+        pending.clear()
+        if self._sent_state is None:
+            return
+        seq = self._next_seq()
+        payload = self._sent_state.tobytes()
+        pending[seq] = (MSG_PATTERN, payload, time.perf_counter(), self._sent_state)
+        self._write(encode_frame(MSG_PATTERN, seq, payload))
+
+    def hello(self):
+        """Announce the grid size; the device clears its board"""
+        seq = self._next_seq()
+        blank = np.zeros((self.rows, row_bytes(self.cols)), dtype=np.uint8)
+        pending = {seq: (MSG_HELLO, b'', time.perf_counter(), blank)}
+        self._write(encode_frame(MSG_HELLO, seq, _DIMS.pack(self.rows, self.cols)))
+        self._sent_state = blank
+        self._await(pending, 0)
+
+    def _encode(self, matrix: np.ndarray) -> Tuple[int, bytes, np.ndarray]:
+        if matrix.shape != (self.rows, self.cols):
+            raise ValueError(f"Pattern shape {matrix.shape} != {(self.rows, self.cols)}")
+        packed = pack_pattern(matrix)
+        full = packed.tobytes()
+        if self._sent_state is not None:
+            delta = encode_delta(self._sent_state, packed)
+            if len(delta) < len(full):
+                return MSG_DELTA, delta, packed
+        return MSG_PATTERN, full, packed
+
+    def send(self, matrices: Iterable[np.ndarray]) -> int:
+        """
+        Stream patterns to the display, pipelining up to `window` messages
+
+        Returns:
+            Number of patterns sent; returns once all are acknowledged
+        """
+        pending: Dict[int, Tuple[int, bytes, float, np.ndarray]] = {}
+        count = 0
+        batch = bytearray()
+        for matrix in matrices:
+            kind, payload, packed = self._encode(np.asarray(matrix))
+            seq = self._next_seq()
+            pending[seq] = (kind, payload, time.perf_counter(), packed)
+            batch += encode_frame(kind, seq, payload)
+            self._sent_state = packed
+            count += 1
+            if len(pending) >= self.window:
+                self._write(bytes(batch))
+                batch.clear()
+                self._await(pending, self.window - 1)
+        if batch:
+            self._write(bytes(batch))
+        self._await(pending, 0)
+        return count
+
+    def show(self, matrix: np.ndarray) -> float:
+        """Display one pattern; returns the send→ACK latency in ms"""
+        start = time.perf_counter()
+        self.send([matrix])
+        return (time.perf_counter() - start) * 1e3
+
+    def stats(self) -> Dict:
+        """Round-trip latency summary and traffic counters"""
+        summary = {"messages_acked": len(self.latencies_ms), "bytes_sent": self.bytes_sent,
+                   "crc_errors": self._parser.errors}
+        if self.latencies_ms:
+            arr = np.asarray(self.latencies_ms)
+            summary.update({"mean_ms": round(float(arr.mean()), 3),
+                            "p50_ms": round(float(np.percentile(arr, 50)), 3),
+                            "p99_ms": round(float(np.percentile(arr, 99)), 3)})
+        return summary
+
+    def close(self):
+        self.transport.close()
+
+
+class LoopbackDevice:
+    """
+    Pseudo-terminal stand-in for the display firmware
+
+    Runs the device side of the protocol on a thread behind a pty, so
+    TactileDevice can be exercised (or benchmarked) without hardware.
+    Optionally sleeps for the refresh time RefreshScheduler predicts.
+    """
+
+    def __init__(self, simulate_refresh: bool = False):
+        import tty
+
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.master_fd)
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self.simulate_refresh = simulate_refresh
+        self.board: Optional[np.ndarray] = None
+        self.cols = 0
+        self.applied = 0
+        self._transport = FdTransport(self.master_fd)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def host_transport(self) -> FdTransport:
+        """Transport for the host side (no pyserial needed)"""
+        return FdTransport(self.slave_fd)
+
+    def pattern(self) -> Optional[np.ndarray]:
+        """Current board as a 0/1 matrix"""
+        if self.board is None:
+            return None
+        return np.unpackbits(self.board, axis=-1, count=self.cols)
+
+    def _apply(self, msg: Message) -> int:
+        if msg.kind == MSG_HELLO:
+            rows, self.cols = _DIMS.unpack(msg.payload)
+            self.board = np.zeros((rows, row_bytes(self.cols)), dtype=np.uint8)
+            return 0
+        if self.board is None:
+            return 1
+        previous = self.board.copy()
+        if msg.kind == MSG_PATTERN:
+            if len(msg.payload) != self.board.size:
+                return 2
+            self.board = np.frombuffer(msg.payload, np.uint8).reshape(self.board.shape).copy()
+        elif msg.kind == MSG_DELTA:
+            apply_delta(self.board, msg.payload)
+        else:
+            return 3
+        if self.simulate_refresh:
+            from src.actuator_scheduler import RefreshScheduler
+            plan = RefreshScheduler().schedule(
+                np.unpackbits(previous, axis=-1, count=self.cols), self.pattern())
+            time.sleep(plan.duration_ms / 1e3)
+        self.applied += 1
+        return 0
+
+    def _run(self):
+        parser = FrameParser()
+        while self._running:
+            data = self._transport.read(4096, 0.05)
+            for msg in parser.feed(data):
+                status = self._apply(msg)
+                reply = MSG_ACK if status == 0 else MSG_NAK
+                self._transport.write(encode_frame(reply, msg.seq, bytes([status])))
+
+    def close(self):
+        self._running = False
+        self._thread.join(timeout=1.0)
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def measure_latency(device: TactileDevice, converter, images: Iterable,
+                    method: str = 'threshold') -> Iterator[Dict[str, float]]:
+    """
+    End-to-end image → raised-pins latency for each image
+
+    Yields:
+        {'convert_ms', 'device_ms', 'total_ms'} per image
+    """
+    for image in images:
+        start = time.perf_counter()
+        matrix = converter.process_image(image, method=method)
+        converted = time.perf_counter()
+        device.show(matrix)
+        done = time.perf_counter()
+        yield {"convert_ms": (converted - start) * 1e3,
+               "device_ms": (done - converted) * 1e3,
+               "total_ms": (done - start) * 1e3}
@@ -0,0 +1,400 @@
+"""
+Hardware Exporters
+One registry of pattern file formats shared by the converter, the app and the CLI
+"""
+
+import io
+import os
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+from config import TACTILE_CONFIG
+from src.pattern_format import (BIN_HEADER, BIN_MAGIC, BIN_VERSION, arduino_packed_source,
+                                c_byte_rows, pack_pattern, row_bytes)
+from src.utils import ensure_parent
+
+CHUNK_ROWS = 1024  # Rows formatted per write, bounds memory for very large grids
+
+PathOrFile = Union[str, os.PathLike, BinaryIO, io.TextIOBase]
+Patterns = Union[np.ndarray, Iterable[np.ndarray]]
+Write = Callable[[bytes], object]
+
+
+class ExportMeta(NamedTuple):
+    """Physical metadata written alongside the pattern"""
+    ball_diameter: float
+    ball_spacing: float
+    name: str = 'tactilePattern'
+
+
+def delimited_rows(matrix: np.ndarray, sep: bytes = b'', prefix: bytes = b'',
+                   suffix: bytes = b'\n') -> bytes:
+    """
+    Format a 0/1 matrix as text rows with one vectorized byte-table fill
+
+    Every row becomes prefix + digits joined by sep + suffix, e.g.
+    sep=b', ', prefix=b'  {', suffix=b'},\\n' gives C initializer rows.
+    """
+    digits = np.asarray(matrix) != 0
+    rows, cols = digits.shape
+    step = 1 + len(sep)
+    body = cols * step - len(sep)
+    width = len(prefix) + body + len(suffix)
+    out = np.empty((rows, width), dtype=np.uint8)
+    if prefix:
+        out[:, :len(prefix)] = np.frombuffer(prefix, dtype=np.uint8)
+    cells = out[:, len(prefix):len(prefix) + body]
+    cells[:, ::step] = digits
+    cells[:, ::step] += ord('0')
+    for k, ch in enumerate(sep):
+        cells[:, 1 + k::step] = ch
+    if suffix:
+        out[:, width - len(suffix):] = np.frombuffer(suffix, dtype=np.uint8)
+    return out.tobytes()
+
+
+def write_rows(write: Write, matrix: np.ndarray, sep: bytes = b'', prefix: bytes = b'',
+               suffix: bytes = b'\n', last_suffix: Optional[bytes] = None):
+    """
+    Stream delimited_rows in CHUNK_ROWS slices
+
+    Args:
+        last_suffix: replaces suffix on the final row (e.g. to drop a trailing comma)
+    """
+    rows = len(matrix)
+    for start in range(0, rows, CHUNK_ROWS):
+        block = delimited_rows(matrix[start:start + CHUNK_ROWS], sep, prefix, suffix)
+        if last_suffix is not None and start + CHUNK_ROWS >= rows:
+            view = memoryview(block)
+            write(view[:len(block) - len(suffix)])
+            write(last_suffix)
+        else:
+            write(block)
+
+
+class Exporter:
+    """
+    Base class for a pattern file format
+
+    Subclasses set the class attributes and implement write(); register
+    them with @register_exporter to make the format available everywhere.
+    """
+    name = ''
+    file_suffix = ''
+    mime = 'text/plain'
+
+    def write(self, write: Write, patterns: Iterator[np.ndarray], meta: ExportMeta,
+              single: bool, count: Optional[int]) -> int:
+        """
+        Write patterns through `write` (bytes in, any return)
+
+        Args:
+            patterns: matrices in export order
+            meta: ball specs and array name
+            single: export a single pattern (no per-pattern framing)
+            count: number of patterns if known up front
+
+        Returns:
+            Number of patterns written
+        """
+        raise NotImplementedError
+
+
+EXPORTERS: Dict[str, Exporter] = {}
+
+
+def register_exporter(cls):
+    """Class decorator adding an Exporter to the registry under cls.name"""
+    EXPORTERS[cls.name] = cls()
+    return cls
+
+
+def get_exporter(file_format: str) -> Exporter:
+    try:
+        return EXPORTERS[file_format]
+    except KeyError:
+        raise ValueError(f"Unknown export format '{file_format}' "
+                         f"(available: {', '.join(EXPORTERS)})") from None
+
+
+def available_formats() -> List[str]:
+    return list(EXPORTERS)
+
+
+@register_exporter
+class TextExporter(Exporter):
+    name = 'txt'
+    file_suffix = '.txt'
+
+    def write(self, write, patterns, meta, single, count):
+        n = 0
+        for matrix in patterns:
+            rows, cols = matrix.shape
+            if n == 0:
+                write(f"# Tactile Display Pattern\n"
+                      f"# Grid: {rows}×{cols}\n"
+                      f"# Ball: {meta.ball_diameter}mm, Spacing: {meta.ball_spacing}mm\n"
+                      f"# 0=down, 1=up\n\n".encode())
+            if not single:
+                write((b'\n' if n else b'') + f"# Pattern {n}\n".encode())
+            write_rows(write, matrix)
+            n += 1
+        return n
+
+
+@register_exporter
+class CsvExporter(Exporter):
+    name = 'csv'
+    file_suffix = '.csv'
+    mime = 'text/csv'
+
+    def write(self, write, patterns, meta, single, count):
+        n = 0
+        for matrix in patterns:
+            rows, cols = matrix.shape
+            if n == 0:
+                write(f"# Grid Size: {rows}×{cols}\n"
+                      f"# Ball Specs: {meta.ball_diameter}mm diameter, "
+                      f"{meta.ball_spacing}mm spacing\n".encode())
+            if not single:
+                write(f"# Pattern {n}\n".encode())
+            write_rows(write, matrix, sep=b',')
+            n += 1
+        return n
+
+
+@register_exporter
+class JsonExporter(Exporter):
+    """JSON with one pattern row per line, streamed row block by row block"""
+    name = 'json'
+    file_suffix = '.json'
+    mime = 'application/json'
+
+    @staticmethod
+    def _metadata(meta: ExportMeta, rows: int, cols: int) -> str:
+        return ('  "metadata": {\n'
+                f'    "grid_size": {{"rows": {rows}, "cols": {cols}}},\n'
+                f'    "ball_diameter_mm": {meta.ball_diameter},\n'
+                f'    "ball_spacing_mm": {meta.ball_spacing}')
+
+    def write(self, write, patterns, meta, single, count):
+        n = 0
+        indent = b'    ' if single else b'      '
+        for matrix in patterns:
+            rows, cols = matrix.shape
+            if single:
+                write(('{\n' + self._metadata(meta, rows, cols) + ',\n'
+                       f'    "total_points": {rows * cols},\n'
+                       f'    "points_raised": {int(np.count_nonzero(matrix))}\n'
+                       '  },\n  "pattern": [\n').encode())
+            else:
+                if n == 0:
+                    write(('{\n' + self._metadata(meta, rows, cols) + '\n'
+                           '  },\n  "patterns": [\n').encode())
+                else:
+                    write(b',\n')
+                write(b'    [\n')
+            write_rows(write, matrix, sep=b', ', prefix=indent + b'[', suffix=b'],\n',
+                       last_suffix=b']\n')
+            if single:
+                write(b'  ]\n}\n')
+            else:
+                write(b'    ]')
+            n += 1
+        if not single:
+            if n == 0:
+                write(b'{\n  "patterns": [')
+            write(f'\n  ],\n  "count": {n}\n}}\n'.encode())
+        return n
+
+
+@register_exporter
+class ArduinoExporter(Exporter):
+    name = 'arduino'
+    file_suffix = '.ino'
+
+    def write(self, write, patterns, meta, single, count):
+        n = 0
+        for matrix in patterns:
+            rows, cols = matrix.shape
+            if n == 0:
+                dims = '[ROWS][COLS]' if single else '[][ROWS][COLS]'
+                write(f"// Tactile Display Pattern - {rows}×{cols}\n"
+                      f"// {meta.ball_diameter}mm balls, {meta.ball_spacing}mm spacing\n"
+                      f"// Generated by AI Visual Accessibility System\n\n"
+                      f"const int ROWS = {rows};\n"
+                      f"const int COLS = {cols};\n\n"
+                      f"const int {meta.name}{dims} = {{\n".encode())
+            if single:
+                write_rows(write, matrix, sep=b', ', prefix=b'  {', suffix=b'},\n',
+                           last_suffix=b'}\n')
+            else:
+                write(b'  {' if n == 0 else b',\n  {')
+                write(b'\n')
+                write_rows(write, matrix, sep=b', ', prefix=b'    {', suffix=b'},\n',
+                           last_suffix=b'}\n')
+                write(b'  }')
+            n += 1
+        if single:
+            write(f"}};\n\n// Usage: if ({meta.name}[row][col] == 1) "
+                  f"raiseBall(row, col);\n".encode())
+        elif n:
+            write(f"\n}};\n\nconst int PATTERN_COUNT = sizeof({meta.name}) / "
+                  f"sizeof({meta.name}[0]);\n\n"
+                  f"// Usage: if ({meta.name}[frame][row][col] == 1) "
+                  f"raiseBall(row, col);\n".encode())
+        return n
+
+
+@register_exporter
+class ArduinoPackedExporter(Exporter):
+    """Bit-packed PROGMEM arrays (see pattern_format.arduino_packed_source)"""
+    name = 'arduino_packed'
+    file_suffix = '_packed.ino'
+
+    def write(self, write, patterns, meta, single, count):
+        n = 0
+        for matrix in patterns:
+            if single:
+                write(arduino_packed_source(matrix, meta.ball_diameter, meta.ball_spacing,
+                                            name=meta.name).encode())
+                return 1
+            rows, cols = matrix.shape
+            if n == 0:
+                write(f"// Tactile Display Patterns - {rows}×{cols} (bit-packed)\n"
+                      f"// {meta.ball_diameter}mm balls, {meta.ball_spacing}mm spacing\n"
+                      f"// Generated by AI Visual Accessibility System\n"
+                      f"// Bit 7 of each byte is the leftmost column of that byte\n\n"
+                      f"#include <Arduino.h>\n\n"
+                      f"const uint16_t ROWS = {rows};\n"
+                      f"const uint16_t COLS = {cols};\n"
+                      f"const uint16_t ROW_BYTES = {row_bytes(cols)};\n\n"
+                      f"const uint8_t {meta.name}[][ROWS][ROW_BYTES] PROGMEM = {{\n".encode())
+            else:
+                write(b',\n')
+            write(b'  {\n')
+            write(c_byte_rows(pack_pattern(matrix), indent='    ').encode())
+            write(b'\n  }')
+            n += 1
+        if n:
+            name = meta.name
+            write(f"\n}};\n\n"
+                  f"const uint16_t PATTERN_COUNT = sizeof({name}) / sizeof({name}[0]);\n\n"
+                  f"inline bool {name}Cell(uint16_t frame, uint16_t row, uint16_t col) {{\n"
+                  f"  return pgm_read_byte(&{name}[frame][row][col >> 3]) & (0x80 >> (col & 7));\n"
+                  f"}}\n".encode())
+        return n
+
+
+@register_exporter
+class BinExporter(Exporter):
+    """
+    Row-aligned packed .bin (see pattern_format)
+
+    The header carries the pattern count; when it is not known up front
+    the header is patched afterwards, which needs a seekable target.
+    """
+    name = 'bin'
+    file_suffix = '.bin'
+    mime = 'application/octet-stream'
+
+    def write(self, write, patterns, meta, single, count):
+        n = 0
+        for matrix in patterns:
+            if n == 0:
+                rows, cols = matrix.shape
+                write(BIN_HEADER.pack(BIN_MAGIC, BIN_VERSION, 0, rows, cols, count or 0))
+            elif matrix.shape != (rows, cols):
+                raise ValueError(f"Pattern {n} is {matrix.shape}, expected {(rows, cols)}")
+            write(pack_pattern(matrix).tobytes())
+            n += 1
+        return n
+
+    @staticmethod
+    def patch_count(f: BinaryIO, start: int, count: int):
+        end = f.tell()
+        f.seek(start + 4 + 1 + 1 + 2 + 2)  # magic, version, flags, rows, cols
+        f.write(count.to_bytes(4, 'little'))
+        f.seek(end)
+
+
+def _split(matrices: Patterns):
+    """(iterator, single, count) for a matrix, a stack or any iterable"""
+    if isinstance(matrices, np.ndarray):
+        if matrices.ndim == 2:
+            return iter((matrices,)), True, 1
+        return iter(matrices), False, len(matrices)
+    if isinstance(matrices, (list, tuple)):
+        return iter(matrices), False, len(matrices)
+    return iter(matrices), False, None
+
+
+def export_patterns(target: PathOrFile, matrices: Patterns, file_format: str = 'txt',
+                    ball_diameter: Optional[float] = None, ball_spacing: Optional[float] = None,
+                    name: str = 'tactilePattern') -> int:
+    """
+    Write one or many patterns in a registered format
+
+    A 2-D matrix is exported as a single pattern; a 3-D stack, list or any
+    iterable (e.g. a generator) as a multi-pattern file, streamed one
+    pattern at a time.
+
+    Args:
+        target: path, binary file object or text stream
+        matrices: pattern or patterns
+        file_format: registered format name (see available_formats())
+        ball_diameter: mm (defaults to TACTILE_CONFIG)
+        ball_spacing: mm (defaults to TACTILE_CONFIG)
+        name: C array name for the Arduino formats
+
+    Returns:
+        Number of patterns written
+    """
+    exporter = get_exporter(file_format)
+    meta = ExportMeta(
+        TACTILE_CONFIG["ball_diameter_mm"] if ball_diameter is None else ball_diameter,
+        TACTILE_CONFIG["ball_spacing_mm"] if ball_spacing is None else ball_spacing,
+        name)
+    patterns, single, count = _split(matrices)
+    patterns = (np.asarray(m) for m in patterns)
+
+    owned = isinstance(target, (str, os.PathLike))
+    f = open(ensure_parent(target), 'wb') if owned else target
+    try:
+        if isinstance(f, io.TextIOBase):
+            if isinstance(exporter, BinExporter):
+                raise TypeError("The bin format needs a binary file object")
+            write = lambda data: f.write(bytes(data).decode())
+        else:
+            write = f.write
+
+        if isinstance(exporter, BinExporter) and count is None:
+            if not f.seekable():
+                # Count must precede the data on a pipe: materialize first
+                patterns = list(patterns)
+                count = len(patterns)
+                n = exporter.write(write, iter(patterns), meta, single, count)
+            else:
+                start = f.tell()
+                n = exporter.write(write, patterns, meta, single, None)
+                exporter.patch_count(f, start, n)
+        else:
+            n = exporter.write(write, patterns, meta, single, count)
+    finally:
+        if owned:
+            f.close()
+    return n
+
+
+def export_bytes(matrices: Patterns, file_format: str = 'txt', **options) -> bytes:
+    """export_patterns into memory; options as for export_patterns"""
+    buffer = io.BytesIO()
+    export_patterns(buffer, matrices, file_format, **options)
+    return buffer.getvalue()
+
+
+def export_filename(file_format: str, rows: int, cols: int,
+                    stem: str = 'tactile_pattern') -> str:
+    """Conventional download/file name, e.g. tactile_pattern_32x32.ino"""
+    return f"{stem}_{rows}x{cols}{get_exporter(file_format).file_suffix}"
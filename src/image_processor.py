@@ -0,0 +1,598 @@
+"""
+Image Processing Engine
+Vectorized NumPy binarization backed by precomputed lookup tables
+"""
+
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from config import IMAGE_CONFIG
+from src.instrumentation import NULL_INSTRUMENTATION, Instrumentation
+from src.utils import optional_import
+
+
+@lru_cache(maxsize=512)
+def contrast_lut(mean: int, factor: float) -> np.ndarray:
+    """
+    Build the 256-entry lookup table for a contrast enhancement
+
+    Reproduces ImageEnhance.Contrast exactly: every pixel is blended away
+    from the image mean in float32 and truncated back to uint8.
+
+    Args:
+        mean: Rounded mean grey level of the image
+        factor: Contrast factor (1.0 = unchanged)
+
+    Returns:
+        Read-only uint8 array of 256 entries
+    """
+    x = np.arange(256, dtype=np.float32)
+    m = np.float32(mean)
+    blended = m + np.float32(factor) * (x - m)
+    lut = np.clip(blended, 0, 255).astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+
+def image_mean(gray: np.ndarray) -> int:
+    """Rounded mean grey level, matching ImageStat as used by ImageEnhance"""
+    if gray.size == 0:
+        return 0
+    return int(gray.sum(dtype=np.uint64) / gray.size + 0.5)
+
+
+# OpenCV adaptive threshold neighbourhood (pixels, odd)
+ADAPTIVE_BLOCK = 11
+
+
+def _first_at_least(lut: np.ndarray, threshold: int) -> int:
+    """Index of the first LUT entry >= threshold (256 if none)"""
+    return int(np.searchsorted(lut, threshold, side='left'))
+
+
+class ThresholdEngine:
+    """
+    Binarize uint8 grayscale arrays with tunable threshold and contrast
+
+    Contrast enhancement and thresholding are folded into a single
+    precomputed table per (mean, contrast, threshold). Because contrast
+    tables are monotonic, the table collapses further to one cutoff so the
+    full-resolution pass is a single vectorized comparison.
+
+    Output convention matches the PIL pipeline: True where the binary
+    image is white (255), False where it is black.
+    """
+
+    def __init__(self, method_params: Optional[dict] = None,
+                 instrumentation: Optional[Instrumentation] = None):
+        """
+        Args:
+            method_params: Per-method defaults {'method': {'threshold', 'contrast'}}
+            instrumentation: receives 'contrast', 'edge_filter' and 'threshold' timings
+        """
+        self.method_params = method_params or IMAGE_CONFIG["method_params"]
+        self.metrics = instrumentation or NULL_INSTRUMENTATION
+
+    def params_for(self, method: str, threshold: Optional[int] = None,
+                   contrast: Optional[float] = None):
+        """Resolve threshold/contrast for a method, falling back to defaults"""
+        defaults = self.method_params.get(method, self.method_params["threshold"])
+        if threshold is None:
+            threshold = defaults["threshold"]
+        if contrast is None:
+            contrast = defaults["contrast"]
+        return int(threshold), float(contrast)
+
+    @staticmethod
+    def context_px(method: str) -> int:
+        """Neighbouring pixels a method reads on each side (tile halo width)"""
+        if method == 'edge':
+            return 1
+        if method == 'adaptive':
+            return ADAPTIVE_BLOCK // 2
+        return 0
+
+    def enhance(self, gray: np.ndarray, contrast: float,
+                mean: Optional[int] = None) -> np.ndarray:
+        """Apply contrast enhancement through the cached lookup table"""
+        if contrast == 1.0:
+            return gray
+        lut = contrast_lut(image_mean(gray) if mean is None else mean, contrast)
+        return lut[gray]
+
+    def below(self, gray: np.ndarray, threshold: int, contrast: float = 1.0,
+              out: Optional[np.ndarray] = None, mean: Optional[int] = None) -> np.ndarray:
+        """
+        Mark pixels whose (contrast-enhanced) value is below threshold
+
+        Args:
+            gray: uint8 grayscale array
+            threshold: Cutoff applied after enhancement
+            contrast: Contrast factor applied before the cutoff
+            out: Optional preallocated bool array of gray's shape to fill
+            mean: Grey level the contrast pivots on (defaults to gray's mean)
+
+        Returns:
+            bool array, True where enhanced value < threshold (`out` if given)
+        """
+        if contrast == 1.0:
+            return np.less(gray, threshold, out=out)
+        lut = contrast_lut(image_mean(gray) if mean is None else mean, contrast)
+        if contrast >= 0:
+            # Monotonic table: enhanced < threshold  <=>  gray < cutoff
+            return np.less(gray, _first_at_least(lut, threshold), out=out)
+        return np.take(lut < threshold, gray, out=out)
+
+    def find_edges(self, gray: np.ndarray, threshold: int) -> np.ndarray:
+        """
+        Threshold a 3×3 Laplacian (ImageFilter.FIND_EDGES) response
+        
+        The kernel is 9·center minus the 3×3 box sum; the box sum is
+        computed separably so the full-resolution pass is four adds.
+        Border pixels keep their input value, as PIL does.
+        
+        Returns:
+            bool array, True where the edge response > threshold
+        """
+        mask = gray > threshold
+        if gray.shape[0] < 3 or gray.shape[1] < 3:
+            return mask
+        if threshold < 0 or threshold >= 255:
+            # The clipped response lies in [0, 255]
+            mask[1:-1, 1:-1] = threshold < 0
+            return mask
+        g = gray.astype(np.int16)
+        rows = g[:, :-2] + g[:, 1:-1] + g[:, 2:]
+        box = rows[:-2] + rows[1:-1] + rows[2:]
+        box -= 9 * g[1:-1, 1:-1]
+        # response = -box; clipping to [0, 255] cannot change the comparison here
+        np.less(box, -threshold, out=mask[1:-1, 1:-1])
+        return mask
+    
+    def adaptive(self, gray: np.ndarray, threshold: int) -> np.ndarray:
+        """Gaussian adaptive threshold via OpenCV, falling back to a fixed cutoff"""
+        cv2 = optional_import('cv2', required=False)
+        if cv2 is None:
+            return gray < threshold
+        binary = cv2.adaptiveThreshold(
+            np.ascontiguousarray(gray), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY_INV, ADAPTIVE_BLOCK, 2
+        )
+        return binary > 127
+
+    def binarize(self, gray: np.ndarray, method: str = 'threshold',
+                 threshold: Optional[int] = None,
+                 contrast: Optional[float] = None,
+                 out: Optional[np.ndarray] = None,
+                 mean: Optional[int] = None) -> np.ndarray:
+        """
+        Convert a uint8 grayscale array to a binary mask
+
+        Args:
+            gray: 2-D uint8 array
+            method: 'edge', 'threshold', 'high_contrast', or 'adaptive'
+            threshold: Override the method's cutoff
+            contrast: Override the method's contrast factor
+            out: Optional preallocated bool array (used by threshold methods)
+            mean: Contrast pivot; pass the whole image's mean when `gray`
+                is one tile of it
+
+        Returns:
+            bool array (True = white in the binary image)
+        """
+        threshold, contrast = self.params_for(method, threshold, contrast)
+        stage = self.metrics.stage
+
+        if method in ('edge', 'adaptive'):
+            with stage("contrast"):
+                enhanced = self.enhance(gray, contrast, mean)
+            if method == 'edge':
+                with stage("edge_filter"):
+                    return self.find_edges(enhanced, threshold)
+            with stage("threshold"):
+                return self.adaptive(enhanced, threshold)
+        # 'threshold', 'high_contrast' and unknown methods: dark → white
+        # (contrast is folded into the cutoff, so this is a single stage)
+        with stage("threshold"):
+            return self.below(gray, threshold, contrast, out=out, mean=mean)
+
+
+def cell_edges(n_pixels: int, n_cells: int) -> np.ndarray:
+    """Integer pixel boundaries splitting n_pixels into n_cells near-equal spans"""
+    return (np.arange(n_cells + 1, dtype=np.int64) * n_pixels) // n_cells
+
+
+def block_sum(arr: np.ndarray, shape: Tuple[int, int], dtype=np.uint32) -> np.ndarray:
+    """
+    Sum an array over a rows×cols partition of near-equal blocks
+    
+    Uses a reshape when the blocks divide evenly and np.add.reduceat
+    otherwise; arrays smaller than the grid are repeated up first so every
+    block holds at least one pixel.
+    
+    Returns:
+        (block_sums, block_areas) as arrays of shape (rows, cols)
+    """
+    rows, cols = shape
+    h, w = arr.shape[:2]
+    if h < rows or w < cols:
+        ry, rx = -(-rows // h), -(-cols // w)
+        arr = np.repeat(np.repeat(arr, ry, axis=0), rx, axis=1)
+        h, w = arr.shape[:2]
+
+    if h % rows == 0 and w % cols == 0:
+        sums = arr.reshape(rows, h // rows, cols, w // cols).sum(axis=(1, 3), dtype=dtype)
+        areas = np.full((rows, cols), (h // rows) * (w // cols), dtype=dtype)
+        return sums, areas
+
+    # Reduce along the contiguous axis first; it is several times faster
+    ys, xs = cell_edges(h, rows), cell_edges(w, cols)
+    sums = np.add.reduceat(arr, xs[:-1], axis=1, dtype=dtype)
+    sums = np.add.reduceat(sums, ys[:-1], axis=0, dtype=dtype)
+    areas = np.outer(np.diff(ys), np.diff(xs)).astype(dtype)
+    return sums, areas
+
+
+def coverage_grid(binary: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Fraction of dark (False) pixels in each grid cell
+    
+    Args:
+        binary: bool mask from ThresholdEngine.binarize (True = white)
+        shape: (rows, cols) of the tactile grid
+    
+    Returns:
+        float32 array of coverage values in [0, 1]
+    """
+    white, areas = block_sum(binary.view(np.uint8), shape)
+    return (1.0 - white / areas).astype(np.float32)
+
+
+def coverage_cells(binary: np.ndarray, ys: np.ndarray, xs: np.ndarray) -> np.ndarray:
+    """
+    Dark coverage over explicit cell boundaries
+    
+    Used for a tile of a larger grid: ys/xs are the tile's slice of the
+    full grid's cell_edges, shifted to start at 0, so every tile cell
+    covers exactly the pixels it would in a whole-image conversion.
+    
+    Returns:
+        float32 array of shape (len(ys) - 1, len(xs) - 1)
+    """
+    mask = binary.view(np.uint8)
+    white = np.add.reduceat(mask, xs[:-1], axis=1, dtype=np.uint32)
+    white = np.add.reduceat(white, ys[:-1], axis=0, dtype=np.uint32)
+    areas = np.outer(np.diff(ys), np.diff(xs)).astype(np.uint32)
+    return (1.0 - white / areas).astype(np.float32)
+
+
+def _sum_pyramid(arr: np.ndarray, shapes, dtype=np.uint32) -> Dict[Tuple[int, int], Tuple]:
+    """(block_sums, block_areas) for several shapes, merging nested levels"""
+    h, w = arr.shape
+    levels = {}
+    for shape in sorted(set(shapes), key=lambda s: s[0] * s[1], reverse=True):
+        # Images smaller than a level are repeated up, which breaks nesting
+        parent = next((lvl for lvl in levels
+                       if lvl[0] % shape[0] == 0 and lvl[1] % shape[1] == 0
+                       and lvl[0] <= h and lvl[1] <= w), None)
+        if parent is None:
+            levels[shape] = block_sum(arr, shape, dtype=dtype)
+            continue
+        sums, areas = levels[parent]
+        fy, fx = parent[0] // shape[0], parent[1] // shape[1]
+        merge = lambda a: a.reshape(shape[0], fy, shape[1], fx).sum(axis=(1, 3))
+        levels[shape] = merge(sums), merge(areas)
+    return levels
+
+
+def coverage_pyramid(binary: np.ndarray, shapes) -> Dict[Tuple[int, int], np.ndarray]:
+    """
+    Dark coverage for several grid shapes from one full-resolution pass
+    
+    Block sums are computed once at the finest shape; every coarser shape
+    that divides an already computed level is derived by merging block
+    sums (cell boundaries nest exactly), so e.g. 32→16→8→4 costs a single
+    pass over the image. Shapes that do not nest get their own pass.
+    
+    Args:
+        binary: bool mask (True = white)
+        shapes: iterable of (rows, cols)
+    
+    Returns:
+        {(rows, cols): float32 coverage array}
+    """
+    levels = _sum_pyramid(binary.view(np.uint8), shapes)
+    return {shape: (1.0 - sums / areas).astype(np.float32)
+            for shape, (sums, areas) in levels.items()}
+
+
+def tone_grid(gray: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Mean darkness of each grid cell of a grayscale array
+    
+    Returns:
+        float32 array in [0, 1] (1 = black), the input for dithering
+    """
+    sums, areas = block_sum(gray, shape, dtype=np.uint64)
+    return (1.0 - sums / (areas * 255.0)).astype(np.float32)
+
+
+def tone_pyramid(gray: np.ndarray, shapes) -> Dict[Tuple[int, int], np.ndarray]:
+    """tone_grid for several shapes in one pass (see coverage_pyramid)"""
+    levels = _sum_pyramid(gray, shapes, dtype=np.uint64)
+    return {shape: (1.0 - sums / (areas * 255.0)).astype(np.float32)
+            for shape, (sums, areas) in levels.items()}
+
+
+def reduce_gray(gray: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Area-average a grayscale array down to at most `shape` (rows, cols)
+    
+    Returns the input unchanged when it is already that small.
+    """
+    rows, cols = min(shape[0], gray.shape[0]), min(shape[1], gray.shape[1])
+    if (rows, cols) == gray.shape:
+        return gray
+    sums, areas = block_sum(gray, (rows, cols))
+    return ((sums + areas // 2) // areas).astype(np.uint8)
+
+
+def decode_factor(size: Tuple[int, int], shape: Tuple[int, int],
+                  min_cell_px: Optional[int] = None, max_reduce: Optional[int] = None) -> int:
+    """
+    Integer shrink factor for decoding an image that feeds a `shape` grid
+    
+    Keeps at least min_cell_px pixels per cell along each axis and never
+    exceeds max_reduce, which bounds how much a thin stroke is averaged
+    away before thresholding.
+    
+    Args:
+        size: image (width, height)
+        shape: grid (rows, cols)
+    """
+    if min_cell_px is None:
+        min_cell_px = IMAGE_CONFIG["decode_min_cell_px"]
+    if max_reduce is None:
+        max_reduce = IMAGE_CONFIG["decode_max_reduce"]
+    width, height = size
+    rows, cols = shape
+    factor = min(width // (cols * min_cell_px), height // (rows * min_cell_px), max_reduce)
+    return max(1, int(factor))
+
+
+def reduce_for_grid(image, shape: Tuple[int, int],
+                    min_cell_px: Optional[int] = None,
+                    max_reduce: Optional[int] = None):
+    """
+    Shrink an image as early as possible for a `shape` grid
+    
+    A JPEG that has not been decoded yet is switched to draft mode, so the
+    decoder itself scales by 1/2, 1/4 or 1/8 and produces luma only. Other
+    images are box-reduced with Image.reduce() before any filtering; pixel
+    arrays are reduced and grayscaled together by array_to_gray().
+    
+    Returns:
+        The same image (drafted in place) or a reduced copy (a 2-D uint8
+        array for array input)
+    """
+    factor = decode_factor(image_size(image), shape, min_cell_px, max_reduce)
+    if factor <= 1:
+        return image
+    if isinstance(image, np.ndarray):
+        return array_to_gray(image, factor)
+    width, height = image.size
+    if image.format == 'JPEG' and image.mode in ('L', 'RGB'):
+        # draft() returns None once the image has been loaded
+        if image.draft('L', (-(-width // factor), -(-height // factor))) is not None:
+            return image
+    if image.mode not in ('L', 'RGB', 'RGBA', 'LA', 'I', 'F'):
+        image = image.convert('L')  # palette / bilevel: reduce() needs a continuous mode
+    return image.reduce(factor)
+
+
+def rgb_to_gray(rgb: np.ndarray, out: Optional[np.ndarray] = None,
+                scratch: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> np.ndarray:
+    """
+    ITU-R 601-2 luma from an (H, W, 3+) uint8 array
+    
+    Uses PIL's fixed-point weights, so the result is bit-identical to
+    Image.convert('L'). Pass `out` and two uint32 `scratch` buffers of
+    shape (H, W) to run without allocating.
+    """
+    h, w = rgb.shape[:2]
+    if out is None:
+        out = np.empty((h, w), dtype=np.uint8)
+    if scratch is None:
+        scratch = (np.empty((h, w), dtype=np.uint32), np.empty((h, w), dtype=np.uint32))
+    acc, term = scratch
+    np.multiply(rgb[..., 0], np.uint32(19595), out=acc)
+    np.multiply(rgb[..., 1], np.uint32(38470), out=term)
+    acc += term
+    np.multiply(rgb[..., 2], np.uint32(7471), out=term)
+    acc += term
+    acc += 0x8000
+    acc >>= 16
+    np.copyto(out, acc, casting='unsafe')
+    return out
+
+
+# Source pixels converted per step by array_to_gray; bounds its temporaries
+GRAY_STRIP_PIXELS = 1 << 18
+
+
+def pixel_array(source) -> Optional[np.ndarray]:
+    """
+    Wrap in-memory pixels as a uint8 array without copying
+
+    Accepts NumPy arrays (np.memmap included), multi-dimensional
+    memoryviews and other objects exposing __array_interface__ or
+    __array__. Encoded inputs (paths, bytes, 1-D buffers, files) and PIL
+    Images return None; they go through PIL.
+
+    Returns:
+        (H, W) or (H, W, C) uint8 array sharing the source's memory (bool
+        masks are the one exception: they are copied to 0/255), or None
+
+    Raises:
+        ValueError: for unsupported shapes or dtypes
+    """
+    if isinstance(source, np.ndarray):
+        pixels = source
+    elif isinstance(source, memoryview):
+        if source.ndim < 2:
+            return None
+        pixels = np.asarray(source)
+    elif isinstance(source, (Image.Image, bytes, bytearray, str)):
+        return None
+    elif hasattr(source, '__array_interface__') or hasattr(source, '__array__'):
+        pixels = np.asarray(source)
+    else:
+        return None
+
+    if pixels.ndim not in (2, 3) or (pixels.ndim == 3 and pixels.shape[2] not in (1, 2, 3, 4)):
+        raise ValueError(f"Expected an (H, W) or (H, W, 1-4) pixel array, got {pixels.shape}")
+    if pixels.dtype == bool:
+        return pixels.view(np.uint8) * np.uint8(255)
+    if pixels.dtype != np.uint8:
+        raise ValueError(f"Pixel arrays must be uint8, got {pixels.dtype}")
+    return pixels
+
+
+def frame_from_buffer(buffer, width: int, height: int, channels: int = 1,
+                      stride: Optional[int] = None, offset: int = 0) -> np.ndarray:
+    """
+    View a raw camera/rasterizer buffer as a pixel array (no copy)
+
+    Args:
+        buffer: bytes, bytearray, memoryview, mmap or any buffer-protocol object
+        channels: 1 (gray), 3 (RGB) or 4 (RGBA/RGBX), interleaved
+        stride: bytes per row including padding (default width * channels)
+        offset: bytes to skip before the first row
+
+    Returns:
+        (height, width) or (height, width, channels) uint8 view of buffer
+    """
+    stride = stride or width * channels
+    if stride < width * channels:
+        raise ValueError(f"Stride {stride} is shorter than a row ({width * channels} bytes)")
+    flat = np.frombuffer(buffer, dtype=np.uint8, offset=offset)
+    needed = stride * (height - 1) + width * channels
+    if flat.size < needed:
+        raise ValueError(f"Buffer holds {flat.size} bytes, a {width}x{height}x{channels} "
+                         f"frame with stride {stride} needs {needed}")
+    frame = np.lib.stride_tricks.as_strided(flat, shape=(height, width, channels),
+                                            strides=(stride, channels, 1), writeable=False)
+    return frame[..., 0] if channels == 1 else frame
+
+
+def _fixed_point_mean(sums: np.ndarray, area: int) -> np.ndarray:
+    """Rounded sums / area the way Image.reduce() computes it (24-bit fixed point)"""
+    half = area // 2
+    if area & (area - 1) == 0:  # Power of two: the multiply is an exact shift
+        return ((sums + half) >> (area.bit_length() - 1)).astype(np.uint8)
+    # sums <= 255·area, so the product stays below 2**32
+    wide = sums.astype(np.uint32)
+    wide += np.uint32(half)
+    wide *= np.uint32((1 << 24) // area)
+    wide >>= np.uint32(24)
+    return wide.astype(np.uint8)
+
+
+def _box_reduce(pixels: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Average factor×factor blocks; the last row/column of blocks may be partial
+
+    Same fixed-point arithmetic as Image.reduce(), so results are identical.
+    Rows are summed first, as whole contiguous rows, then columns of the
+    already shortened array; both are `factor` strided adds rather than a
+    reduction over a tiny inner axis.
+    """
+    h, w = pixels.shape[:2]
+    dtype = np.uint16 if 255 * factor * factor <= 0xFFFF else np.uint32
+    rows = np.empty((-(-h // factor),) + pixels.shape[1:], dtype=dtype)
+    np.copyto(rows, pixels[0::factor])
+    for i in range(1, factor):
+        part = pixels[i::factor]
+        rows[:len(part)] += part
+    sums = rows[:, 0::factor].copy()
+    for i in range(1, factor):
+        part = rows[:, i::factor]
+        sums[:, :part.shape[1]] += part
+
+    out = _fixed_point_mean(sums, factor * factor)
+    # Partial blocks along the bottom and right edges average fewer pixels
+    bh, bw = h - (len(rows) - 1) * factor, w - (sums.shape[1] - 1) * factor
+    if bh < factor:
+        out[-1] = _fixed_point_mean(sums[-1], bh * factor)
+    if bw < factor:
+        out[:, -1] = _fixed_point_mean(sums[:, -1], factor * bw)
+    if bh < factor and bw < factor:
+        out[-1, -1] = _fixed_point_mean(sums[-1, -1], bh * bw)
+    return out
+
+
+def array_to_gray(pixels: np.ndarray, factor: int = 1) -> np.ndarray:
+    """
+    Grayscale and box-reduce a uint8 pixel array
+
+    Equivalent to Image.fromarray(pixels).reduce(factor).convert('L') for
+    gray and RGB arrays only. Alpha (and the A of LA) is ignored: colour
+    is averaged unweighted, whereas PIL premultiplies alpha before
+    reducing RGBA/LA, so with factor > 1 blocks holding (semi-)transparent
+    pixels can differ from PIL's result. Gray input with factor 1 is
+    returned as is, a view; otherwise the source is
+    processed in strips of about GRAY_STRIP_PIXELS pixels, so besides the
+    result only one strip's temporaries are allocated.
+
+    Args:
+        pixels: (H, W) or (H, W, C) uint8 array, e.g. from pixel_array()
+        factor: integer shrink factor (1 = full resolution)
+
+    Returns:
+        2-D uint8 array of shape ceil(H / factor) × ceil(W / factor)
+    """
+    if pixels.ndim == 3 and pixels.shape[2] < 3:
+        pixels = pixels[..., 0]
+    if pixels.ndim == 2 and factor <= 1:
+        return pixels
+    h, w = pixels.shape[:2]
+    out = np.empty((-(-h // factor), -(-w // factor)), dtype=np.uint8)
+    step = max(factor, GRAY_STRIP_PIXELS // w // factor * factor)  # Whole blocks per strip
+    scratch = None
+    for y in range(0, h, step):
+        strip = pixels[y:y + step]
+        if factor > 1:
+            strip = _box_reduce(strip, factor)
+        rows = out[y // factor:y // factor + strip.shape[0]]
+        if strip.ndim == 2:
+            rows[:] = strip
+            continue
+        if scratch is None or scratch[0].shape != strip.shape[:2]:
+            scratch = (np.empty(strip.shape[:2], dtype=np.uint32),
+                       np.empty(strip.shape[:2], dtype=np.uint32))
+        rgb_to_gray(strip, out=rows, scratch=scratch)
+    return out
+
+
+def image_size(image) -> Tuple[int, int]:
+    """(width, height) of a PIL Image or pixel array"""
+    if isinstance(image, np.ndarray):
+        return image.shape[1], image.shape[0]
+    return image.size
+
+
+def to_gray_array(image) -> np.ndarray:
+    """Convert a PIL Image or uint8 pixel array to a 2-D uint8 grayscale array"""
+    if isinstance(image, np.ndarray):
+        return array_to_gray(image)
+    if image.mode != 'L':
+        image = image.convert('L')
+    return np.asarray(image, dtype=np.uint8)
+
+
+def binary_to_image(binary: np.ndarray) -> Image.Image:
+    """Wrap a boolean mask as a mode '1' PIL Image"""
+    return Image.fromarray(np.ascontiguousarray(binary, dtype=bool))
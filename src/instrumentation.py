@@ -0,0 +1,142 @@
+"""
+Instrumentation
+Opt-in stage timers, counters, metrics callbacks and structured logging
+"""
+
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional
+
+from config import DEBUG, VERBOSE
+
+LOGGER_NAME = "src"  # Parent of every module logger (logging.getLogger(__name__))
+
+MetricsCallback = Callable[[Dict], None]
+
+_NULL_STAGE = nullcontext()
+
+
+def configure_logging(level: Optional[int] = None) -> logging.Logger:
+    """
+    Attach a console handler to the package logger
+
+    The level follows config.py: DEBUG=true → DEBUG, VERBOSE=true → INFO,
+    otherwise WARNING. Entry points (app, CLI, benchmarks) call this once;
+    library modules only create loggers.
+    """
+    if level is None:
+        level = logging.DEBUG if DEBUG else logging.INFO if VERBOSE else logging.WARNING
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+
+def log_event(logger: logging.Logger, level: int, event: str, **fields):
+    """
+    Emit one structured record: "event key=value ..." with the fields also
+    attached as record.fields for handlers that ship JSON
+    """
+    if logger.isEnabledFor(level):
+        text = " ".join(f"{k}={v}" for k, v in fields.items())
+        logger.log(level, f"{event} {text}" if text else event, extra={"fields": fields})
+
+
+class _Stage:
+    """Context manager timing one stage of an enabled Instrumentation"""
+    __slots__ = ("owner", "name", "start")
+
+    def __init__(self, owner: "Instrumentation", name: str):
+        self.owner = owner
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.owner.record(self.name, (time.perf_counter() - self.start) * 1e3,
+                          failed=exc_type is not None)
+        return False
+
+
+class Instrumentation:
+    """
+    Per-stage timings and counters for a converter
+
+    When disabled, stage() returns a shared no-op context manager and
+    count() returns immediately, so instrumented code paths cost one
+    attribute check.
+
+    Usage:
+        metrics = Instrumentation(enabled=True, callback=print)
+        with metrics.stage("decode"):
+            ...
+        metrics.count("pixels_processed", gray.size)
+        metrics.report()
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, callback: Optional[MetricsCallback] = None,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            enabled: collect metrics (defaults to config DEBUG)
+            callback: called with {"stage", "ms", "failed"} after every stage
+            logger: structured log target for stage events (DEBUG level)
+        """
+        self.enabled = DEBUG if enabled is None else enabled
+        self.callback = callback
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all timings and counters"""
+        with self._lock:
+            self.stages: Dict[str, Dict[str, float]] = {}
+            self.counters: Dict[str, int] = {}
+
+    def stage(self, name: str):
+        """Context manager timing the enclosed block as `name`"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record(self, name: str, ms: float, failed: bool = False):
+        """Add one timing (used by stage(), or directly for externally timed work)"""
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                entry = self.stages[name] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0}
+            entry["calls"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+        log_event(self.logger, logging.DEBUG, "stage", name=name, ms=round(ms, 3), failed=failed)
+        if self.callback is not None:
+            self.callback({"stage": name, "ms": ms, "failed": failed})
+
+    def count(self, name: str, amount: int = 1):
+        """Increment a counter (e.g. pixels_processed, bytes_written)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + int(amount)
+
+    def report(self) -> Dict:
+        """Snapshot: per-stage calls/total/mean/max ms plus counters"""
+        with self._lock:
+            stages = {
+                name: {"calls": s["calls"], "total_ms": round(s["total_ms"], 3),
+                       "mean_ms": round(s["total_ms"] / s["calls"], 3),
+                       "max_ms": round(s["max_ms"], 3)}
+                for name, s in self.stages.items()
+            }
+            return {"stages": stages, "counters": dict(self.counters)}
+
+
+NULL_INSTRUMENTATION = Instrumentation(enabled=False)
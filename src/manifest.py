@@ -0,0 +1,106 @@
+"""
+Conversion Manifest
+Track which source images already have up-to-date outputs
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+from src.pattern_cache import image_hash
+from src.utils import ensure_parent
+
+MANIFEST_VERSION = 1
+
+
+class ConversionManifest:
+    """
+    JSON record of source stat, content hash and outputs per converted image
+
+    An entry is current when the source's (mtime, size) match the record,
+    the conversion settings key is unchanged and every output still exists.
+    When only the mtime moved (touch, copy, checkout) the content hash is
+    compared before declaring the entry stale, so unchanged files are
+    never reconverted. Checking a current entry costs one stat() call.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = {}
+        self._dirty = False
+        if self.path.is_file():
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.entries = data.get("entries", {})
+            except (OSError, ValueError):
+                self.entries = {}  # Corrupt manifest: everything is reconverted
+
+    @staticmethod
+    def _key(source: Union[str, os.PathLike]) -> str:
+        return os.path.abspath(source)
+
+    def is_current(self, source: Union[str, os.PathLike], settings_key: str,
+                   stat: Optional[os.stat_result] = None) -> bool:
+        """True if `source` was converted with settings_key and is unchanged"""
+        entry = self.entries.get(self._key(source))
+        if entry is None or entry["settings"] != settings_key:
+            return False
+        if not all(os.path.exists(p) for p in entry["outputs"]):
+            return False
+        stat = stat or os.stat(source)
+        if entry["size"] != stat.st_size:
+            return False
+        if entry["mtime_ns"] != stat.st_mtime_ns:
+            if image_hash(source) != entry["hash"]:
+                return False
+            entry["mtime_ns"] = stat.st_mtime_ns
+            self._dirty = True
+        return True
+
+    def record(self, source: Union[str, os.PathLike], settings_key: str, outputs: Iterable,
+               content_hash: Optional[str] = None, stat: Optional[os.stat_result] = None):
+        """
+        Store the result of converting `source`
+
+        Args:
+            content_hash: image_hash() of the contents that were converted
+            stat: os.stat() taken before those contents were read
+
+        Pass both when available: stat-ing and hashing here, after the
+        conversion, reads the file again and records a version that was
+        never converted if it changed during the run.
+        """
+        stat = stat or os.stat(source)
+        self.entries[self._key(source)] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": content_hash or image_hash(source),
+            "settings": settings_key,
+            "outputs": [os.fspath(p) for p in outputs],
+        }
+        self._dirty = True
+
+    def forget(self, source: Union[str, os.PathLike]):
+        if self.entries.pop(self._key(source), None) is not None:
+            self._dirty = True
+
+    def outputs(self, source: Union[str, os.PathLike]) -> List[str]:
+        entry = self.entries.get(self._key(source))
+        return list(entry["outputs"]) if entry else []
+
+    def save(self, force: bool = False):
+        """Write atomically (temp file + rename) if anything changed"""
+        if not (self._dirty or force):
+            return
+        ensure_parent(self.path)
+        tmp = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,221 @@
+"""
+Pattern Cache
+Content-addressed cache of converted tactile matrices (memory LRU + optional disk tier)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+from config import CACHE_CONFIG
+from src.utils import ensure_dir
+
+
+def image_hash(image_input) -> str:
+    """
+    Hash image content independently of how it was supplied
+
+    Args:
+        image_input: path, raw encoded bytes, file-like object, PIL Image or
+            pixel array
+
+    Returns:
+        Hex digest (blake2b, 128-bit)
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(image_input, np.ndarray) or (isinstance(image_input, memoryview)
+                                               and image_input.ndim > 1):
+        # Pixel arrays: shape and dtype count, and strided views hash row by row
+        pixels = np.asarray(image_input)
+        h.update(f"{pixels.dtype.str}:{pixels.shape}".encode())
+        if pixels.flags.c_contiguous:
+            h.update(memoryview(pixels).cast('B'))
+        else:
+            for row in pixels:
+                h.update(np.ascontiguousarray(row).data)
+    elif isinstance(image_input, (str, os.PathLike)):
+        with open(image_input, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    elif isinstance(image_input, (bytes, bytearray, memoryview)):
+        h.update(image_input)
+    elif isinstance(image_input, Image.Image):
+        h.update(f"{image_input.mode}:{image_input.size}".encode())
+        h.update(image_input.tobytes())
+    elif hasattr(image_input, 'read'):
+        pos = image_input.tell()
+        for block in iter(lambda: image_input.read(1 << 20), b''):
+            h.update(block)
+        image_input.seek(pos)
+    else:
+        raise ValueError("Cannot hash input: expected path, bytes, file, PIL Image or array")
+    return h.hexdigest()
+
+
+def make_key(content_hash: str, params: Dict) -> str:
+    """Combine an image hash with conversion parameters into a cache key"""
+    encoded = json.dumps(params, sort_keys=True, default=str).encode()
+    return content_hash + '-' + hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+class PatternCache:
+    """
+    Two-tier cache of base (non-inverted) tactile matrices
+
+    The memory tier is an LRU bounded by entry count and total bytes. The
+    optional disk tier stores one .npy file per key and evicts the least
+    recently used files once it exceeds its byte budget. Thread-safe.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 disk_dir: Optional[Path] = None, max_disk_bytes: Optional[int] = None):
+        """
+        Args:
+            max_entries: memory-tier entry limit
+            max_bytes: memory-tier byte limit
+            disk_dir: directory for the disk tier (None = memory only)
+            max_disk_bytes: disk-tier byte limit
+        """
+        # An explicit 0 is honoured (0 entries = memory tier disabled)
+        self.max_entries = CACHE_CONFIG["max_entries"] if max_entries is None else max_entries
+        self.max_bytes = CACHE_CONFIG["max_bytes"] if max_bytes is None else max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_bytes = (CACHE_CONFIG["max_disk_bytes"] if max_disk_bytes is None
+                               else max_disk_bytes)
+
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0,
+                       "disk_evictions": 0}
+
+        self._disk_bytes = 0
+        if self.disk_dir and self.disk_dir.is_dir():
+            self._disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob('*.npy'))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Return the cached matrix for key, or None"""
+        with self._lock:
+            matrix = self._entries.get(key)
+            if matrix is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return matrix
+
+        matrix = self._disk_get(key)
+        with self._lock:
+            if matrix is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._insert(key, matrix)
+        return matrix
+
+    def put(self, key: str, matrix: np.ndarray):
+        """Store a matrix in both tiers"""
+        matrix = np.array(matrix, copy=True)
+        matrix.flags.writeable = False
+        with self._lock:
+            self._insert(key, matrix)
+        self._disk_put(key, matrix)
+
+    def clear(self):
+        """Drop the memory tier (disk files are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current tier sizes"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = self._stats["hits"] + self._stats["disk_hits"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "disk_bytes": self._disk_bytes,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _insert(self, key: str, matrix: np.ndarray):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        self._entries[key] = matrix
+        self._bytes += matrix.nbytes
+        while self._entries and (len(self._entries) > self.max_entries or
+                                 self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self._stats["evictions"] += 1
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.npy"
+
+    def _disk_get(self, key: str) -> Optional[np.ndarray]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            matrix = np.load(path, allow_pickle=False)
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError):
+            return None
+        matrix.flags.writeable = False
+        return matrix
+
+    def _disk_put(self, key: str, matrix: np.ndarray):
+        if not self.disk_dir:
+            return
+        ensure_dir(self.disk_dir)
+        path = self._disk_path(key)
+        try:
+            previous = path.stat().st_size
+        except OSError:
+            previous = 0
+        # A unique temp file per writer: threads storing the same key must
+        # not share one, and os.replace keeps the final rename atomic
+        with tempfile.NamedTemporaryFile(dir=self.disk_dir, prefix=f"{key}.", suffix='.tmp',
+                                         delete=False) as f:
+            np.save(f, matrix, allow_pickle=False)
+            size = f.tell()
+        try:
+            os.replace(f.name, path)
+        except OSError:
+            Path(f.name).unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self._disk_bytes += size - previous
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Other processes sharing the directory may delete files under us
+        files = []
+        for path in self.disk_dir.glob('*.npy'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort(key=lambda f: f[0])
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes * 0.9:
+                break
+            try:
+                path.unlink()
+                self._stats["disk_evictions"] += 1
+            except FileNotFoundError:
+                pass  # Already evicted elsewhere; it no longer counts either way
+            total -= size
+        self._disk_bytes = total
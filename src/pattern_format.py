@@ -0,0 +1,182 @@
+"""
+Bit-Packed Pattern Format
+Row-aligned np.packbits storage, .bin files and compact Arduino/ESP32 export
+"""
+
+import hashlib
+import io
+import os
+import struct
+from typing import BinaryIO, Iterable, Tuple, Union
+
+import numpy as np
+
+from src.utils import ensure_parent
+
+# .bin header: magic, version, flags, rows, cols, pattern count (little-endian, 16 bytes)
+BIN_MAGIC = b'TPAT'
+BIN_VERSION = 1
+BIN_HEADER = struct.Struct('<4sBBHHI2x')
+_DIMS = struct.Struct('<II')
+
+# "0x00".."0xFF" lookup used to emit C arrays without per-byte formatting
+_HEX_TABLE = np.array([f"0x{i:02X}" for i in range(256)])
+
+PathOrFile = Union[str, os.PathLike, BinaryIO]
+
+
+def row_bytes(cols: int) -> int:
+    """Bytes per packed row (rows are padded to whole bytes)"""
+    return (cols + 7) // 8
+
+
+def pack_pattern(matrix: np.ndarray) -> np.ndarray:
+    """
+    Pack a binary matrix (or a stack of them) into row-aligned bytes
+
+    Bit 7 of byte 0 is column 0, so every row starts on a byte boundary.
+
+    Args:
+        matrix: (rows, cols) or (n, rows, cols) array of 0/1
+
+    Returns:
+        uint8 array of shape (..., rows, row_bytes(cols))
+    """
+    return np.packbits(np.asarray(matrix) != 0, axis=-1)
+
+
+def unpack_pattern(packed: np.ndarray, cols: int) -> np.ndarray:
+    """Inverse of pack_pattern; returns uint8 0/1 of shape (..., rows, cols)"""
+    return np.unpackbits(packed, axis=-1, count=cols)
+
+
+def matrix_hash(matrix: np.ndarray) -> str:
+    """Content hash of a binary pattern (shape + packed bits), for memoization keys"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(_DIMS.pack(*matrix.shape[-2:]))
+    h.update(pack_pattern(matrix).tobytes())
+    return h.hexdigest()
+
+
+def _open(target: PathOrFile, mode: str):
+    if isinstance(target, (str, os.PathLike)):
+        if 'w' in mode:
+            ensure_parent(target)
+        return open(target, mode), True
+    return target, False
+
+
+def save_patterns(target: PathOrFile, matrices: Union[np.ndarray, Iterable[np.ndarray]]):
+    """
+    Write one or more equally sized patterns as a single .bin blob
+
+    Packing and writing are one vectorized call each, whatever the count.
+
+    Args:
+        target: path or binary file object
+        matrices: (rows, cols), (n, rows, cols) array or iterable of matrices
+    """
+    if not isinstance(matrices, np.ndarray):
+        matrices = np.stack(list(matrices))
+    if matrices.ndim == 2:
+        matrices = matrices[np.newaxis]
+    count, rows, cols = matrices.shape
+    header = BIN_HEADER.pack(BIN_MAGIC, BIN_VERSION, 0, rows, cols, count)
+    packed = pack_pattern(matrices)
+
+    f, owned = _open(target, 'wb')
+    try:
+        f.write(header)
+        f.write(packed.tobytes())
+    finally:
+        if owned:
+            f.close()
+
+
+def read_header(f: BinaryIO) -> Tuple[int, int, int]:
+    """Read and validate a .bin header; returns (count, rows, cols)"""
+    raw = f.read(BIN_HEADER.size)
+    if len(raw) != BIN_HEADER.size:
+        raise ValueError("Truncated pattern file header")
+    magic, version, _flags, rows, cols, count = BIN_HEADER.unpack(raw)
+    if magic != BIN_MAGIC:
+        raise ValueError("Not a tactile pattern file")
+    if version != BIN_VERSION:
+        raise ValueError(f"Unsupported pattern file version {version}")
+    return count, rows, cols
+
+
+def load_packed(source: PathOrFile, mmap: bool = False) -> Tuple[np.ndarray, int]:
+    """
+    Load the packed bytes of a .bin file without unpacking
+
+    Args:
+        source: path or binary file object
+        mmap: memory-map the data instead of reading it (paths only)
+
+    Returns:
+        (packed array of shape (n, rows, row_bytes), cols)
+    """
+    f, owned = _open(source, 'rb')
+    try:
+        count, rows, cols = read_header(f)
+        shape = (count, rows, row_bytes(cols))
+        if mmap and owned:
+            packed = np.memmap(f.name, dtype=np.uint8, mode='r',
+                               offset=BIN_HEADER.size, shape=shape)
+        else:
+            data = f.read(int(np.prod(shape)))
+            packed = np.frombuffer(data, dtype=np.uint8).reshape(shape)
+    finally:
+        if owned:
+            f.close()
+    return packed, cols
+
+
+def load_patterns(source: PathOrFile, mmap: bool = False) -> np.ndarray:
+    """Load every pattern in a .bin file as an (n, rows, cols) uint8 array"""
+    packed, cols = load_packed(source, mmap=mmap)
+    return unpack_pattern(packed, cols)
+
+
+def pattern_to_bin(matrix: np.ndarray) -> bytes:
+    """Single pattern as .bin bytes (header + packed rows)"""
+    buffer = io.BytesIO()
+    save_patterns(buffer, matrix)
+    return buffer.getvalue()
+
+
+def c_byte_rows(packed: np.ndarray, indent: str = '  ') -> str:
+    """Format a (rows, row_bytes) array as C initializer rows"""
+    cells = _HEX_TABLE[packed]
+    lines = [indent + '{' + ', '.join(row) + '}' for row in cells]
+    return ',\n'.join(lines)
+
+
+def arduino_packed_source(matrix: np.ndarray, ball_diameter: float, ball_spacing: float,
+                          name: str = 'tactilePattern') -> str:
+    """
+    Arduino/ESP32 sketch fragment storing the pattern bit-packed in flash
+
+    The pattern lives in PROGMEM as ROWS × ROW_BYTES bytes (128 bytes for
+    32×32) and is read through the generated accessor.
+    """
+    rows, cols = matrix.shape
+    packed = pack_pattern(matrix)
+    return (
+        f"// Tactile Display Pattern - {rows}×{cols} (bit-packed)\n"
+        f"// {ball_diameter}mm balls, {ball_spacing}mm spacing\n"
+        f"// Generated by AI Visual Accessibility System\n"
+        f"// Bit 7 of each byte is the leftmost column of that byte\n\n"
+        f"#include <Arduino.h>\n\n"
+        f"const uint16_t ROWS = {rows};\n"
+        f"const uint16_t COLS = {cols};\n"
+        f"const uint16_t ROW_BYTES = {packed.shape[1]};\n\n"
+        f"const uint8_t {name}[ROWS][ROW_BYTES] PROGMEM = {{\n"
+        f"{c_byte_rows(packed)}\n"
+        f"}};\n\n"
+        f"inline bool {name}Cell(uint16_t row, uint16_t col) {{\n"
+        f"  return pgm_read_byte(&{name}[row][col >> 3]) & (0x80 >> (col & 7));\n"
+        f"}}\n\n"
+        f"// Usage: if ({name}Cell(row, col)) raiseBall(row, col);\n"
+    )
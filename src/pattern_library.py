@@ -0,0 +1,400 @@
+"""
+Pattern Library
+Memory-mapped store of packed patterns with exact and Hamming-distance lookup
+
+A library is a directory:
+    index.jsonl     one line per pattern: id, shape, slot, hash, name, meta
+    <R>x<C>.bin     every pattern of that shape as one .bin file (pattern_format),
+                    memory-mapped for queries
+
+Patterns are only compared with patterns of the same shape.
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from config import PATTERN_LIBRARY_CONFIG
+from src.pattern_format import (BIN_HEADER, BIN_MAGIC, BIN_VERSION, matrix_hash,
+                                pack_pattern, read_header, row_bytes, unpack_pattern)
+from src.utils import ensure_dir
+
+GridShape = Tuple[int, int]
+
+# Bits set per byte value, for NumPy builds without np.bitwise_count (< 2.0)
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def hamming_distances(codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """
+    Bit differences between each row of codes and query
+
+    Args:
+        codes: (n, words) uint64
+        query: (words,) uint64
+
+    Returns:
+        (n,) int64 distances
+    """
+    diff = codes ^ query
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(diff).sum(axis=1, dtype=np.int64)
+    return _POPCOUNT8[diff.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+
+def _to_words(packed: np.ndarray) -> np.ndarray:
+    """(n, rows, row_bytes) packed patterns as (n, words) uint64, zero-padded"""
+    flat = packed.reshape(len(packed), -1)
+    if flat.shape[1] % 8:
+        padded = np.zeros((len(flat), -(-flat.shape[1] // 8) * 8), dtype=np.uint8)
+        padded[:, :flat.shape[1]] = flat
+        flat = padded
+    return flat.view(np.uint64)
+
+
+@dataclass(frozen=True)
+class PatternRecord:
+    """One stored pattern"""
+    id: int
+    shape: GridShape
+    slot: int  # Position in the shape's .bin file
+    hash: str  # matrix_hash of the pattern
+    name: Optional[str] = None
+    meta: Optional[Dict] = None
+
+    def to_json(self) -> str:
+        return json.dumps({"id": self.id, "shape": list(self.shape), "slot": self.slot,
+                           "hash": self.hash, "name": self.name, "meta": self.meta})
+
+
+@dataclass(frozen=True)
+class Match:
+    """A nearest-neighbour result"""
+    record: PatternRecord
+    distance: int  # Differing pins
+
+
+class _ShapeStore:
+    """
+    The .bin file of one shape, its memory map and its search indexes
+
+    Codes are the packed rows viewed as uint64 words (a padded copy when a
+    pattern is not a whole number of words). Multi-index hashing keeps one
+    sorted copy of every word position: by the pigeonhole principle a code
+    within distance r < words of the query matches it exactly in at least
+    one word, so a few binary searches give every candidate.
+    """
+
+    def __init__(self, path: Path, shape: GridShape):
+        self.path = path
+        self.shape = shape
+        self.pattern_bytes = shape[0] * row_bytes(shape[1])
+        self.count = 0
+        self._packed: Optional[np.ndarray] = None
+        self._codes: Optional[np.ndarray] = None
+        self._tables: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None
+        self.slot_ids = np.zeros(0, dtype=np.int64)  # Record id of each slot
+        if path.exists():
+            with open(path, 'rb') as f:
+                count, rows, cols = read_header(f)
+            if (rows, cols) != shape:
+                raise ValueError(f"{path} holds {rows}x{cols} patterns, expected {shape}")
+            self.count = count
+
+    def truncate(self, count: int):
+        """Drop slots past count (written to the .bin but never indexed)"""
+        if count < self.count:
+            with open(self.path, 'r+b') as f:
+                f.write(BIN_HEADER.pack(BIN_MAGIC, BIN_VERSION, 0, *self.shape, count))
+                f.truncate(BIN_HEADER.size + count * self.pattern_bytes)
+            self.count = count
+
+    def append(self, packed: np.ndarray) -> int:
+        """Append (n, rows, row_bytes) packed patterns; returns the first new slot"""
+        first = self.count
+        mode = 'r+b' if self.path.exists() else 'w+b'
+        with open(self.path, mode) as f:
+            f.seek(BIN_HEADER.size + first * self.pattern_bytes)
+            f.write(np.ascontiguousarray(packed).tobytes())
+            f.seek(0)
+            f.write(BIN_HEADER.pack(BIN_MAGIC, BIN_VERSION, 0, *self.shape, first + len(packed)))
+        self.count = first + len(packed)
+        self._packed = self._codes = self._tables = None
+        return first
+
+    @property
+    def packed(self) -> np.ndarray:
+        if self._packed is None:
+            shape = (self.count, self.shape[0], row_bytes(self.shape[1]))
+            if self.count:
+                self._packed = np.memmap(self.path, dtype=np.uint8, mode='r',
+                                         offset=BIN_HEADER.size, shape=shape)
+            else:
+                self._packed = np.zeros(shape, dtype=np.uint8)
+        return self._packed
+
+    @property
+    def codes(self) -> np.ndarray:
+        if self._codes is None:
+            self._codes = _to_words(self.packed)
+        return self._codes
+
+    def tables(self) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Per word position: (slots sorted by that word, the sorted words)"""
+        if self._tables is None:
+            codes = self.codes
+            self._tables = []
+            for j in range(codes.shape[1]):
+                order = np.argsort(codes[:, j], kind='stable')
+                self._tables.append((order, codes[order, j]))
+        return self._tables
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        """Slots sharing at least one whole word with query"""
+        found = []
+        for word, (order, values) in zip(query, self.tables()):
+            lo, hi = np.searchsorted(values, word, 'left'), np.searchsorted(values, word, 'right')
+            found.append(order[lo:hi])
+        return np.unique(np.concatenate(found))
+
+
+class PatternLibrary:
+    """
+    Deduplicating pattern store with exact and nearest-neighbour lookup
+
+    Exact lookup is a dictionary hit on matrix_hash. nearest() compares
+    packed codes with XOR and popcount, 64 pins per operation, in chunks
+    over the memory-mapped file. With a max_distance below the number of
+    64-bit words per pattern it first narrows the search with multi-index
+    hashing and only scans every code when that rules out too little.
+
+    Additions are appended to the shape's .bin file and then to
+    index.jsonl, so an interrupted write leaves at most unindexed slots,
+    which are dropped on the next open. Thread-safe; one writer process.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike, None] = None):
+        """
+        Args:
+            path: library directory (created on first add); defaults to
+                PATTERN_LIBRARY_CONFIG["path"]
+        """
+        self.path = Path(path or PATTERN_LIBRARY_CONFIG["path"])
+        self.scan_chunk = PATTERN_LIBRARY_CONFIG["scan_chunk"]
+        self.max_candidate_fraction = PATTERN_LIBRARY_CONFIG["max_candidate_fraction"]
+        self._records: List[PatternRecord] = []
+        self._by_hash: Dict[str, int] = {}
+        self._stores: Dict[GridShape, _ShapeStore] = {}
+        self._lock = threading.RLock()
+        self._load()
+
+    @property
+    def index_path(self) -> Path:
+        return self.path / "index.jsonl"
+
+    def _store(self, shape: GridShape) -> _ShapeStore:
+        store = self._stores.get(shape)
+        if store is None:
+            store = _ShapeStore(self.path / f"{shape[0]}x{shape[1]}.bin", shape)
+            self._stores[shape] = store
+        return store
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+        good, torn = 0, False  # Byte offset just past the last valid line
+        with open(self.index_path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        torn = True  # Interrupted write
+                        break
+                    record = PatternRecord(entry["id"], tuple(entry["shape"]), entry["slot"],
+                                           entry["hash"], entry.get("name"), entry.get("meta"))
+                    self._records.append(record)
+                good += len(line)
+        if torn:
+            # Cut the fragment off, or the next append would be glued onto it
+            # and lost, with everything after it, on the following load
+            os.truncate(self.index_path, good)
+        # Records are looked up by id and store rows by slot, whatever the line order
+        self._records.sort(key=lambda record: record.id)
+        self._by_hash = {record.hash: record.id for record in self._records}
+        slots: Dict[GridShape, List[int]] = {}
+        for record in sorted(self._records, key=lambda record: record.slot):
+            slots.setdefault(record.shape, []).append(record.id)
+        for shape, ids in slots.items():
+            store = self._store(shape)
+            store.truncate(len(ids))
+            store.slot_ids = np.array(ids, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[PatternRecord]:
+        return iter(list(self._records))
+
+    def __contains__(self, item) -> bool:
+        key = item if isinstance(item, str) else matrix_hash(np.asarray(item))
+        return key in self._by_hash
+
+    def get(self, key: str) -> Optional[PatternRecord]:
+        """Record by matrix_hash"""
+        index = self._by_hash.get(key)
+        return None if index is None else self._records[index]
+
+    def find(self, matrix: np.ndarray) -> Optional[PatternRecord]:
+        """Exact match of a pattern"""
+        return self.get(matrix_hash(np.asarray(matrix)))
+
+    def load(self, record: PatternRecord) -> np.ndarray:
+        """The stored uint8 matrix of a record"""
+        with self._lock:
+            packed = np.array(self._stores[record.shape].packed[record.slot])
+        return unpack_pattern(packed, record.shape[1])
+
+    def add(self, matrix: np.ndarray, name: Optional[str] = None, meta: Optional[Dict] = None,
+            max_distance: Optional[int] = None) -> Tuple[PatternRecord, bool]:
+        """
+        Store a pattern unless it (or a near duplicate) is already there
+
+        Args:
+            max_distance: treat a stored pattern within this many differing
+                pins as the same pattern (None = exact duplicates only)
+
+        Returns:
+            (record, whether it was added)
+        """
+        ((record, added),) = self.add_many([matrix], [name], [meta], max_distance)
+        return record, added
+
+    def add_many(self, matrices: Iterable[np.ndarray], names: Optional[Sequence] = None,
+                 metas: Optional[Sequence] = None,
+                 max_distance: Optional[int] = None) -> List[Tuple[PatternRecord, bool]]:
+        """
+        Store many patterns with one append per shape
+
+        Exact duplicates are resolved within the batch as well; near
+        duplicates (max_distance) only against patterns stored before it.
+
+        Returns:
+            (record, added) per input, in order
+        """
+        matrices = [np.asarray(m) for m in matrices]
+        names = names or [None] * len(matrices)
+        metas = metas or [None] * len(matrices)
+        with self._lock:
+            results: List[Optional[Tuple[PatternRecord, bool]]] = []
+            pending: Dict[GridShape, List[int]] = {}
+            batch_hashes: Dict[str, int] = {}
+            keys = []
+            for i, matrix in enumerate(matrices):
+                if matrix.ndim != 2:
+                    raise ValueError(f"Patterns must be 2-D, got shape {matrix.shape}")
+                key = matrix_hash(matrix)
+                keys.append(key)
+                existing = self.get(key)
+                if existing is None and max_distance:
+                    near = self.nearest(matrix, k=1, max_distance=max_distance)
+                    existing = near[0].record if near else None
+                if existing is not None:
+                    results.append((existing, False))
+                elif key in batch_hashes:
+                    results.append(batch_hashes[key])  # Resolved to its first copy below
+                else:
+                    batch_hashes[key] = i
+                    pending.setdefault(matrix.shape, []).append(i)
+                    results.append(None)
+
+            slots: Dict[int, int] = {}
+            for shape, indices in pending.items():
+                store = self._store(shape)
+                ensure_dir(self.path)
+                store.truncate(len(store.slot_ids))
+                first = store.append(pack_pattern(np.stack([matrices[i] for i in indices])))
+                slots.update((i, first + offset) for offset, i in enumerate(indices))
+            # Ids follow input order, matching the order index lines are written
+            new: Dict[int, PatternRecord] = {}
+            for i in sorted(slots):
+                record = PatternRecord(len(self._records), matrices[i].shape, slots[i],
+                                       keys[i], names[i], metas[i])
+                self._records.append(record)
+                self._by_hash[record.hash] = record.id
+                new[i] = record
+            for shape, indices in pending.items():
+                store = self._store(shape)
+                store.slot_ids = np.concatenate([store.slot_ids,
+                                                 [new[i].id for i in indices]])
+            if new:
+                with open(self.index_path, 'a+b') as f:
+                    end = f.seek(0, os.SEEK_END)
+                    if end:
+                        f.seek(end - 1)
+                        if f.read(1) != b'\n':
+                            f.write(b'\n')  # Never glue a record onto an unterminated line
+                    f.write(''.join(new[i].to_json() + '\n' for i in sorted(new)).encode())
+
+            return [(new[i], True) if result is None
+                    else (new[result], False) if isinstance(result, int)
+                    else result
+                    for i, result in enumerate(results)]
+
+    def nearest(self, matrix: np.ndarray, k: int = 1,
+                max_distance: Optional[int] = None) -> List[Match]:
+        """
+        The k stored patterns of the same shape closest in Hamming distance
+
+        Args:
+            k: number of matches
+            max_distance: ignore patterns with more differing pins
+
+        Returns:
+            Matches by increasing distance (ties by id); empty when nothing
+            of this shape is stored or within max_distance
+        """
+        matrix = np.asarray(matrix)
+        with self._lock:
+            store = self._stores.get(matrix.shape)
+            if store is None or store.count == 0:
+                return []
+            query = _to_words(pack_pattern(matrix)[np.newaxis])[0]
+            codes = store.codes
+
+            slots = None
+            if max_distance is not None and max_distance < codes.shape[1]:
+                slots = store.candidates(query)
+                if len(slots) > self.max_candidate_fraction * store.count:
+                    slots = None  # Common words: a plain scan is cheaper
+            if slots is not None:
+                distances = hamming_distances(codes[slots], query)
+            else:
+                slots = np.arange(store.count)
+                distances = np.concatenate([
+                    hamming_distances(codes[i:i + self.scan_chunk], query)
+                    for i in range(0, store.count, self.scan_chunk)])
+
+            if max_distance is not None:
+                keep = distances <= max_distance
+                slots, distances = slots[keep], distances[keep]
+            if len(slots) > k:
+                # Stable ties: partition on (distance, slot)
+                best = np.argpartition(distances * store.count + slots, k - 1)[:k]
+                slots, distances = slots[best], distances[best]
+            order = np.lexsort((slots, distances))
+            return [Match(self._records[store.slot_ids[s]], int(d))
+                    for s, d in zip(slots[order], distances[order])]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"patterns": len(self._records),
+                    "shapes": {f"{r}x{c}": store.count
+                               for (r, c), store in sorted(self._stores.items())},
+                    "bytes": sum(BIN_HEADER.size + s.count * s.pattern_bytes
+                                 for s in self._stores.values())}
@@ -0,0 +1,151 @@
+"""
+Pattern Renderer
+Draw tactile patterns as a single image from pre-rendered dot sprites
+"""
+
+import io
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from config import UI_CONFIG
+from src.pattern_format import matrix_hash
+
+_SUPERSAMPLE = 4
+
+
+def _hex_rgb(color: str) -> np.ndarray:
+    color = color.lstrip('#')
+    return np.array([int(color[i:i + 2], 16) for i in (0, 2, 4)], dtype=np.float32)
+
+
+@lru_cache(maxsize=32)
+def dot_sprites(cell_px: int) -> np.ndarray:
+    """
+    Anti-aliased raised/lowered dot sprites for one cell size
+
+    Returns:
+        Read-only uint8 array (2, cell_px, cell_px, 3): [lowered, raised]
+    """
+    style = UI_CONFIG["preview"]
+    n = cell_px * _SUPERSAMPLE
+    centre = (n - 1) / 2
+    y, x = np.mgrid[0:n, 0:n]
+    dist = np.hypot(y - centre, x - centre) / _SUPERSAMPLE
+    radius = cell_px / 2 - style["margin_px"]
+
+    def coverage(mask):
+        # Box-filter the supersampled mask down to cell_px
+        return mask.reshape(cell_px, _SUPERSAMPLE, cell_px, _SUPERSAMPLE).mean(axis=(1, 3))[..., None]
+
+    background = _hex_rgb(style["background"])
+    disc = coverage(dist <= radius)
+    inner = coverage(dist <= radius - style["border_px"])
+
+    raised = background + disc * (_hex_rgb(style["raised"]) - background)
+    lowered = background + disc * (_hex_rgb(style["border"]) - background)
+    lowered = lowered + inner * (_hex_rgb(style["lowered"]) - lowered)
+
+    sprites = np.stack([lowered, raised]).round().astype(np.uint8)
+    sprites.flags.writeable = False
+    return sprites
+
+
+def cell_size(shape: Tuple[int, int], max_px: Optional[int] = None) -> int:
+    """Largest sprite size (capped by the config) that fits the grid in max_px"""
+    style = UI_CONFIG["preview"]
+    max_px = max_px or style["max_px"]
+    return int(np.clip(max_px // max(shape), style["min_cell_px"], style["cell_px"]))
+
+
+def render_array(matrix: np.ndarray, cell_px: Optional[int] = None) -> np.ndarray:
+    """
+    Composite the dot grid into one RGB array
+
+    A single fancy-index gathers a sprite per cell; the reshape then lays
+    the (rows, cols, cell, cell) blocks out as an image, with no Python
+    loop over cells.
+
+    Returns:
+        uint8 array (rows * cell_px, cols * cell_px, 3)
+    """
+    rows, cols = matrix.shape
+    cell_px = cell_px or cell_size(matrix.shape)
+    tiles = dot_sprites(cell_px)[(np.asarray(matrix) != 0).view(np.uint8)]
+    return tiles.transpose(0, 2, 1, 3, 4).reshape(rows * cell_px, cols * cell_px, 3)
+
+
+def render_raw(matrix: np.ndarray, cell_px: Optional[int] = None) -> Tuple[bytes, Tuple[int, int]]:
+    """Fast path: raw RGB bytes plus (height, width), skipping image encoding"""
+    arr = render_array(matrix, cell_px)
+    return arr.tobytes(), arr.shape[:2]
+
+
+def render_svg(matrix: np.ndarray, cell_px: Optional[int] = None) -> str:
+    """Vector preview: one <path> per dot state, so the DOM stays two nodes deep"""
+    style = UI_CONFIG["preview"]
+    rows, cols = matrix.shape
+    cell_px = cell_px or cell_size(matrix.shape)
+    r = cell_px / 2 - style["margin_px"]
+
+    def dots(cells):
+        cx = cells[:, 1] * cell_px + cell_px / 2
+        cy = cells[:, 0] * cell_px + cell_px / 2
+        return ''.join(f"M{x - r:g},{y:g}a{r:g},{r:g} 0 1,0 {2 * r:g},0a{r:g},{r:g} 0 1,0 {-2 * r:g},0"
+                       for x, y in zip(cx.tolist(), cy.tolist()))
+
+    mask = np.asarray(matrix) != 0
+    return (
+        f"<svg xmlns='http://www.w3.org/2000/svg' width='{cols * cell_px}' height='{rows * cell_px}'>"
+        f"<rect width='100%' height='100%' fill='{style['background']}'/>"
+        f"<path d='{dots(np.argwhere(~mask))}' fill='{style['lowered']}' "
+        f"stroke='{style['border']}' stroke-width='{style['border_px']}'/>"
+        f"<path d='{dots(np.argwhere(mask))}' fill='{style['raised']}'/>"
+        f"</svg>"
+    )
+
+
+class PreviewCache:
+    """Encoded previews keyed on (matrix hash, format, cell size), LRU-bounded"""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, matrix: np.ndarray, fmt: str = 'png', cell_px: Optional[int] = None):
+        """Return PNG bytes or SVG text for a pattern, rendering only on a miss"""
+        cell_px = cell_px or cell_size(matrix.shape)
+        key = (matrix_hash(matrix), fmt, cell_px)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        # Render outside the lock; concurrent misses on one key just render twice
+        if fmt == 'png':
+            buffer = io.BytesIO()
+            # Palette-free RGB with low compression: fast to encode, tiny for flat dots
+            Image.fromarray(render_array(matrix, cell_px)).save(buffer, 'PNG', compress_level=1)
+            value = buffer.getvalue()
+        elif fmt == 'svg':
+            value = render_svg(matrix, cell_px)
+        else:
+            raise ValueError(f"Unknown preview format: {fmt}")
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+_default_cache = PreviewCache()
+
+
+def render_png(matrix: np.ndarray, cell_px: Optional[int] = None) -> bytes:
+    """PNG preview of a pattern (memoized on the matrix hash)"""
+    return _default_cache.get(matrix, 'png', cell_px)
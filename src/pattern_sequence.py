@@ -0,0 +1,319 @@
+"""
+Pattern Sequences
+Keyframe + XOR/run-length delta container for multi-frame tactile slideshows
+"""
+
+import os
+import struct
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import HARDWARE_CONFIG
+from src.utils import ensure_parent
+from src.pattern_format import PathOrFile, c_byte_rows, pack_pattern, row_bytes, unpack_pattern
+
+# File layout: header | frame records ... | index (one entry per frame)
+SEQ_MAGIC = b'TSEQ'
+SEQ_VERSION = 1
+SEQ_HEADER = struct.Struct('<4sBBHHIHxxQ')  # magic, version, flags, rows, cols, frames,
+                                            # keyframe interval, index offset
+SEQ_INDEX = struct.Struct('<QIB3x')          # record offset (from file start), length, kind
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('length', '<u4'), ('kind', 'u1'), ('pad', 'V3')])
+
+KEYFRAME = 0  # Record holds the packed frame
+DELTA = 1     # Record holds RLE-coded XOR against the previous frame
+
+_RUN = struct.Struct('<HH')  # (bytes to skip, literal XOR bytes that follow)
+_MAX_RUN = 0xFFFF
+
+
+def encode_delta(previous: np.ndarray, current: np.ndarray) -> bytes:
+    """
+    Run-length code the XOR of two packed frames
+
+    The payload is a list of (skip, length) pairs, each followed by
+    `length` XOR bytes; unchanged bytes cost nothing but their skip count.
+    """
+    xor = np.bitwise_xor(previous, current).ravel()
+    changed = np.flatnonzero(xor)
+    if changed.size == 0:
+        return b''
+    breaks = np.flatnonzero(np.diff(changed) > 1) + 1
+    starts = changed[np.r_[0, breaks]]
+    ends = changed[np.r_[breaks - 1, changed.size - 1]] + 1
+
+    out = bytearray()
+    pos = 0
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        skip = start - pos
+        while skip > _MAX_RUN:
+            out += _RUN.pack(_MAX_RUN, 0)
+            skip -= _MAX_RUN
+        while start < end:
+            length = min(end - start, _MAX_RUN)
+            out += _RUN.pack(skip, length)
+            out += xor[start:start + length].tobytes()
+            start += length
+            skip = 0
+        pos = end
+    return bytes(out)
+
+
+def apply_delta(frame: np.ndarray, payload) -> np.ndarray:
+    """XOR an encode_delta payload into a packed frame in place"""
+    flat = frame.reshape(-1)
+    data = memoryview(payload)
+    pos = i = 0
+    while i < len(data):
+        skip, length = _RUN.unpack_from(data, i)
+        i += _RUN.size
+        pos += skip
+        flat[pos:pos + length] ^= np.frombuffer(data, np.uint8, length, i)
+        pos += length
+        i += length
+    return frame
+
+
+def changed_cells(payload, cols: int, row_width: int) -> np.ndarray:
+    """(row, col) pairs toggled by a delta payload, without decoding frames"""
+    data = memoryview(payload)
+    cells: List[np.ndarray] = []
+    pos = i = 0
+    while i < len(data):
+        skip, length = _RUN.unpack_from(data, i)
+        i += _RUN.size
+        pos += skip
+        xor = np.frombuffer(data, np.uint8, length, i)
+        bits = np.flatnonzero(np.unpackbits(xor)) + pos * 8
+        row, bit = np.divmod(bits, row_width * 8)
+        cells.append(np.column_stack([row, bit])[bit < cols])
+        pos += length
+        i += length
+    return np.concatenate(cells) if cells else np.empty((0, 2), dtype=np.int64)
+
+
+class SequenceWriter:
+    """
+    Append frames to a .tseq file one at a time
+
+    Every `keyframe_interval` frames (and whenever a delta would be larger
+    than the frame itself) a full keyframe is stored, bounding the work of
+    a random-access read.
+    """
+
+    def __init__(self, target: PathOrFile, rows: int, cols: int,
+                 keyframe_interval: Optional[int] = None):
+        self.rows, self.cols = rows, cols
+        self.keyframe_interval = keyframe_interval or HARDWARE_CONFIG["sequence_keyframe_interval"]
+        self._owned = isinstance(target, (str, os.PathLike))
+        self._f = open(ensure_parent(target), 'wb') if self._owned else target
+        self._start = self._f.tell()
+        self._f.write(b'\0' * SEQ_HEADER.size)
+        self._index: List[Tuple[int, int, int]] = []
+        self._previous: Optional[np.ndarray] = None
+        self._since_key = 0
+
+    def add(self, matrix: np.ndarray) -> int:
+        """Append one frame; returns the record size in bytes"""
+        if matrix.shape != (self.rows, self.cols):
+            raise ValueError(f"Frame shape {matrix.shape} != {(self.rows, self.cols)}")
+        packed = pack_pattern(matrix)
+        kind, record = KEYFRAME, packed.tobytes()
+        if self._previous is not None and self._since_key < self.keyframe_interval:
+            delta = encode_delta(self._previous, packed)
+            if len(delta) < len(record):
+                kind, record = DELTA, delta
+        self._since_key = self._since_key + 1 if kind == DELTA else 1
+
+        offset = self._f.tell() - self._start
+        self._f.write(record)
+        self._index.append((offset, len(record), kind))
+        self._previous = packed
+        return len(record)
+
+    def extend(self, matrices: Iterable[np.ndarray]):
+        for matrix in matrices:
+            self.add(matrix)
+
+    def close(self):
+        """Write the index and patch the header"""
+        if self._f is None:
+            return
+        index_offset = self._f.tell() - self._start
+        for entry in self._index:
+            self._f.write(SEQ_INDEX.pack(*entry))
+        end = self._f.tell()
+        self._f.seek(self._start)
+        self._f.write(SEQ_HEADER.pack(SEQ_MAGIC, SEQ_VERSION, 0, self.rows, self.cols,
+                                      len(self._index), self.keyframe_interval, index_offset))
+        self._f.seek(end)
+        if self._owned:
+            self._f.close()
+        self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SequenceReader:
+    """
+    Random-access reader over a memory-mapped .tseq file
+
+    Frame i is rebuilt from the nearest preceding keyframe; the last
+    decoded frame is kept so sequential playback applies one delta per step.
+    """
+
+    def __init__(self, source, mmap: bool = True):
+        """
+        Args:
+            source: path, or bytes-like object holding a whole sequence
+            mmap: memory-map paths instead of reading them into memory
+        """
+        if isinstance(source, (str, os.PathLike)):
+            self._data = (np.memmap(source, dtype=np.uint8, mode='r') if mmap
+                          else np.fromfile(source, dtype=np.uint8))
+        else:
+            self._data = np.frombuffer(source, dtype=np.uint8)
+        magic, version, _flags, self.rows, self.cols, count, self.keyframe_interval, \
+            index_offset = SEQ_HEADER.unpack_from(self._data, 0)
+        if magic != SEQ_MAGIC:
+            raise ValueError("Not a tactile sequence file")
+        if version != SEQ_VERSION:
+            raise ValueError(f"Unsupported sequence version {version}")
+        self.row_width = row_bytes(self.cols)
+        self.index = np.frombuffer(self._data, dtype=INDEX_DTYPE, count=count,
+                                   offset=index_offset)
+        self._keyframes = np.flatnonzero(self.index['kind'] == KEYFRAME)
+        self._cached: Optional[Tuple[int, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.rows, self.cols
+
+    def record(self, i: int) -> Tuple[int, memoryview]:
+        """Raw (kind, payload) of frame i, as stored"""
+        entry = self.index[i]
+        start = int(entry['offset'])
+        return int(entry['kind']), memoryview(self._data[start:start + int(entry['length'])])
+
+    def packed(self, i: int) -> np.ndarray:
+        """Packed bytes of frame i, shape (rows, row_bytes)"""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Frame {i} out of range")
+        if self._cached is not None and self._cached[0] <= i and \
+                not np.any((self._keyframes > self._cached[0]) & (self._keyframes <= i)):
+            start, frame = self._cached[0], self._cached[1].copy()
+        else:
+            start = int(self._keyframes[np.searchsorted(self._keyframes, i, side='right') - 1])
+            _, payload = self.record(start)
+            frame = np.frombuffer(payload, np.uint8).reshape(self.rows, self.row_width).copy()
+        for j in range(start + 1, i + 1):
+            kind, payload = self.record(j)
+            if kind == KEYFRAME:
+                frame = np.frombuffer(payload, np.uint8).reshape(self.rows, self.row_width).copy()
+            else:
+                apply_delta(frame, payload)
+        self._cached = (i, frame)
+        return frame.copy()
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return unpack_pattern(self.packed(i), self.cols)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def changed(self, i: int) -> np.ndarray:
+        """Cells that flip between frame i-1 and frame i"""
+        kind, payload = self.record(i)
+        if i > 0 and kind == DELTA:
+            return changed_cells(payload, self.cols, self.row_width)
+        if i == 0:
+            return np.argwhere(self[0])
+        return np.argwhere(self[i] != self[i - 1])
+
+    def stored_bytes(self) -> int:
+        return int(self.index['length'].sum())
+
+
+def save_sequence(target: PathOrFile, matrices: Iterable[np.ndarray],
+                  keyframe_interval: Optional[int] = None) -> int:
+    """Write matrices to a .tseq file; returns the number of frames (ValueError if none)"""
+    matrices = iter(matrices)
+    first = next(matrices, None)
+    if first is None:
+        raise ValueError("empty sequence")
+    with SequenceWriter(target, *first.shape, keyframe_interval=keyframe_interval) as writer:
+        writer.add(first)
+        writer.extend(matrices)
+        return len(writer._index)
+
+
+def arduino_sequence_source(reader: SequenceReader, ball_diameter: float, ball_spacing: float,
+                            name: str = 'tactileSequence') -> str:
+    """
+    Arduino/ESP32 sketch fragment that replays a sequence frame by frame
+
+    Records are copied verbatim into PROGMEM; the generated
+    <name>Advance() applies the next delta (or loads a keyframe) into a
+    RAM frame buffer of ROWS × ROW_BYTES bytes.
+    """
+    records = [np.frombuffer(reader.record(i)[1], np.uint8) for i in range(len(reader))]
+    blob = np.concatenate(records)
+    offsets = np.r_[0, np.cumsum([len(r) for r in records])].astype(np.int64)
+    kinds = reader.index['kind']
+    width = 16
+    pad = (-len(blob)) % width
+    blob_rows = np.r_[blob, np.zeros(pad, np.uint8)].reshape(-1, width)
+
+    return (
+        f"// Tactile Pattern Sequence - {len(reader)} frames, {reader.rows}×{reader.cols}\n"
+        f"// {ball_diameter}mm balls, {ball_spacing}mm spacing\n"
+        f"// Generated by AI Visual Accessibility System\n"
+        f"// Records: kind 0 = packed keyframe, 1 = (skip u16, len u16, xor[len])... delta\n\n"
+        f"#include <Arduino.h>\n\n"
+        f"const uint16_t ROWS = {reader.rows};\n"
+        f"const uint16_t COLS = {reader.cols};\n"
+        f"const uint16_t ROW_BYTES = {reader.row_width};\n"
+        f"const uint16_t FRAMES = {len(reader)};\n\n"
+        f"const uint8_t {name}Data[] PROGMEM = {{\n"
+        f"{c_byte_rows(blob_rows)}\n"
+        f"}};\n\n"
+        f"const uint32_t {name}Offsets[FRAMES + 1] PROGMEM = {{"
+        f"{', '.join(map(str, offsets.tolist()))}}};\n"
+        f"const uint8_t {name}Kinds[FRAMES] PROGMEM = {{"
+        f"{', '.join(map(str, kinds.tolist()))}}};\n\n"
+        f"uint8_t {name}Frame[ROWS * ROW_BYTES];\n"
+        f"uint16_t {name}Index = 0;\n\n"
+        f"// Load the next frame into {name}Frame (wraps around at the end)\n"
+        f"void {name}Advance() {{\n"
+        f"  uint32_t p = pgm_read_dword(&{name}Offsets[{name}Index]);\n"
+        f"  uint32_t end = pgm_read_dword(&{name}Offsets[{name}Index + 1]);\n"
+        f"  if (pgm_read_byte(&{name}Kinds[{name}Index]) == 0) {{\n"
+        f"    memcpy_P({name}Frame, &{name}Data[p], ROWS * ROW_BYTES);\n"
+        f"  }} else {{\n"
+        f"    uint32_t pos = 0;\n"
+        f"    while (p < end) {{\n"
+        f"      uint16_t skip = pgm_read_byte(&{name}Data[p]) | (pgm_read_byte(&{name}Data[p + 1]) << 8);\n"
+        f"      uint16_t len = pgm_read_byte(&{name}Data[p + 2]) | (pgm_read_byte(&{name}Data[p + 3]) << 8);\n"
+        f"      p += 4;\n"
+        f"      pos += skip;\n"
+        f"      for (uint16_t j = 0; j < len; j++) {name}Frame[pos++] ^= pgm_read_byte(&{name}Data[p++]);\n"
+        f"    }}\n"
+        f"  }}\n"
+        f"  {name}Index = ({name}Index + 1) % FRAMES;\n"
+        f"}}\n\n"
+        f"inline bool {name}Cell(uint16_t row, uint16_t col) {{\n"
+        f"  return {name}Frame[row * ROW_BYTES + (col >> 3)] & (0x80 >> (col & 7));\n"
+        f"}}\n\n"
+        f"// Usage: {name}Advance(); then if ({name}Cell(row, col)) raiseBall(row, col);\n"
+    )
@@ -0,0 +1,435 @@
+"""
+Conversion Service
+Local HTTP/JSON server that shares one converter, cache and worker pool between clients
+
+Run with:
+    python -m src.service                       # 127.0.0.1:8765
+    python -m src.service --port 9000 --workers 8 --max-queue 64
+
+Endpoints:
+    POST /convert   image bytes as the body (or JSON {"image": <base64>, ...});
+                    parameters in the query string or JSON: method, grid (repeat
+                    or comma-separated, e.g. grid=32&grid=24x40), invert,
+                    threshold, contrast
+    GET  /health    liveness and queue depth
+    GET  /stats     counters, queue depth and cache statistics
+
+Patterns are returned as lists of "0101..." row strings keyed "RxC".
+"""
+
+import argparse
+import base64
+import binascii
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+import numpy as np
+from PIL import UnidentifiedImageError
+
+from config import IMAGE_CONFIG, SERVICE_CONFIG, TACTILE_CONFIG
+from src.instrumentation import configure_logging, log_event
+from src.pattern_cache import PatternCache, image_hash, make_key
+from src.tiling import grid_shape
+
+logger = logging.getLogger(__name__)
+
+GridShape = Tuple[int, int]
+
+
+class ServiceError(RuntimeError):
+    """The service rejected or failed a request"""
+
+    def __init__(self, message: str, status: int = 500):
+        super().__init__(message)
+        self.status = status
+
+
+class ServiceBusy(ServiceError):
+    """Queue full (HTTP 503); retry later"""
+
+    def __init__(self, message: str = "Conversion queue is full"):
+        super().__init__(message, status=503)
+
+
+def encode_matrix(matrix: np.ndarray) -> List[str]:
+    """Rows of a 0/1 matrix as '0'/'1' strings"""
+    chars = (np.asarray(matrix, dtype=np.uint8) + ord('0')).tobytes()
+    cols = matrix.shape[1]
+    return [chars[i:i + cols].decode('ascii') for i in range(0, len(chars), cols)]
+
+
+def decode_matrix(rows: List[str]) -> np.ndarray:
+    """Inverse of encode_matrix"""
+    data = np.frombuffer(''.join(rows).encode('ascii'), dtype=np.uint8) - ord('0')
+    return data.reshape(len(rows), -1)
+
+
+def shape_key(shape: GridShape) -> str:
+    return f"{shape[0]}x{shape[1]}"
+
+
+class ConversionService:
+    """
+    Admission control, coalescing and a bounded worker pool around process_pyramid
+
+    At most `workers` conversions run at once and `max_queue` more wait;
+    beyond that requests fail fast with ServiceBusy instead of piling up.
+    Requests with the same content hash and parameters that arrive while
+    one is running share its result, and requests the shared PatternCache
+    can answer are served directly; neither takes a queue slot.
+
+    Conversions run on threads: decoding and the NumPy kernels release the
+    GIL, and threads share the cache and the coalescing table.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 timeout_s: Optional[float] = None, cache: Optional[PatternCache] = None,
+                 use_cache: bool = True):
+        from src.tactile_converter import TactileImageConverter
+
+        self.workers = workers or SERVICE_CONFIG["workers"] or os.cpu_count() or 1
+        self.max_queue = SERVICE_CONFIG["max_queue"] if max_queue is None else max_queue
+        self.timeout_s = timeout_s or SERVICE_CONFIG["request_timeout_s"]
+        self.cache = (cache or PatternCache()) if use_cache else None
+        self.converter = TactileImageConverter(grid_size=TACTILE_CONFIG["default_grid_size"],
+                                               cache=self.cache)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="convert")
+        self._inflight: Dict[str, Future] = {}
+        self._pending = 0  # Admitted and not yet finished
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "completed": 0, "cache_hits": 0, "coalesced": 0, "rejected": 0,
+                       "failed": 0, "timeouts": 0}
+
+    @staticmethod
+    def normalize(method: str = 'threshold', grid_sizes: Optional[Iterable] = None,
+                  threshold: Optional[int] = None,
+                  contrast: Optional[float] = None) -> Dict:
+        """Validated conversion parameters (raises ValueError)"""
+        if method not in IMAGE_CONFIG["processing_methods"]:
+            raise ValueError(f"Unknown method: {method}")
+        shapes = sorted({grid_shape(size) for size in
+                         (grid_sizes or TACTILE_CONFIG["grid_sizes"])})
+        return {"method": method, "grid_sizes": shapes,
+                "threshold": None if threshold is None else int(threshold),
+                "contrast": None if contrast is None else float(contrast)}
+
+    def submit(self, data: bytes, params: Dict) -> Tuple[Future, bool]:
+        """
+        Start (or join) a conversion of normalized params
+
+        Returns:
+            (future of {shape: matrix}, whether an in-flight request was joined)
+
+        Raises:
+            ServiceBusy: every worker and queue slot is taken
+        """
+        content_hash = image_hash(data)
+        key = make_key(content_hash, params)
+        cached = self._cached(content_hash, params)
+        with self._lock:
+            self._stats["requests"] += 1
+            if cached is not None:
+                # Answered from the cache without taking a queue slot
+                self._stats["cache_hits"] += 1
+                future = Future()
+                future.set_result(cached)
+                return future, False
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future, True
+            if self._pending >= self.workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise ServiceBusy()
+            self._pending += 1
+            future = self._executor.submit(self._convert, data, params, content_hash)
+            self._inflight[key] = future
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return future, False
+
+    def _cached(self, content_hash: str, params: Dict) -> Optional[Dict[GridShape, np.ndarray]]:
+        """Every requested level from the cache, or None"""
+        if self.cache is None:
+            return None
+        levels = {}
+        for shape in params["grid_sizes"]:
+            matrix = self.cache.get(self.converter.cache_key(
+                content_hash, grid_size=shape, method=params["method"], vlm_description=None,
+                threshold=params["threshold"], contrast=params["contrast"]))
+            if matrix is None:
+                return None
+            levels[shape] = matrix
+        return levels
+
+    def _convert(self, data: bytes, params: Dict, content_hash: str) -> Dict[GridShape, np.ndarray]:
+        import io
+        pyramid = self.converter.process_pyramid(
+            io.BytesIO(data), method=params["method"], grid_sizes=params["grid_sizes"],
+            threshold=params["threshold"], contrast=params["contrast"],
+            content_hash=content_hash)
+        return {tuple(shape): matrix for shape, matrix in pyramid.items()}
+
+    def _finished(self, key: str, future: Future):
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._pending -= 1
+            self._stats["failed" if future.exception() else "completed"] += 1
+
+    def convert(self, data: bytes, method: str = 'threshold',
+                grid_sizes: Optional[Iterable] = None, invert: bool = False,
+                threshold: Optional[int] = None, contrast: Optional[float] = None
+                ) -> Tuple[Dict[GridShape, np.ndarray], bool]:
+        """
+        Convert image bytes at several grid sizes (blocking)
+
+        Returns:
+            ({(rows, cols): uint8 matrix}, coalesced)
+
+        Raises:
+            ServiceBusy, ValueError (bad parameters), TimeoutError
+        """
+        params = self.normalize(method, grid_sizes, threshold, contrast)
+        future, coalesced = self.submit(data, params)
+        try:
+            bases = future.result(timeout=self.timeout_s)
+        except FutureTimeout:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise TimeoutError(f"Conversion took longer than {self.timeout_s}s") from None
+        # Results are shared between coalesced requests; invert per request
+        return {shape: 1 - m if invert else m.copy() for shape, m in bases.items()}, coalesced
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = {**self._stats, "workers": self.workers, "max_queue": self.max_queue,
+                     "pending": self._pending, "inflight": len(self._inflight)}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "TactileService/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self) -> ConversionService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            stats = self.service.stats()
+            self._send_json(200, {"status": "ok", "pending": stats["pending"],
+                                  "workers": stats["workers"]})
+        elif path == "/stats":
+            self._send_json(200, self.service.stats())
+        else:
+            self._send_json(404, {"error": f"Not found: {path}"})
+
+    def _read_request(self) -> Tuple[bytes, Dict]:
+        """Image bytes and raw parameters from a raw-body or JSON request"""
+        length = int(self.headers.get("Content-Length") or 0)
+        limit = IMAGE_CONFIG["max_upload_size_mb"] * 2 ** 20
+        if length <= 0:
+            raise ServiceError("Empty request body", status=400)
+        if length > limit * 4 // 3 + 1024:  # base64 JSON is a third larger
+            raise ServiceError("Image exceeds max_upload_size_mb", status=413)
+        body = self.rfile.read(length)
+
+        query = parse_qs(urlsplit(self.path).query)
+        params = {k: v[-1] for k, v in query.items()}
+        if "grid" in query:
+            params["grid"] = [g for value in query["grid"] for g in value.split(',') if g]
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            payload = json.loads(body)
+            try:
+                body = base64.b64decode(payload.pop("image"), validate=True)
+            except (KeyError, TypeError, binascii.Error):
+                raise ServiceError("JSON requests need a base64 'image' field",
+                                   status=400) from None
+            params.update(payload)
+        if len(body) > limit:
+            raise ServiceError("Image exceeds max_upload_size_mb", status=413)
+        return body, params
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path != "/convert":
+            self._send_json(404, {"error": f"Not found: {path}"})
+            return
+        start = time.perf_counter()
+        try:
+            data, params = self._read_request()
+            grids = params.get("grid")
+            invert = str(params.get("invert", "false")).lower() in ("1", "true", "yes")
+            patterns, coalesced = self.service.convert(
+                data, method=params.get("method", IMAGE_CONFIG["default_method"]),
+                grid_sizes=[grids] if isinstance(grids, (str, int)) else grids,
+                invert=invert, threshold=params.get("threshold"),
+                contrast=params.get("contrast"))
+        except ServiceBusy as exc:
+            self._send_json(503, {"error": str(exc)}, {"Retry-After": "1"})
+            return
+        except ServiceError as exc:
+            self._send_json(exc.status, {"error": str(exc)})
+            return
+        except TimeoutError as exc:
+            self._send_json(504, {"error": str(exc)})
+            return
+        except UnidentifiedImageError:
+            self._send_json(400, {"error": "Unrecognized image format"})
+            return
+        except (ValueError, TypeError) as exc:
+            self._send_json(400, {"error": str(exc)})
+            return
+        except Exception as exc:
+            log_event(logger, logging.ERROR, "convert_failed", error=repr(exc))
+            self._send_json(500, {"error": f"{type(exc).__name__}: {exc}"})
+            return
+        self._send_json(200, {
+            "patterns": {shape_key(s): encode_matrix(m) for s, m in patterns.items()},
+            "coalesced": coalesced,
+            "ms": round((time.perf_counter() - start) * 1e3, 2),
+        })
+
+
+class ConversionServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer carrying a ConversionService"""
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: ConversionService):
+        super().__init__(address, _Handler)
+        self.service = service
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> threading.Thread:
+        """Serve on a background daemon thread (tests, load tests, embedding)"""
+        thread = threading.Thread(target=self.serve_forever, name="tactile-service",
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def server_close(self):
+        super().server_close()
+        self.service.close()
+
+
+class ServiceClient:
+    """Blocking client for ConversionServer (stdlib urllib, no extra dependencies)"""
+
+    def __init__(self, url: Optional[str] = None, timeout_s: Optional[float] = None):
+        self.url = (url or SERVICE_CONFIG["url"] or
+                    f"http://{SERVICE_CONFIG['host']}:{SERVICE_CONFIG['port']}").rstrip('/')
+        self.timeout_s = timeout_s or SERVICE_CONFIG["client_timeout_s"]
+
+    def _request(self, path: str, data: Optional[bytes] = None) -> Dict:
+        headers = {"Content-Type": "application/octet-stream"} if data is not None else {}
+        request = Request(self.url + path, data=data, headers=headers,
+                          method="POST" if data is not None else "GET")
+        try:
+            with urlopen(request, timeout=self.timeout_s) as response:
+                return json.loads(response.read())
+        except HTTPError as exc:
+            try:
+                message = json.loads(exc.read()).get("error", exc.reason)
+            except ValueError:
+                message = exc.reason
+            if exc.code == 503:
+                raise ServiceBusy(message) from None
+            raise ServiceError(message, status=exc.code) from None
+
+    def convert(self, data: bytes, method: str = 'threshold',
+                grid_sizes: Optional[Iterable] = None, invert: bool = False,
+                threshold: Optional[int] = None,
+                contrast: Optional[float] = None) -> Dict:
+        """
+        Convert encoded image bytes remotely
+
+        Returns:
+            {grid_size: uint8 matrix}, keyed as given in grid_sizes
+
+        Raises:
+            ServiceBusy (503), ServiceError, URLError (service unreachable),
+            ValueError (malformed response)
+        """
+        sizes = list(grid_sizes or TACTILE_CONFIG["grid_sizes"])
+        query = [("method", method), ("invert", int(invert))]
+        query += [("grid", shape_key(grid_shape(size))) for size in sizes]
+        if threshold is not None:
+            query.append(("threshold", threshold))
+        if contrast is not None:
+            query.append(("contrast", contrast))
+        result = self._request(f"/convert?{urlencode(query)}", bytes(data))
+        try:
+            patterns = result["patterns"]
+            return {size: decode_matrix(patterns[shape_key(grid_shape(size))]) for size in sizes}
+        except (KeyError, TypeError, AttributeError) as exc:
+            raise ValueError(f"Malformed conversion response: {exc!r}") from None
+
+    def health(self) -> Dict:
+        return self._request("/health")
+
+    def stats(self) -> Dict:
+        return self._request("/stats")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.service",
+                                     description="Run the tactile conversion service")
+    parser.add_argument("--host", default=SERVICE_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=SERVICE_CONFIG["port"])
+    parser.add_argument("--workers", type=int, default=SERVICE_CONFIG["workers"])
+    parser.add_argument("--max-queue", type=int, default=SERVICE_CONFIG["max_queue"])
+    parser.add_argument("--no-cache", action="store_true", help="disable the pattern cache")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    service = ConversionService(workers=args.workers, max_queue=args.max_queue,
+                                use_cache=not args.no_cache)
+    server = ConversionServer((args.host, args.port), service)
+    print(f"Tactile conversion service on {server.url} "
+          f"({service.workers} workers, queue {service.max_queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping")
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
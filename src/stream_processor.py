@@ -0,0 +1,233 @@
+"""
+Streaming Conversion
+Convert camera feeds or frame sequences into tactile frames with temporal deltas
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from src.dithering import is_dither
+from src.image_processor import (decode_factor, image_size, reduce_for_grid, reduce_gray,
+                                 rgb_to_gray, to_gray_array)
+
+STAGES = ("gray", "binarize", "grid", "delta", "total")
+LATENCY_WINDOW = 1000  # Frames kept for latency statistics
+
+
+class FrameResult(NamedTuple):
+    """One converted frame"""
+    index: int               # Position of the frame in the source sequence
+    matrix: np.ndarray       # Tactile pattern (1 = raised)
+    changed: np.ndarray      # (k, 2) array of (row, col) cells that flipped
+    dropped: int             # Stale frames skipped since the previous result
+    timings: Dict[str, float]  # Per-stage latency in milliseconds
+
+
+class LatestFrameBuffer:
+    """
+    Single-slot buffer fed by a background reader thread
+
+    Each new frame overwrites the unconsumed one, so a slow consumer always
+    receives the most recent frame and stale frames are counted as dropped.
+    """
+
+    def __init__(self, frames: Iterable):
+        self._frames = frames
+        self._cond = threading.Condition()
+        self._slot: Optional[Tuple[int, object]] = None
+        self._done = False
+        self._stopped = False
+        self._error: Optional[BaseException] = None
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._reader, daemon=True)
+        self._thread.start()
+
+    def _reader(self):
+        try:
+            for index, frame in enumerate(self._frames):
+                with self._cond:
+                    if self._stopped:
+                        return
+                    if self._slot is not None:
+                        self.dropped += 1
+                    self._slot = (index, frame)
+                    self._cond.notify()
+        except BaseException as exc:  # surfaced to the consumer
+            self._error = exc
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify()
+
+    def get(self) -> Optional[Tuple[int, object, int]]:
+        """Block for the next frame; returns (index, frame, dropped) or None at end"""
+        with self._cond:
+            while self._slot is None and not self._done:
+                self._cond.wait()
+            if self._slot is None:
+                if self._error is not None:
+                    raise self._error
+                return None
+            (index, frame), self._slot = self._slot, None
+            dropped, self.dropped = self.dropped, 0
+            return index, frame, dropped
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._slot = None
+
+
+class StreamProcessor:
+    """
+    Generator pipeline: frame → grayscale → binary → grid → delta
+
+    Follows the converter's reduced_decode, prereduce_factor and downsample
+    settings, so each matrix equals process_image on the same frame.
+    Full-resolution grayscale, scratch and mask buffers are allocated once
+    per frame shape and reused; only grid-sized arrays are new per frame.
+    """
+
+    def __init__(self, converter, method: str = 'threshold', invert: bool = False,
+                 threshold: Optional[int] = None, contrast: Optional[float] = None):
+        """
+        Args:
+            converter: TactileImageConverter providing grid size and settings
+            method: preprocessing method
+            invert: invert the patterns
+            threshold: override the method's cutoff
+            contrast: override the method's contrast factor
+        """
+        self.converter = converter
+        self.method = method
+        self.invert = invert
+        self.threshold = threshold
+        self.contrast = contrast
+        self.latencies: Dict[str, Deque[float]] = {
+            stage: deque(maxlen=LATENCY_WINDOW) for stage in STAGES}
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self._gray = self._mask = self._scratch = None
+        self._prev: Optional[np.ndarray] = None
+
+    def _to_gray(self, frame) -> np.ndarray:
+        # Shrink first when the converter decodes reduced, as process_image does
+        conv = self.converter
+        if isinstance(frame, Image.Image):
+            if conv.reduced_decode:
+                frame = reduce_for_grid(frame, conv.grid_size)
+            return to_gray_array(frame)
+        frame = np.asarray(frame)
+        if conv.reduced_decode and decode_factor(image_size(frame), conv.grid_size) > 1:
+            return reduce_for_grid(frame, conv.grid_size)
+        if frame.ndim == 3 and frame.shape[2] < 3:
+            frame = frame[..., 0]  # Single-channel or gray + alpha (as array_to_gray)
+        if frame.ndim == 2:
+            return frame
+        shape = frame.shape[:2]
+        if self._gray is None or self._gray.shape != shape:
+            self._gray = np.empty(shape, dtype=np.uint8)
+            self._scratch = (np.empty(shape, dtype=np.uint32), np.empty(shape, dtype=np.uint32))
+        return rgb_to_gray(frame, out=self._gray, scratch=self._scratch)
+
+    def _mask_buffer(self, shape: Tuple[int, int]) -> np.ndarray:
+        if self._mask is None or self._mask.shape != shape:
+            self._mask = np.empty(shape, dtype=bool)
+        return self._mask
+
+    def convert_frame(self, frame) -> Tuple[np.ndarray, Dict[str, float]]:
+        """Convert one frame, returning (matrix, per-stage ms)"""
+        conv = self.converter
+        clock = time.perf_counter
+        t0 = clock()
+        gray = self._to_gray(frame)
+        if conv.prereduce_factor > 0:
+            rows, cols = conv.grid_size
+            gray = reduce_gray(gray, (rows * conv.prereduce_factor, cols * conv.prereduce_factor))
+        t1 = clock()
+        if is_dither(self.method):
+            # Tone and dithering both run at grid resolution
+            matrix = conv.dither_grid(gray, self.method, self.contrast)
+            t2 = clock()
+        else:
+            out = (self._mask_buffer(gray.shape) if self.method in ('threshold', 'high_contrast')
+                   else None)
+            binary = conv.engine.binarize(gray, self.method, self.threshold, self.contrast,
+                                          out=out)
+            t2 = clock()
+            # Area coverage or LANCZOS, whichever the converter is set to
+            matrix = conv.convert_to_grid(binary)
+        if self.invert:
+            matrix = 1 - matrix
+        t3 = clock()
+        return matrix, {"gray": (t1 - t0) * 1e3, "binarize": (t2 - t1) * 1e3,
+                        "grid": (t3 - t2) * 1e3}
+
+    def process(self, frames: Iterable, drop_stale: bool = False) -> Iterator[FrameResult]:
+        """
+        Convert a sequence of frames lazily
+
+        Args:
+            frames: iterable of PIL Images or uint8 arrays (H×W or H×W×1/2/3/4)
+            drop_stale: read frames on a background thread and skip any that
+                arrive while the consumer is still busy (for live sources)
+
+        Yields:
+            FrameResult for each processed frame; the first frame's
+            `changed` lists every raised cell (relative to a blank display)
+        """
+        if drop_stale:
+            buffer = LatestFrameBuffer(frames)
+
+            def source():
+                while True:
+                    item = buffer.get()
+                    if item is None:
+                        return
+                    yield item
+        else:
+            buffer = None
+
+            def source():
+                for index, frame in enumerate(frames):
+                    yield index, frame, 0
+
+        try:
+            for index, frame, dropped in source():
+                start = time.perf_counter()
+                matrix, timings = self.convert_frame(frame)
+                t = time.perf_counter()
+                if self._prev is None or self._prev.shape != matrix.shape:
+                    changed = np.argwhere(matrix != 0)
+                else:
+                    changed = np.argwhere(matrix != self._prev)
+                self._prev = matrix.copy()  # Consumers may edit the yielded matrix
+                timings["delta"] = (time.perf_counter() - t) * 1e3
+                timings["total"] = (time.perf_counter() - start) * 1e3
+                for stage, ms in timings.items():
+                    self.latencies[stage].append(ms)
+                self.frames_processed += 1
+                self.frames_dropped += dropped
+                yield FrameResult(index, matrix, changed, dropped, timings)
+        finally:
+            if buffer is not None:
+                buffer.close()
+
+    def stats(self) -> Dict:
+        """Per-stage latency summary (ms) and frame counters"""
+        summary = {"frames_processed": self.frames_processed,
+                   "frames_dropped": self.frames_dropped}
+        for stage, values in self.latencies.items():
+            if values:
+                arr = np.asarray(values)
+                summary[stage] = {"mean": round(float(arr.mean()), 3),
+                                  "p50": round(float(np.percentile(arr, 50)), 3),
+                                  "p99": round(float(np.percentile(arr, 99)), 3)}
+        if self.latencies["total"]:
+            summary["fps"] = round(1e3 / float(np.mean(self.latencies["total"])), 1)
+        return summary
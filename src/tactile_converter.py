@@ -4,12 +4,30 @@ Converts images to tactile display patterns using AI-enhanced processing
 """
 
 import numpy as np
-from PIL import Image, ImageFilter, ImageEnhance
-import json
-from typing import Tuple, Optional, Dict
-import sys
-sys.path.append('..')
-from config import TACTILE_CONFIG
+from PIL import Image
+import io
+import logging
+import os
+from typing import TYPE_CHECKING, Tuple, Optional, Dict, Iterable, Iterator, List
+from config import TACTILE_CONFIG, IMAGE_CONFIG
+from src.image_processor import (ThresholdEngine, to_gray_array, binary_to_image,
+                                 cell_edges, coverage_grid, coverage_pyramid, decode_factor,
+                                 image_size, pixel_array, reduce_gray, reduce_for_grid,
+                                 tone_grid, tone_pyramid)
+from src.dithering import dither, is_dither
+from src.pattern_cache import PatternCache, image_hash, make_key
+from src.instrumentation import Instrumentation, log_event
+from src.tiling import grid_shape
+from src.utils import ensure_parent
+
+# Export, sequence, batch and stream support are imported on first use so
+# a worker that only converts images does not pay for them at startup
+if TYPE_CHECKING:
+    from src.batch_processor import BatchResult
+    from src.stream_processor import FrameResult, StreamProcessor
+    from src.viewport import Viewport
+
+logger = logging.getLogger(__name__)
 
 class TactileImageConverter:
     """
@@ -17,35 +35,102 @@ class TactileImageConverter:
     Using 3mm magnetic balls as tactile points
     """
     
-    def __init__(self, grid_size: Tuple[int, int] | int = 4, use_vlm: bool = False):
+    def __init__(self, grid_size: Tuple[int, int] | int = 4, use_vlm: bool = False,
+                 downsample: Optional[str] = None, coverage_threshold: Optional[float] = None,
+                 prereduce_factor: Optional[int] = None, reduced_decode: Optional[bool] = None,
+                 cache: Optional[PatternCache] = None,
+                 instrumentation: Optional[Instrumentation] = None):
         """
         Initialize converter with grid size and VLM option
         
         Args:
-            grid_size: tuple (rows, cols) or single int for square grid
+            grid_size: tuple (rows, cols), "RxC" string or single int for square grid
             use_vlm: Whether to use Vision-Language Model for enhancement
+            downsample: 'area' (per-cell coverage) or 'lanczos'; defaults to IMAGE_CONFIG
+            coverage_threshold: raise a cell when dark coverage exceeds this ('area' only)
+            prereduce_factor: if > 0, area-shrink to grid × factor before binarizing
+            reduced_decode: decode large images at reduced resolution for the target grid
+            cache: optional PatternCache shared between converters
+            instrumentation: stage timers/counters (defaults to one enabled by DEBUG)
         """
-        if isinstance(grid_size, int):
-            self.grid_size = (grid_size, grid_size)
-        else:
-            self.grid_size = grid_size
+        self.grid_size = grid_shape(grid_size)
         
         self.use_vlm = use_vlm
         self.ball_diameter = TACTILE_CONFIG["ball_diameter_mm"]
         self.ball_spacing = TACTILE_CONFIG["ball_spacing_mm"]
-        
-        print(f"✓ Tactile Converter Initialized: {self.grid_size[0]}×{self.grid_size[1]}")
-        if use_vlm:
-            print("✓ VLM Enhancement: ENABLED")
+        self.metrics = instrumentation or Instrumentation()
+        self.engine = ThresholdEngine(instrumentation=self.metrics)
+        self.downsample = downsample or IMAGE_CONFIG["downsample_mode"]
+        self.coverage_threshold = (IMAGE_CONFIG["coverage_threshold"]
+                                   if coverage_threshold is None else coverage_threshold)
+        self.prereduce_factor = (IMAGE_CONFIG["prereduce_factor"]
+                                 if prereduce_factor is None else prereduce_factor)
+        self.reduced_decode = (IMAGE_CONFIG["reduced_decode"]
+                               if reduced_decode is None else reduced_decode)
+        self.cache = cache
+        
+        log_event(logger, logging.INFO, "converter_initialized",
+                  grid=f"{self.grid_size[0]}x{self.grid_size[1]}", vlm=use_vlm,
+                  downsample=self.downsample)
     
-    def load_image(self, image_path: str) -> Image.Image:
-        """Load image from file or PIL Image object"""
-        if isinstance(image_path, str):
-            return Image.open(image_path)
+    def settings(self) -> Dict:
+        """Constructor arguments that reproduce this converter's configuration"""
+        return {
+            "grid_size": tuple(self.grid_size),
+            "use_vlm": self.use_vlm,
+            "downsample": self.downsample,
+            "coverage_threshold": self.coverage_threshold,
+            "prereduce_factor": self.prereduce_factor,
+            "reduced_decode": self.reduced_decode,
+        }
+    
+    def load_image(self, image_path, grid_size: Optional[Tuple[int, int]] = None):
+        """
+        Load image from file path, encoded bytes, file object or PIL Image,
+        or wrap in-memory pixels
+        
+        Args:
+            image_path: input image. NumPy arrays (np.memmap included) and
+                image-shaped buffers such as 2-D/3-D memoryviews are used in
+                place (see image_processor.pixel_array; frame_from_buffer
+                views raw camera buffers); file objects include mmap.mmap.
+            grid_size: target grid; with reduced_decode on, large images are
+                decoded/shrunk to a bounded resolution that still gives every
+                cell several pixels (see image_processor.reduce_for_grid)
+        
+        Returns:
+            PIL Image, or a uint8 pixel array for array input
+        """
+        pixels = pixel_array(image_path)
+        if pixels is not None:
+            image = pixels
+        elif isinstance(image_path, (str, os.PathLike)):
+            image = Image.open(image_path)
+        elif isinstance(image_path, (bytes, bytearray, memoryview)):
+            image = Image.open(io.BytesIO(image_path))
         elif isinstance(image_path, Image.Image):
-            return image_path
+            image = image_path
+        elif hasattr(image_path, 'read'):
+            image = Image.open(image_path)
         else:
-            raise ValueError("Input must be file path or PIL Image")
+            raise ValueError("Input must be file path, bytes, file object, PIL Image "
+                             "or pixel array")
+        
+        if grid_size is not None and self.reduced_decode:
+            with self.metrics.stage("reduce"):
+                image = reduce_for_grid(image, grid_size)
+        return image
+    
+    @staticmethod
+    def _resolve_description(vlm_description) -> Optional[str]:
+        """Text of a description or PendingDescription; None if the request failed"""
+        if not hasattr(vlm_description, 'result'):
+            return vlm_description
+        try:
+            return vlm_description.result()
+        except Exception as exc:  # Fall back to plain enhancement, same cache key
+            log_event(logger, logging.WARNING, "vlm_failed", error=exc)
+            return None
     
     def preprocess_with_vlm(self, image: Image.Image, vlm_description: Optional[str] = None) -> Image.Image:
         """
@@ -63,13 +148,16 @@ class TactileImageConverter:
         # 2. Enhance their edges
         # 3. Reduce background noise
         
-        # For now, apply enhanced preprocessing
-        # (Full VLM integration will be in vlm_handler.py)
+        # For now, apply enhanced preprocessing; descriptions come from
+        # src/vlm_handler.py and are only logged
         
         if vlm_description:
-            print(f"📝 VLM Insight: {vlm_description[:100]}...")
+            log_event(logger, logging.INFO, "vlm_insight", description=vlm_description[:100])
         
         # Enhance contrast for better edge detection
+        from PIL import ImageEnhance
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(to_gray_array(image))
         enhancer = ImageEnhance.Contrast(image.convert('L'))
         enhanced = enhancer.enhance(2.0)
         
@@ -133,70 +221,163 @@ class TactileImageConverter:
     #     return binary
     
     def preprocess_image(self, image: Image.Image, method: str = 'threshold', 
-                        vlm_description: Optional[str] = None) -> Image.Image:
-        """Convert image to 2-color (binary) format - FIXED VERSION"""
+                        vlm_description: Optional[str] = None,
+                        threshold: Optional[int] = None,
+                        contrast: Optional[float] = None) -> Image.Image:
+        """
+        Convert image to 2-color (binary) format
         
-        # Apply VLM-guided preprocessing if available
-        if vlm_description and self.use_vlm:
-            image = self.preprocess_with_vlm(image, vlm_description)
+        Args:
+            image: PIL Image
+            method: 'edge', 'threshold', 'high_contrast', 'adaptive', or a
+                dither method ('bayer', 'floyd_steinberg', 'atkinson')
+            vlm_description: Optional VLM description for guidance
+            threshold: Override the method's cutoff (see IMAGE_CONFIG["method_params"])
+            contrast: Override the method's contrast factor
         
-        # Convert to grayscale
-        if image.mode != 'L':
-            gray = image.convert('L')
-        else:
-            gray = image
-        
-        if method == 'edge':
-            # FIXED: Better edge detection
-            enhancer = ImageEnhance.Contrast(gray)
-            enhanced = enhancer.enhance(2.0)
-            edges = enhanced.filter(ImageFilter.FIND_EDGES)
-            threshold = 20  # More sensitive
-            binary = edges.point(lambda x: 255 if x > threshold else 0, mode='1')
-            
-        elif method == 'threshold':
-            # FIXED: Invert for colored shapes on white background
-            threshold = 200
-            binary = gray.point(lambda x: 255 if x < threshold else 0, mode='1')
-            
-        elif method == 'high_contrast':
-            enhancer = ImageEnhance.Contrast(gray)
-            enhanced = enhancer.enhance(2.5)
-            binary = enhanced.point(lambda x: 255 if x < 200 else 0, mode='1')
-            
-        elif method == 'adaptive':
-            try:
-                import cv2
-                gray_np = np.array(gray)
-                binary_np = cv2.adaptiveThreshold(
-                    gray_np, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                    cv2.THRESH_BINARY_INV, 11, 2
-                )
-                binary = Image.fromarray(binary_np).convert('1')
-            except ImportError:
-                binary = gray.point(lambda x: 255 if x < 200 else 0, mode='1')
+        Returns:
+            Binary PIL Image (mode '1')
+        """
+        binary = self.preprocess_array(image, method=method, vlm_description=vlm_description,
+                                       threshold=threshold, contrast=contrast)
+        return binary_to_image(binary)
+    
+    def preprocess_array(self, image: Image.Image, method: str = 'threshold',
+                         vlm_description: Optional[str] = None,
+                         threshold: Optional[int] = None,
+                         contrast: Optional[float] = None,
+                         grid_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        Binarize an image into a NumPy mask without building a PIL image
         
-        else:
-            binary = gray.point(lambda x: 255 if x < 200 else 0, mode='1')
+        Args:
+            grid_size: largest grid the mask will feed (for prereduce_factor);
+                defaults to this converter's grid
+        
+        Returns:
+            bool array, True where the binary image is white. Dither methods
+            work at grid resolution, so their mask is the dithered grid
+            expanded back to the image's cells.
+        """
+        gray = self.prepare_gray(image, vlm_description=vlm_description, grid_size=grid_size)
+        if is_dither(method):
+            rows, cols = grid_size or self.grid_size
+            matrix = self.dither_grid(gray, method, contrast, grid_size=(rows, cols))
+            mask = np.repeat(matrix == 0, np.diff(cell_edges(gray.shape[0], rows)), axis=0)
+            return np.repeat(mask, np.diff(cell_edges(gray.shape[1], cols)), axis=1)
+        return self.engine.binarize(gray, method=method, threshold=threshold, contrast=contrast)
+    
+    def dither_grid(self, gray: np.ndarray, method: str, contrast: Optional[float] = None,
+                    grid_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        Dither a grayscale array at grid resolution
         
-        return binary
+        Each cell's mean darkness (after the method's contrast) is dithered
+        with Bayer ordered dithering or Floyd–Steinberg / Atkinson error
+        diffusion, so gradients become raised-dot density instead of blobs.
+        
+        Returns:
+            uint8 matrix (1 = raised)
+        """
+        stage = self.metrics.stage
+        _, contrast = self.engine.params_for(method, None, contrast)
+        with stage("contrast"):
+            gray = self.engine.enhance(gray, contrast)
+        with stage("downsample"):
+            tone = tone_grid(gray, grid_size or self.grid_size)
+        with stage("dither"):
+            return dither(tone, method)
+    
+    def prepare_gray(self, image: Image.Image, vlm_description: Optional[str] = None,
+                     grid_size: Optional[Tuple[int, int]] = None,
+                     prereduce: bool = True) -> np.ndarray:
+        """
+        Decode, VLM-enhance, grayscale and pre-reduce an image for binarization
+        
+        Pixel arrays skip decoding; a 2-D uint8 array comes back unchanged
+        (a view) unless VLM enhancement or prereduce_factor applies.
+        
+        Args:
+            prereduce: apply prereduce_factor for grid_size (off for viewports,
+                which zoom below the grid's resolution)
+        
+        Returns:
+            2-D uint8 array
+        """
+        stage = self.metrics.stage
+        if isinstance(image, Image.Image):
+            with stage("decode"):
+                image.load()
+        
+        # Apply VLM-guided preprocessing if available. A pending description
+        # (VLMHandler.submit) has been running while the image decoded.
+        if vlm_description and self.use_vlm:
+            with stage("vlm_wait"):
+                description = self._resolve_description(vlm_description)
+            image = self.preprocess_with_vlm(image, description)
+        
+        with stage("grayscale"):
+            gray = to_gray_array(image)
+        self.metrics.count("pixels_processed", gray.size)
+        if prereduce and self.prereduce_factor > 0:
+            rows, cols = grid_size or self.grid_size
+            with stage("prereduce"):
+                gray = reduce_gray(gray, (rows * self.prereduce_factor,
+                                          cols * self.prereduce_factor))
+        return gray
 
     
-    def convert_to_grid(self, binary_image: Image.Image, invert: bool = False) -> np.ndarray:
+    def convert_to_grid(self, binary_image, invert: bool = False,
+                        downsample: Optional[str] = None,
+                        coverage_threshold: Optional[float] = None) -> np.ndarray:
         """
         Convert binary image to grid matrix
         
         Args:
-            binary_image: Binary PIL Image
+            binary_image: Binary PIL Image or boolean mask from preprocess_array
             invert: Flip 0s and 1s
+            downsample: 'area' or 'lanczos' (defaults to the converter setting)
+            coverage_threshold: 'area' rule - raised if dark coverage > threshold
         
         Returns:
-            numpy array of 0s and 1s (1 = raised point)
+            uint8 array of 0s and 1s (1 = raised point)
         """
+        downsample = downsample or self.downsample
+        with self.metrics.stage("downsample"):
+            if downsample == 'area':
+                if coverage_threshold is None:
+                    coverage_threshold = self.coverage_threshold
+                coverage = self.coverage_grid(binary_image)
+                matrix = (coverage > coverage_threshold).astype(np.uint8)
+            else:
+                matrix = self._resize_to_grid(binary_image)
+
+        if invert:
+            matrix = 1 - matrix
+
+        return matrix
+    
+    def coverage_grid(self, binary_image) -> np.ndarray:
+        """
+        Per-cell fraction of dark pixels for a binary image or mask
+        
+        Returns:
+            float32 array of shape grid_size with values in [0, 1]
+        """
+        if isinstance(binary_image, np.ndarray):
+            mask = binary_image.astype(bool, copy=False)
+        else:
+            mask = np.asarray(binary_image.convert('1'), dtype=bool)
+        return coverage_grid(mask, self.grid_size)
+    
+    def _resize_to_grid(self, binary_image) -> np.ndarray:
+        """Legacy LANCZOS resize of the full-resolution binary image"""
         rows, cols = self.grid_size
 
         # Ensure image is in grayscale for consistent numpy conversion
-        if binary_image.mode != 'L':
+        if isinstance(binary_image, np.ndarray):
+            img_gray = Image.fromarray(binary_image.astype(np.uint8) * 255, mode='L')
+        elif binary_image.mode != 'L':
             img_gray = binary_image.convert('L')
         else:
             img_gray = binary_image
@@ -208,12 +389,7 @@ class TactileImageConverter:
         arr = np.array(resized)
 
         # Convert to binary matrix (0 or 1)
-        matrix = (arr < 128).astype(int)  # 1 for dark (raised), 0 for light (lowered)
-
-        if invert:
-            matrix = 1 - matrix
-
-        return matrix
+        return (arr < 128).astype(np.uint8)  # 1 for dark (raised), 0 for light (lowered)
     
     def visualize_pattern(self, matrix: np.ndarray, style: str = 'unicode') -> str:
         """
@@ -274,76 +450,316 @@ class TactileImageConverter:
         Args:
             matrix: numpy array
             output_path: file path to save
-            file_format: 'txt', 'csv', 'json', or 'arduino'
+            file_format: any registered exporter ('txt', 'csv', 'json', 'arduino',
+                'arduino_packed', 'bin', ...)
         
         Returns:
             Path to generated file
         """
-        rows, cols = matrix.shape
+        from src.exporters import export_patterns
+        with self.metrics.stage("export"):
+            export_patterns(output_path, matrix, file_format,
+                            ball_diameter=self.ball_diameter, ball_spacing=self.ball_spacing)
+        if self.metrics.enabled:
+            self.metrics.count("bytes_written", os.path.getsize(output_path))
+            self.metrics.count("files_written")
         
-        if file_format == 'txt':
-            with open(output_path, 'w') as f:
-                f.write(f"# Tactile Display Pattern\\n")
-                f.write(f"# Grid: {rows}×{cols}\\n")
-                f.write(f"# Ball: {self.ball_diameter}mm, Spacing: {self.ball_spacing}mm\\n")
-                f.write(f"# 0=down, 1=up\\n\\n")
-                for row in matrix:
-                    f.write(''.join(map(str, row)) + '\\n')
-                    
+        return output_path
+    
+    def generate_sequence_file(self, matrices: Iterable[np.ndarray], output_path: str,
+                               file_format: str = 'tseq',
+                               keyframe_interval: Optional[int] = None) -> str:
+        """
+        Generate a multi-frame (slideshow) file
+        
+        Args:
+            matrices: equally sized patterns in display order
+            output_path: file path to save
+            file_format: 'tseq' (keyframe + delta container) or 'arduino' (replay sketch)
+            keyframe_interval: frames between full keyframes
+        
+        Returns:
+            Path to generated file
+        """
+        from src.pattern_sequence import SequenceReader, arduino_sequence_source, save_sequence
+        ensure_parent(output_path)
+        if file_format == 'tseq':
+            save_sequence(output_path, matrices, keyframe_interval=keyframe_interval)
         elif file_format == 'arduino':
+            buffer = io.BytesIO()
+            save_sequence(buffer, matrices, keyframe_interval=keyframe_interval)
+            reader = SequenceReader(buffer.getvalue())
             with open(output_path, 'w') as f:
-                f.write(f"// Tactile Display Pattern - {rows}×{cols}\\n")
-                f.write(f"// {self.ball_diameter}mm balls, {self.ball_spacing}mm spacing\\n")
-                f.write(f"// Generated by AI Visual Accessibility System\\n\\n")
-                f.write(f"const int ROWS = {rows};\\n")
-                f.write(f"const int COLS = {cols};\\n\\n")
-                f.write(f"const int tactilePattern[ROWS][COLS] = {{\\n")
-                for i, row in enumerate(matrix):
-                    row_str = '  {' + ', '.join(map(str, row)) + '}'
-                    if i < len(matrix) - 1:
-                        row_str += ','
-                    f.write(row_str + '\\n')
-                f.write("};\\n\\n")
-                f.write("// Usage: if (tactilePattern[row][col] == 1) raiseBall(row, col);\\n")
-                
-        elif file_format == 'json':
-            data = {
-                'metadata': {
-                    'grid_size': {'rows': int(rows), 'cols': int(cols)},
-                    'ball_diameter_mm': self.ball_diameter,
-                    'ball_spacing_mm': self.ball_spacing,
-                    'total_points': int(rows * cols),
-                    'points_raised': int(np.sum(matrix)),
-                },
-                'pattern': matrix.tolist()
-            }
-            with open(output_path, 'w') as f:
-                json.dump(data, f, indent=2)
-                
-        elif file_format == 'csv':
-            with open(output_path, 'w') as f:
-                f.write(f"# Grid Size: {rows}×{cols}\\n")
-                f.write(f"# Ball Specs: {self.ball_diameter}mm diameter, {self.ball_spacing}mm spacing\\n")
-                for row in matrix:
-                    f.write(','.join(map(str, row)) + '\\n')
-        
+                f.write(arduino_sequence_source(reader, self.ball_diameter, self.ball_spacing))
+        else:
+            raise ValueError(f"Unknown sequence format: {file_format}")
         return output_path
     
     def process_image(self, image_input, method: str = 'threshold', 
-                     invert: bool = False, vlm_description: Optional[str] = None) -> np.ndarray:
+                     invert: bool = False, vlm_description: Optional[str] = None,
+                     threshold: Optional[int] = None,
+                     contrast: Optional[float] = None,
+                     content_hash: Optional[str] = None) -> np.ndarray:
         """
         Complete pipeline: load → preprocess → convert
         
         Args:
-            image_input: path to image file or PIL Image
+            image_input: path, encoded bytes, file object, PIL Image or
+                uint8 pixel array (used without copying; see load_image)
             method: preprocessing method
             invert: invert the pattern
-            vlm_description: optional VLM description
+            vlm_description: optional VLM description text or a PendingDescription
+                from VLMHandler.submit() (resolved after the image is decoded)
+            threshold: override the method's binarization cutoff
+            contrast: override the method's contrast factor
+            content_hash: precomputed image_hash() of the input (cache only)
         
         Returns:
-            numpy array (binary matrix)
+            uint8 array (binary matrix)
         """
-        img = self.load_image(image_input)
-        binary = self.preprocess_image(img, method=method, vlm_description=vlm_description)
+        if self.cache is None:
+            return self._convert(image_input, method, vlm_description, threshold, contrast, invert)
+
+        # Cache the non-inverted matrix so toggling invert never recomputes
+        key = self.cache_key(content_hash or image_hash(image_input), method=method,
+                             vlm_description=vlm_description, threshold=threshold,
+                             contrast=contrast)
+        base = self.cache.get(key)
+        self.metrics.count("cache_misses" if base is None else "cache_hits")
+        if base is None:
+            base = self._convert(image_input, method, vlm_description, threshold, contrast)
+            self.cache.put(key, base)
+        return 1 - base if invert else base.copy()
+    
+    def cache_key(self, content_hash: str, grid_size: Optional[Tuple[int, int]] = None,
+                  **params) -> str:
+        """Cache key for an image hash, this converter's settings and call parameters"""
+        settings = self.settings()
+        if grid_size is not None:
+            settings["grid_size"] = tuple(grid_size)
+        description = params.get("vlm_description")
+        if not (self.use_vlm and description):
+            params["vlm_description"] = None
+        else:
+            # A PendingDescription is keyed by its request, not its future text
+            params["vlm_description"] = getattr(description, 'key', description)
+        return make_key(content_hash, {**settings, **params})
+    
+    def _convert(self, image_input, method: str, vlm_description: Optional[str],
+                 threshold: Optional[int], contrast: Optional[float],
+                 invert: bool = False) -> np.ndarray:
+        img = self.load_image(image_input, grid_size=self.grid_size)
+        if is_dither(method):
+            gray = self.prepare_gray(img, vlm_description=vlm_description)
+            matrix = self.dither_grid(gray, method, contrast)
+            return 1 - matrix if invert else matrix
+        binary = self.preprocess_array(img, method=method, vlm_description=vlm_description,
+                                       threshold=threshold, contrast=contrast)
         matrix = self.convert_to_grid(binary, invert=invert)
-        return matrix
\ No newline at end of file
+        return matrix
+    
+    def process_pyramid(self, image_input, method: str = 'threshold',
+                        grid_sizes: Optional[Iterable] = None, invert: bool = False,
+                        vlm_description: Optional[str] = None,
+                        threshold: Optional[int] = None,
+                        contrast: Optional[float] = None,
+                        content_hash: Optional[str] = None) -> Dict:
+        """
+        Convert one image to every grid size in a single pass
+        
+        Levels that process_image would decode at the same reduction (see
+        reduced_decode) and prereduce alike are decoded and binarized once
+        and come from one shared coverage pyramid (area downsampling with
+        this converter's coverage_threshold); other levels get their own
+        pass. Every level therefore equals process_image at that grid, so
+        the results can share its cache keys. With a cache
+        attached, every level is stored so later single-size requests are
+        lookups.
+        
+        Args:
+            image_input: path to image file or PIL Image
+            method: preprocessing method
+            grid_sizes: ints (square) or (rows, cols) tuples;
+                defaults to TACTILE_CONFIG["grid_sizes"]
+            invert: invert the patterns
+        
+        Returns:
+            {grid_size: uint8 array}, keyed as given in grid_sizes
+        """
+        sizes = list(grid_sizes or TACTILE_CONFIG["grid_sizes"])
+        shapes = {size: grid_shape(size) for size in sizes}
+        params = dict(method=method, vlm_description=vlm_description,
+                      threshold=threshold, contrast=contrast)
+
+        bases, keys = {}, {}
+        if self.cache is not None:
+            content_hash = content_hash or image_hash(image_input)
+            for size, shape in shapes.items():
+                keys[size] = self.cache_key(content_hash, grid_size=shape, **params)
+                cached = self.cache.get(keys[size])
+                if cached is not None:
+                    bases[size] = cached
+
+        missing = [size for size in sizes if size not in bases]
+        if self.cache is not None:
+            self.metrics.count("cache_hits", len(sizes) - len(missing))
+            self.metrics.count("cache_misses", len(missing))
+        if missing:
+            # Levels share a pass only when process_image would decode and
+            # prepare them identically, so equal cache keys always hold
+            # equal matrices
+            image_input, rewind = self._reopenable(image_input)
+            source_size = image_size(self.load_image(image_input))  # Header only
+            groups: Dict[Tuple, List] = {}
+            for size in missing:
+                groups.setdefault(self._decode_plan(source_size, shapes[size]), []).append(size)
+            if len(groups) > 1 and isinstance(image_input, Image.Image):
+                image_input.load()  # Draft mode would only apply to the first group
+            for group in groups.values():
+                rewind()
+                level_shapes = [shapes[size] for size in group]
+                img = self.load_image(image_input,
+                                      grid_size=max(level_shapes, key=lambda s: s[0] * s[1]))
+                levels = self._pyramid_levels(img, level_shapes, **params)
+                for size in group:
+                    bases[size] = levels[shapes[size]]
+                    if self.cache is not None:
+                        self.cache.put(keys[size], bases[size])
+
+        return {size: 1 - bases[size] if invert else bases[size].copy() for size in sizes}
+    
+    @staticmethod
+    def _reopenable(image_input):
+        """
+        (input, rewind) where rewind() lets load_image open the input again
+
+        Seekable file objects are rewound to their current position;
+        unseekable ones are read into memory once.
+        """
+        if isinstance(image_input, Image.Image) or not hasattr(image_input, 'read'):
+            return image_input, lambda: None
+        if not (hasattr(image_input, 'seekable') and image_input.seekable()):
+            return io.BytesIO(image_input.read()), lambda: None
+        start = image_input.tell()
+        return image_input, lambda: image_input.seek(start)
+
+    def _decode_plan(self, source_size: Tuple[int, int],
+                     shape: Tuple[int, int]) -> Tuple[int, Optional[Tuple[int, int]]]:
+        """How process_image would decode and prereduce for a grid: (factor, target)"""
+        factor = decode_factor(source_size, shape) if self.reduced_decode else 1
+        return factor, self._prereduce_target(shape)
+
+    def _prereduce_target(self, shape: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Resolution prepare_gray shrinks to for a grid (None when prereduce is off)"""
+        if self.prereduce_factor <= 0:
+            return None
+        return shape[0] * self.prereduce_factor, shape[1] * self.prereduce_factor
+
+    def _pyramid_levels(self, img, level_shapes: List[Tuple[int, int]], method: str,
+                        vlm_description, threshold: Optional[int],
+                        contrast: Optional[float]) -> Dict[Tuple[int, int], np.ndarray]:
+        """Base matrices for several grids from one decoded image in one pass"""
+        finest = max(level_shapes, key=lambda s: s[0] * s[1])
+        if is_dither(method):
+            # Every level is dithered from its own tone grid
+            gray = self.prepare_gray(img, vlm_description=vlm_description, grid_size=finest)
+            gray = self.engine.enhance(gray, self.engine.params_for(method, None, contrast)[1])
+            with self.metrics.stage("downsample"):
+                tones = tone_pyramid(gray, level_shapes)
+            with self.metrics.stage("dither"):
+                return {shape: dither(tones[shape], method) for shape in level_shapes}
+        binary = self.preprocess_array(img, method=method, vlm_description=vlm_description,
+                                       threshold=threshold, contrast=contrast,
+                                       grid_size=finest)
+        with self.metrics.stage("downsample"):
+            coverage = coverage_pyramid(binary, level_shapes)
+        return {shape: (coverage[shape] > self.coverage_threshold).astype(np.uint8)
+                for shape in level_shapes}
+
+    def process_tiled(self, image_input, method: str = 'threshold', invert: bool = False,
+                      tile_shape=None, workers: Optional[int] = None,
+                      **options) -> np.ndarray:
+        """
+        Convert to this converter's grid one module-sized tile at a time
+        
+        Gives the same matrix as process_image (area downsampling) with
+        working memory bounded by the tile; see src/tiling.py, which also
+        exports tiles individually (TiledConverter.export).
+        
+        Args:
+            tile_shape: cells per tile; defaults to TILING_CONFIG["tile_shape"]
+            workers: tile threads (1 = inline)
+        """
+        from src.tiling import TiledConverter
+        tiled = TiledConverter(self, tile_shape=tile_shape, workers=workers)
+        return tiled.convert(image_input, method=method, invert=invert, **options)
+    
+    def viewport(self, image_input, method: str = 'threshold',
+                 threshold: Optional[int] = None, contrast: Optional[float] = None,
+                 vlm_description: Optional[str] = None,
+                 max_pixels: Optional[int] = None) -> 'Viewport':
+        """
+        Preprocess an image once for crop/pan/zoom conversion
+        
+        Returns:
+            Viewport whose view(x, y, w, h, grid) converts any region of the
+            source in time proportional to the grid (see src/viewport.py)
+        """
+        from src.viewport import Viewport
+        return Viewport(self, image_input, method=method, threshold=threshold,
+                        contrast=contrast, vlm_description=vlm_description,
+                        max_pixels=max_pixels)
+    
+    def process_stream(self, frames: Iterable, method: str = 'threshold',
+                       invert: bool = False, drop_stale: bool = False,
+                       threshold: Optional[int] = None,
+                       contrast: Optional[float] = None,
+                       processor: Optional['StreamProcessor'] = None) -> Iterator['FrameResult']:
+        """
+        Convert a frame sequence or camera feed into tactile frames
+        
+        Args:
+            frames: iterable of PIL Images or uint8 arrays
+            method: preprocessing method
+            invert: invert the patterns
+            drop_stale: skip frames that arrive while the consumer is busy
+            processor: StreamProcessor to run instead of building one from
+                method/invert/threshold/contrast; keep it to read its
+                stats() (per-stage latency, fps, dropped frames)
+        
+        Yields:
+            FrameResult(index, matrix, changed cells, dropped count, stage timings)
+        """
+        if processor is None:
+            from src.stream_processor import StreamProcessor
+            processor = StreamProcessor(self, method=method, invert=invert,
+                                        threshold=threshold, contrast=contrast)
+        return processor.process(frames, drop_stale=drop_stale)
+    
+    def process_batch(self, inputs: Iterable, method: str = 'threshold',
+                      invert: bool = False, workers: Optional[int] = None,
+                      chunksize: Optional[int] = None, **options) -> List['BatchResult']:
+        """
+        Convert many images in parallel with this converter's settings
+        
+        Args:
+            inputs: image paths or PIL Images
+            method: preprocessing method
+            invert: invert the patterns
+            workers: process count (None = all cores, 1 = in-process)
+            chunksize: items per worker task (None = 1)
+        
+        Returns:
+            BatchResult list in input order; failed items have .error set
+        """
+        from src.batch_processor import process_batch
+        return process_batch(inputs, self.settings(), workers=workers, chunksize=chunksize,
+                             method=method, invert=invert, **options)
+    
+    def iter_batch(self, inputs: Iterable, method: str = 'threshold',
+                   invert: bool = False, workers: Optional[int] = None,
+                   chunksize: Optional[int] = None, **options) -> Iterator['BatchResult']:
+        """Like process_batch, but yield each BatchResult as soon as it completes"""
+        from src.batch_processor import iter_batch
+        return iter_batch(inputs, self.settings(), workers=workers, chunksize=chunksize,
+                          method=method, invert=invert, **options)
@@ -0,0 +1,252 @@
+"""
+Tiled Conversion
+Convert and export large or multi-module grids one tile at a time
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from config import TILING_CONFIG
+from src.dithering import is_dither
+from src.image_processor import cell_edges, coverage_cells, image_mean
+
+
+def grid_shape(size) -> Tuple[int, int]:
+    """
+    Normalize a grid size to (rows, cols)
+
+    Args:
+        size: int (square), (rows, cols) or a "RxC" string such as "24x40"
+
+    Raises:
+        ValueError: for malformed or non-positive sizes
+    """
+    try:
+        if isinstance(size, str):
+            rows, _, cols = size.lower().replace('×', 'x').partition('x')
+            shape = (int(rows), int(cols or rows))
+        elif isinstance(size, (int, np.integer)):
+            shape = (int(size), int(size))
+        else:
+            rows, cols = size
+            shape = (int(rows), int(cols))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid grid size: {size!r}") from None
+    if shape[0] < 1 or shape[1] < 1:
+        raise ValueError(f"Grid size must be positive: {size!r}")
+    return shape
+
+
+@dataclass(frozen=True)
+class Tile:
+    """One module of a tiled grid"""
+    index: Tuple[int, int]  # (tile row, tile col) in the layout
+    origin: Tuple[int, int]  # First cell (row, col) in the full grid
+    shape: Tuple[int, int]  # Cells (rows, cols); edge tiles may be smaller
+
+    @property
+    def slices(self) -> Tuple[slice, slice]:
+        """Index into the full grid matrix"""
+        (r, c), (h, w) = self.origin, self.shape
+        return slice(r, r + h), slice(c, c + w)
+
+    @property
+    def name(self) -> str:
+        return f"r{self.index[0]}c{self.index[1]}"
+
+
+class TileLayout:
+    """
+    Row-major partition of a grid into tile_shape modules
+
+    When the grid is not a multiple of the tile shape, the last tile row
+    and column are smaller.
+    """
+
+    def __init__(self, grid_size, tile_shape=None):
+        self.grid_shape = grid_shape(grid_size)
+        self.tile_shape = grid_shape(tile_shape or TILING_CONFIG["tile_shape"])
+        rows, cols = self.grid_shape
+        th, tw = self.tile_shape
+        self.tiles = [Tile((i, j), (r, c), (min(th, rows - r), min(tw, cols - c)))
+                      for i, r in enumerate(range(0, rows, th))
+                      for j, c in enumerate(range(0, cols, tw))]
+
+    @property
+    def layout(self) -> Tuple[int, int]:
+        """Number of tiles (down, across)"""
+        return self.tiles[-1].index[0] + 1, self.tiles[-1].index[1] + 1
+
+    def split(self, matrix: np.ndarray) -> Iterator[Tuple[Tile, np.ndarray]]:
+        """(tile, view) pairs of a full grid matrix"""
+        if matrix.shape != self.grid_shape:
+            raise ValueError(f"Matrix shape {matrix.shape} != grid {self.grid_shape}")
+        for tile in self.tiles:
+            yield tile, matrix[tile.slices]
+
+    def assemble(self, tiles: Iterable[Tuple[Tile, np.ndarray]]) -> np.ndarray:
+        """Stitch (tile, matrix) pairs into one uint8 grid matrix"""
+        matrix = np.zeros(self.grid_shape, dtype=np.uint8)
+        for tile, part in tiles:
+            matrix[tile.slices] = part
+        return matrix
+
+    def __iter__(self) -> Iterator[Tile]:
+        return iter(self.tiles)
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+
+class TiledConverter:
+    """
+    Convert one image to a large grid tile by tile
+
+    The image is decoded (at reduced resolution for the full grid) and
+    grayscaled once. Each tile then binarizes only its own pixel span plus
+    the few neighbouring pixels its method reads, and reduces it over the
+    full grid's cell boundaries. Stitched tiles therefore equal a
+    whole-grid conversion exactly, and the masks and filter buffers in
+    flight scale with the tile.
+
+    Memory is not bounded by the tile size: the decode and the one
+    grayscale copy still scale with the (reduced) source image. Encoded
+    images are not decoded region by region (a PNG is one compressed
+    stream, and contrast pivots on the whole image's mean).
+
+    Tiles run on a thread pool: they share the decoded image and the NumPy
+    kernels release the GIL.
+    """
+
+    def __init__(self, converter, tile_shape=None, workers: Optional[int] = None):
+        """
+        Args:
+            converter: TactileImageConverter whose grid_size is the full grid
+            tile_shape: cells per module; defaults to TILING_CONFIG
+            workers: threads (None = TILING_CONFIG, then CPU count; 1 = inline)
+        """
+        if converter.downsample != 'area':
+            raise ValueError("Tiled conversion requires 'area' downsampling")
+        self.converter = converter
+        self.layout = TileLayout(converter.grid_size, tile_shape)
+        self.workers = workers or TILING_CONFIG["workers"] or os.cpu_count() or 1
+
+    def prepare(self, image_input, vlm_description: Optional[str] = None) -> np.ndarray:
+        """Decode and grayscale the whole source for the full grid (image-sized)"""
+        conv = self.converter
+        image = conv.load_image(image_input, grid_size=conv.grid_size)
+        return conv.prepare_gray(image, vlm_description=vlm_description)
+
+    def _map(self, fn, tiles: List[Tile]) -> Iterator:
+        if self.workers <= 1 or len(tiles) <= 1:
+            return map(fn, tiles)
+        executor = ThreadPoolExecutor(max_workers=min(self.workers, len(tiles)),
+                                      thread_name_prefix="tile")
+
+        def results():
+            with executor:
+                yield from executor.map(fn, tiles)
+        return results()
+
+    def _tile_converter(self, gray: np.ndarray, method: str, threshold: Optional[int],
+                        contrast: Optional[float], invert: bool):
+        """Function converting one Tile of `gray` to its uint8 matrix"""
+        conv = self.converter
+        engine = conv.engine
+        rows, cols = self.layout.grid_shape
+        if is_dither(method):
+            # Error diffusion crosses tile borders; the tone grid is small,
+            # so dither it whole and hand out slices
+            matrix = conv.dither_grid(gray, method, contrast)
+            matrix = 1 - matrix if invert else matrix
+            return lambda tile: matrix[tile.slices]
+        _, contrast_factor = engine.params_for(method, threshold, contrast)
+        mean = image_mean(gray) if contrast_factor != 1.0 else None
+
+        if gray.shape[0] < rows or gray.shape[1] < cols:
+            # Fewer pixels than cells: binarize the (tiny) image once and
+            # repeat it up, as coverage_grid does
+            mask = engine.binarize(gray, method, threshold, contrast)
+            ry, rx = -(-rows // gray.shape[0]), -(-cols // gray.shape[1])
+            source, halo, binarized = np.repeat(np.repeat(mask, ry, axis=0), rx, axis=1), 0, True
+        else:
+            source, halo, binarized = gray, engine.context_px(method), False
+        h, w = source.shape
+        ys, xs = cell_edges(h, rows), cell_edges(w, cols)
+
+        def convert(tile: Tile) -> np.ndarray:
+            (r0, c0), (th, tw) = tile.origin, tile.shape
+            y0, y1, x0, x1 = ys[r0], ys[r0 + th], xs[c0], xs[c0 + tw]
+            if binarized:
+                mask = source[y0:y1, x0:x1]
+            else:
+                cy, cx = max(0, y0 - halo), max(0, x0 - halo)
+                crop = source[cy:min(h, y1 + halo), cx:min(w, x1 + halo)]
+                mask = engine.binarize(crop, method, threshold, contrast, mean=mean)
+                mask = mask[y0 - cy:y1 - cy, x0 - cx:x1 - cx]
+            coverage = coverage_cells(mask, ys[r0:r0 + th + 1] - y0, xs[c0:c0 + tw + 1] - x0)
+            matrix = (coverage > conv.coverage_threshold).astype(np.uint8)
+            return 1 - matrix if invert else matrix
+
+        return convert
+
+    def iter_tiles(self, image_input, method: str = 'threshold', invert: bool = False,
+                   threshold: Optional[int] = None, contrast: Optional[float] = None,
+                   vlm_description: Optional[str] = None) -> Iterator[Tuple[Tile, np.ndarray]]:
+        """
+        Convert tile by tile
+
+        Yields:
+            (Tile, uint8 matrix) in layout order
+        """
+        gray = self.prepare(image_input, vlm_description)
+        convert = self._tile_converter(gray, method, threshold, contrast, invert)
+        self.converter.metrics.count("tiles", len(self.layout))
+        return zip(self.layout, self._map(convert, self.layout.tiles))
+
+    def convert(self, image_input, **options) -> np.ndarray:
+        """Full uint8 grid matrix assembled from tiles (options as iter_tiles)"""
+        return self.layout.assemble(self.iter_tiles(image_input, **options))
+
+    def export(self, image_input, output_dir: Union[str, os.PathLike],
+               file_format: str = 'bin', stem: str = 'tactile_pattern',
+               **options) -> List[Path]:
+        """
+        Convert and write one hardware file per tile
+
+        Each worker exports its tile as soon as it is converted, so the full
+        matrix is never held. Files are named <stem>_r<i>c<j>_<R>x<C><suffix>.
+
+        Returns:
+            Paths in layout order
+        """
+        from src.exporters import export_filename, export_patterns
+
+        conv = self.converter
+        output_dir = Path(output_dir)
+        gray = self.prepare(image_input, options.pop('vlm_description', None))
+        convert = self._tile_converter(gray, options.pop('method', 'threshold'),
+                                       options.pop('threshold', None),
+                                       options.pop('contrast', None),
+                                       options.pop('invert', False))
+        if options:
+            raise TypeError(f"Unexpected options: {', '.join(options)}")
+
+        def export(tile: Tile) -> Path:
+            matrix = convert(tile)
+            path = output_dir / export_filename(file_format, *tile.shape,
+                                                stem=f"{stem}_{tile.name}")
+            export_patterns(path, matrix, file_format, ball_diameter=conv.ball_diameter,
+                            ball_spacing=conv.ball_spacing, name=f"tile_{tile.name}")
+            return path
+
+        with conv.metrics.stage("export"):
+            paths = list(self._map(export, self.layout.tiles))
+        conv.metrics.count("tiles", len(paths))
+        conv.metrics.count("files_written", len(paths))
+        return paths
@@ -0,0 +1,54 @@
+"""
+Utility Functions
+Lazy directory creation and cached optional imports
+"""
+
+import importlib
+import os
+from functools import lru_cache
+from pathlib import Path
+from types import ModuleType
+from typing import Optional, Union
+
+
+def ensure_dir(path: Union[str, os.PathLike]) -> Path:
+    """Create a directory (and parents) on first write; returns it as a Path"""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def ensure_parent(path: Union[str, os.PathLike]) -> Path:
+    """Create the directory that will hold `path`; returns `path` as a Path"""
+    path = Path(path)
+    if path.parent != Path('.'):
+        ensure_dir(path.parent)
+    return path
+
+
+@lru_cache(maxsize=None)
+def _import_or_none(name: str) -> Optional[ModuleType]:
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def optional_import(name: str, install_hint: Optional[str] = None,
+                    required: bool = True) -> Optional[ModuleType]:
+    """
+    Import an optional backend once and cache the outcome (including failure)
+
+    Args:
+        name: module name, e.g. 'cv2'
+        install_hint: pip package to mention in the error, e.g. 'opencv-python'
+        required: raise ImportError when missing instead of returning None
+
+    Returns:
+        The module, or None when it is unavailable and required=False
+    """
+    module = _import_or_none(name)
+    if module is None and required:
+        hint = f" (pip install {install_hint})" if install_hint else ""
+        raise ImportError(f"Optional dependency '{name}' is not installed{hint}")
+    return module
@@ -0,0 +1,193 @@
+"""
+Viewport
+Crop/pan/zoom re-conversion from a preprocessed integral image
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config import VIEWPORT_CONFIG
+from src.dithering import dither, is_dither
+from src.image_processor import array_to_gray, image_size
+from src.tiling import grid_shape
+
+Rect = Tuple[float, float, float, float]
+
+
+def summed_area_table(values: np.ndarray, dtype=np.uint64) -> np.ndarray:
+    """
+    Integral image with a zero first row and column
+
+    table[y, x] is the sum of values[:y, :x], so any rectangle sum is four
+    lookups.
+    """
+    h, w = values.shape
+    table = np.zeros((h + 1, w + 1), dtype=dtype)
+    np.cumsum(values, axis=0, dtype=dtype, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, dtype=dtype, out=table[1:, 1:])
+    return table
+
+
+def _reduce_to(image, max_pixels: int):
+    """Shrink an image (or pixel array) by an integer factor until it has at most max_pixels"""
+    width, height = image_size(image)
+    factor = math.ceil(math.sqrt(width * height / max_pixels))
+    if factor <= 1:
+        return image
+    if isinstance(image, np.ndarray):
+        return array_to_gray(image, factor)
+    if image.format == 'JPEG' and image.mode in ('L', 'RGB'):
+        if image.draft('L', (-(-width // factor), -(-height // factor))) is not None:
+            return image
+    if image.mode not in ('L', 'RGB', 'RGBA', 'LA', 'I', 'F'):
+        image = image.convert('L')
+    return image.reduce(factor)
+
+
+class Viewport:
+    """
+    A preprocessed source image that converts any region on demand
+
+    Building decodes and binarizes the whole image once (dither methods
+    keep per-pixel darkness instead) and stores a summed-area table of dark
+    pixels. view() then samples the table at the corners of the grid's
+    cells: four lookups per cell, whatever the size of the region or the
+    source. Recent views are kept in an LRU so panning back and forth is a
+    dictionary hit.
+
+    Coordinates are in source-image pixels. Regions may extend past the
+    image; the outside counts as white (lowered pins). Viewing the whole
+    image matches process_image for the same settings when no decode
+    reduction applies.
+    """
+
+    def __init__(self, converter, image_input, method: str = 'threshold',
+                 threshold: Optional[int] = None, contrast: Optional[float] = None,
+                 vlm_description: Optional[str] = None, max_pixels: Optional[int] = None,
+                 max_views: Optional[int] = None):
+        """
+        Args:
+            converter: TactileImageConverter (default grid, coverage threshold,
+                instrumentation)
+            image_input: path, bytes, file object, PIL Image or pixel array
+            method: any processing method, including dither methods
+            max_pixels: reduce larger sources first (VIEWPORT_CONFIG default)
+            max_views: LRU size for recent views
+        """
+        self.converter = converter
+        self.method = method
+        self.max_views = max_views or VIEWPORT_CONFIG["max_views"]
+        max_pixels = max_pixels or VIEWPORT_CONFIG["max_pixels"]
+
+        image = converter.load_image(image_input)
+        self.size = image_size(image)  # Source (width, height)
+        with converter.metrics.stage("reduce"):
+            image = _reduce_to(image, max_pixels)
+        gray = converter.prepare_gray(image, vlm_description=vlm_description, prereduce=False)
+        height, width = gray.shape
+        self.scale = (width / self.size[0], height / self.size[1])
+
+        with converter.metrics.stage("integral"):
+            if is_dither(method):
+                _, contrast = converter.engine.params_for(method, threshold, contrast)
+                darkness = 255 - converter.engine.enhance(gray, contrast)
+                self._table = summed_area_table(darkness)
+                self._unit = 255
+            else:
+                mask = converter.engine.binarize(gray, method, threshold, contrast)
+                dark = np.logical_not(mask).view(np.uint8)
+                dtype = np.uint32 if dark.size < 2 ** 32 else np.uint64
+                self._table = summed_area_table(dark, dtype=dtype)
+                self._unit = 1
+
+        self._views: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _edges(self, start: float, length: float, cells: int, scale: float,
+               limit: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Cell boundaries in table coordinates: (starts, ends, unclipped areas)"""
+        bounds = np.floor((start + np.arange(cells + 1) * (length / cells)) * scale)
+        starts = bounds[:-1].astype(np.int64)
+        # Zoomed past one pixel per cell: every cell still samples a pixel
+        ends = np.maximum(bounds[1:].astype(np.int64), starts + 1)
+        return np.clip(starts, 0, limit), np.clip(ends, 0, limit), ends - starts
+
+    def coverage(self, x: float, y: float, w: float, h: float, grid=None) -> np.ndarray:
+        """
+        Dark fraction (mean darkness for dither methods) of each grid cell
+
+        Args:
+            x, y, w, h: region in source pixels
+            grid: int or (rows, cols); defaults to the converter's grid
+
+        Returns:
+            float32 array of shape grid
+        """
+        if w <= 0 or h <= 0:
+            raise ValueError(f"Viewport must have a positive size: {w}x{h}")
+        rows, cols = grid_shape(grid or self.converter.grid_size)
+        table = self._table
+        y0, y1, ah = self._edges(y, h, rows, self.scale[1], table.shape[0] - 1)
+        x0, x1, aw = self._edges(x, w, cols, self.scale[0], table.shape[1] - 1)
+        y0, y1 = y0[:, None], y1[:, None]
+        dark = table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+        areas = np.outer(ah, aw) * self._unit
+        # Same form as coverage_grid, so full-image views threshold identically
+        return (1.0 - (areas - dark) / areas).astype(np.float32)
+
+    def view(self, x: float, y: float, w: float, h: float, grid=None,
+             invert: bool = False) -> np.ndarray:
+        """
+        Tactile matrix for a region of the source
+
+        Returns:
+            uint8 matrix of shape grid (1 = raised)
+        """
+        shape = grid_shape(grid or self.converter.grid_size)
+        key = (x, y, w, h, shape, invert)
+        with self._lock:
+            matrix = self._views.get(key)
+            if matrix is not None:
+                self._views.move_to_end(key)
+                self._stats["hits"] += 1
+                return matrix.copy()
+            self._stats["misses"] += 1
+
+        coverage = self.coverage(x, y, w, h, shape)
+        if is_dither(self.method):
+            matrix = dither(coverage, self.method)
+        else:
+            matrix = (coverage > self.converter.coverage_threshold).astype(np.uint8)
+        if invert:
+            matrix = 1 - matrix
+
+        with self._lock:
+            self._views[key] = matrix
+            while len(self._views) > self.max_views:
+                self._views.popitem(last=False)
+        return matrix.copy()
+
+    def full(self, grid=None, invert: bool = False) -> np.ndarray:
+        """The whole image"""
+        return self.view(0, 0, self.size[0], self.size[1], grid, invert)
+
+    def zoomed(self, cx: float, cy: float, zoom: float, grid=None,
+               invert: bool = False) -> np.ndarray:
+        """
+        View centred on (cx, cy) at a zoom level
+
+        zoom 1 shows the whole image's extent; 2 shows half the width and
+        height, and so on.
+        """
+        w, h = self.size[0] / zoom, self.size[1] / zoom
+        return self.view(cx - w / 2, cy - h / 2, w, h, grid, invert)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "views": len(self._views),
+                    "table_bytes": self._table.nbytes}
@@ -0,0 +1,505 @@
+"""
+VLM Handler
+Asynchronous Vision-Language Model client with batching, limits and a persistent cache
+"""
+
+import asyncio
+import base64
+import io
+import json
+import logging
+import random
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from config import VLM_CONFIG
+from src.instrumentation import log_event
+from src.pattern_cache import image_hash, make_key
+from src.utils import ensure_parent, optional_import
+
+logger = logging.getLogger(__name__)
+
+
+class VLMError(RuntimeError):
+    """A description request failed after all retries"""
+
+
+class VLMBackend:
+    """
+    Interface every VLM backend implements
+
+    describe_batch() receives at most max_batch images sharing one prompt
+    and returns one description per image, in order. Exceptions listed in
+    transient_errors are retried by the handler with backoff.
+    """
+    name = 'base'
+    max_batch = 1
+    transient_errors: Tuple[type, ...] = ()
+
+    @property
+    def cache_id(self) -> str:
+        """Identifies the model in description cache keys"""
+        return self.name
+
+    async def describe_batch(self, images: Sequence[Image.Image], prompt: str) -> List[str]:
+        raise NotImplementedError
+
+
+class FakeBackend(VLMBackend):
+    """
+    Deterministic offline backend for tests and demos
+
+    Descriptions are derived from simple image statistics, so the same
+    image and prompt always give the same text. `latency_s` simulates a
+    remote call and `fail_times` makes the first calls raise a transient
+    error to exercise retries.
+    """
+    name = 'fake'
+    transient_errors = (ConnectionError,)
+
+    def __init__(self, latency_s: Optional[float] = None, fail_times: int = 0,
+                 max_batch: int = 1):
+        self.latency_s = VLM_CONFIG["fake"]["latency_s"] if latency_s is None else latency_s
+        self.fail_times = fail_times
+        self.max_batch = max_batch
+        self.calls = 0
+        self.batch_sizes: List[int] = []
+
+    @staticmethod
+    def describe_image(image: Image.Image, prompt: str) -> str:
+        gray = np.asarray(image.convert('L'), dtype=np.int16)
+        dark = float((gray < 128).mean())
+        edges = float((np.abs(np.diff(gray, axis=1)) > 32).mean()) if gray.shape[1] > 1 else 0.0
+        tone = "mostly dark" if dark > 0.5 else "mostly light"
+        detail = "many outlines" if edges > 0.05 else "few outlines" if edges > 0.005 else "no outlines"
+        return (f"A {image.width}×{image.height} image, {tone}, {dark:.0%} dark area "
+                f"with {detail}. ({prompt.split('.')[0][:40].strip()})")
+
+    async def describe_batch(self, images, prompt):
+        self.calls += 1
+        self.batch_sizes.append(len(images))
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise ConnectionError("simulated transient failure")
+        return [self.describe_image(image, prompt) for image in images]
+
+
+def _png_data_url(image: Image.Image) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+class OpenAIBackend(VLMBackend):
+    """OpenAI chat completions with image input (one image per request)"""
+    name = 'openai'
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None,
+                 max_tokens: Optional[int] = None, temperature: Optional[float] = None):
+        settings = VLM_CONFIG["openai"]
+        openai = optional_import('openai', 'openai')
+        self.model = model or settings["model"]
+        self.max_tokens = max_tokens or settings["max_tokens"]
+        self.temperature = settings["temperature"] if temperature is None else temperature
+        self.client = openai.AsyncOpenAI(api_key=api_key or settings["api_key"] or None)
+        self.transient_errors = (openai.RateLimitError, openai.APIConnectionError,
+                                 openai.APITimeoutError, openai.InternalServerError)
+
+    @property
+    def cache_id(self) -> str:
+        return f"openai:{self.model}"
+
+    async def _describe(self, image: Image.Image, prompt: str) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            messages=[{"role": "user", "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": _png_data_url(image)}},
+            ]}],
+        )
+        return (response.choices[0].message.content or "").strip()
+
+    async def describe_batch(self, images, prompt):
+        return list(await asyncio.gather(*(self._describe(image, prompt) for image in images)))
+
+
+class HuggingFaceBackend(VLMBackend):
+    """
+    Local transformers vision-to-text model with batched generation
+
+    The model loads once on first use. Generation runs on a worker thread
+    so the event loop keeps accepting requests while a batch is decoding.
+    """
+    name = 'huggingface'
+
+    def __init__(self, model_name: Optional[str] = None, device: Optional[str] = None,
+                 max_new_tokens: Optional[int] = None, batch_size: Optional[int] = None):
+        settings = VLM_CONFIG["huggingface"]
+        self.model_name = model_name or settings["model_name"]
+        self.device = device or settings["device"]
+        self.max_new_tokens = max_new_tokens or settings["max_new_tokens"]
+        self.max_batch = batch_size or VLM_CONFIG["batch_size"]
+        self._model = self._processor = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache_id(self) -> str:
+        return f"huggingface:{self.model_name}"
+
+    def _load(self):
+        transformers = optional_import('transformers', 'transformers')
+        self._processor = transformers.AutoProcessor.from_pretrained(self.model_name)
+        self._model = transformers.AutoModelForVision2Seq.from_pretrained(self.model_name)
+        self._model.to(self.device).eval()
+        log_event(logger, logging.INFO, "vlm_model_loaded", model=self.model_name,
+                  device=self.device)
+
+    def _generate(self, images: Sequence[Image.Image], prompt: str) -> List[str]:
+        torch = optional_import('torch', 'torch')
+        with self._lock:
+            if self._model is None:
+                self._load()
+            messages = [{"role": "user", "content": [{"type": "image"},
+                                                     {"type": "text", "text": prompt}]}]
+            text = self._processor.apply_chat_template(messages, add_generation_prompt=True)
+            inputs = self._processor(text=[text] * len(images),
+                                     images=[[image.convert('RGB')] for image in images],
+                                     return_tensors='pt', padding=True).to(self.device)
+            with torch.inference_mode():
+                output = self._model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+            generated = output[:, inputs["input_ids"].shape[1]:]
+            return [t.strip() for t in
+                    self._processor.batch_decode(generated, skip_special_tokens=True)]
+
+    async def describe_batch(self, images, prompt):
+        return await asyncio.to_thread(self._generate, list(images), prompt)
+
+
+def create_backend(name: Optional[str] = None, **options) -> Optional[VLMBackend]:
+    """Backend for a VLM_CONFIG-style name; None for 'none'"""
+    name = (name or VLM_CONFIG["backend"]).lower()
+    if name == 'none':
+        return None
+    if name == 'openai':
+        return OpenAIBackend(**options)
+    if name in ('huggingface', 'local'):
+        return HuggingFaceBackend(**options)
+    if name == 'fake':
+        return FakeBackend(**options)
+    raise ValueError(f"Unknown VLM backend: {name}")
+
+
+class DescriptionCache:
+    """
+    Persistent description store keyed by image hash + prompt + model
+
+    Entries are appended to a JSON-lines file and loaded on start, so
+    descriptions survive restarts and concurrent writers never rewrite
+    each other's data.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        self.path = Path(path) if path else None
+        self._entries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if self.path and self.path.is_file():
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self._entries[record["key"]] = record["text"]
+                    except (ValueError, KeyError):
+                        continue  # Torn write from an interrupted run
+
+    def get(self, key: str) -> Optional[str]:
+        return self._entries.get(key)
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._entries[key] = text
+            if self.path:
+                ensure_parent(self.path)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({"key": key, "text": text}) + "\n")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PendingDescription:
+    """
+    Handle for a description requested with VLMHandler.submit()
+
+    `key` identifies the request (image hash + prompt + model) and can
+    stand in for the text in conversion cache keys; result() blocks.
+    """
+
+    def __init__(self, key: str, future: Future):
+        self.key = key
+        self._future = future
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def result(self, timeout: Optional[float] = None) -> str:
+        return self._future.result(timeout)
+
+
+class VLMHandler:
+    """
+    Async front end for a VLMBackend
+
+    - at most max_concurrency backend calls in flight (asyncio.Semaphore)
+    - per-call timeout, retries with exponential backoff and jitter
+    - requests for batching backends are grouped per prompt for up to
+      batch_window_ms or until batch_size images are waiting
+    - identical concurrent requests share one call; finished ones are
+      served from the persistent DescriptionCache
+
+    Use `await describe()` from asyncio code, or submit() from synchronous
+    code: it returns immediately and runs the request on the handler's own
+    event loop thread, so CV preprocessing proceeds while the model works.
+    A handler is bound to the first event loop it runs on.
+    """
+
+    def __init__(self, backend: Optional[VLMBackend] = None,
+                 cache: Optional[DescriptionCache] = None,
+                 max_concurrency: Optional[int] = None, timeout_s: Optional[float] = None,
+                 retries: Optional[int] = None, backoff_s: Optional[float] = None,
+                 batch_size: Optional[int] = None, batch_window_ms: Optional[float] = None):
+        """
+        Args:
+            backend: VLMBackend (defaults to create_backend() from VLM_CONFIG)
+            cache: description cache (defaults to VLM_CONFIG["cache_path"])
+            max_concurrency: backend calls in flight at once
+            timeout_s: per-call timeout
+            retries: extra attempts after timeouts / transient errors
+            backoff_s: base delay, doubled per attempt
+            batch_size: images per call (capped by backend.max_batch)
+            batch_window_ms: how long a partial batch waits for more images
+        """
+        self.backend = backend or create_backend()
+        if self.backend is None:
+            raise ValueError("VLM backend is 'none'; choose openai, huggingface or fake")
+        self.cache = cache if cache is not None else DescriptionCache(VLM_CONFIG["cache_path"])
+        self.max_concurrency = max_concurrency or VLM_CONFIG["max_concurrency"]
+        self.timeout_s = timeout_s or VLM_CONFIG["timeout_s"]
+        self.retries = VLM_CONFIG["retries"] if retries is None else retries
+        self.backoff_s = VLM_CONFIG["backoff_s"] if backoff_s is None else backoff_s
+        self.batch_size = min(batch_size or VLM_CONFIG["batch_size"], self.backend.max_batch)
+        self.batch_window_s = (VLM_CONFIG["batch_window_ms"] if batch_window_ms is None
+                               else batch_window_ms) / 1e3
+        self.max_image_side = VLM_CONFIG["max_image_side"]
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "backend_calls": 0,
+                      "retries": 0, "failures": 0}
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending: Dict[str, List[Tuple[Image.Image, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # submit() runs on caller threads
+
+    def _count(self, *names: str):
+        with self._stats_lock:
+            for name in names:
+                self.stats[name] += 1
+
+    # ------------------------------------------------------------------ keys
+
+    def prompt_text(self, prompt: Optional[str] = None) -> str:
+        """Resolve a VLM_CONFIG prompt name (or None) to prompt text"""
+        prompts = VLM_CONFIG["prompts"]
+        if prompt is None:
+            return prompts["describe"]
+        return prompts.get(prompt, prompt)
+
+    def request_key(self, content_hash: str, prompt: str) -> str:
+        return make_key(content_hash, {"prompt": prompt, "model": self.backend.cache_id})
+
+    # ----------------------------------------------------------------- async
+
+    async def describe(self, image_input, prompt: Optional[str] = None,
+                       content_hash: Optional[str] = None) -> str:
+        """
+        Describe one image
+
+        Args:
+            image_input: path, encoded bytes, file object or PIL Image
+            prompt: prompt name from VLM_CONFIG["prompts"] or literal text
+            content_hash: precomputed image_hash() of the input
+        """
+        prompt = self.prompt_text(prompt)
+        key = self.request_key(content_hash or image_hash(image_input), prompt)
+        return await self._describe_key(key, image_input, prompt)
+
+    async def describe_many(self, image_inputs: Sequence, prompt: Optional[str] = None) -> List[str]:
+        """Describe several images concurrently (batched where the backend allows)"""
+        return list(await asyncio.gather(*(self.describe(i, prompt) for i in image_inputs)))
+
+    async def _describe_key(self, key: str, image_input, prompt: str) -> str:
+        self._count("requests")
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count("cache_hits")
+            return cached
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._count("coalesced")
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            image = await asyncio.to_thread(self._prepare, image_input)
+            if self.batch_size > 1:
+                text = await self._enqueue(image, prompt)
+            else:
+                text = (await self._call([image], prompt))[0]
+            self.cache.put(key, text)
+            future.set_result(text)
+            return text
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _prepare(self, image_input) -> Image.Image:
+        """Decode (draft-mode for JPEG) and downscale for upload/inference"""
+        if isinstance(image_input, Image.Image):
+            image = image_input
+        elif isinstance(image_input, (bytes, bytearray, memoryview)):
+            image = Image.open(io.BytesIO(image_input))
+        else:
+            start = image_input.tell() if hasattr(image_input, 'seek') else None
+            image = Image.open(image_input)
+            if start is not None:
+                image.load()
+                image_input.seek(start)  # Leave the caller's stream where it was
+        side = self.max_image_side
+        if max(image.size) > side:
+            image = image.copy() if image is image_input else image
+            image.draft('RGB', (side, side))
+            image.thumbnail((side, side))
+        return image.convert('RGB')
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _call(self, images: List[Image.Image], prompt: str) -> List[str]:
+        """One backend call under the concurrency limit, with timeout and retries"""
+        transient = (asyncio.TimeoutError, ConnectionError) + tuple(self.backend.transient_errors)
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._get_semaphore():
+                    self._count("backend_calls")
+                    texts = await asyncio.wait_for(self.backend.describe_batch(images, prompt),
+                                                   self.timeout_s)
+                if len(texts) != len(images):
+                    raise VLMError(f"Backend returned {len(texts)} descriptions "
+                                   f"for {len(images)} images")
+                return texts
+            except transient as exc:
+                if attempt == self.retries:
+                    self._count("failures")
+                    raise VLMError(f"{self.backend.name} failed after {attempt + 1} "
+                                   f"attempts: {type(exc).__name__}: {exc}") from exc
+                self._count("retries")
+                delay = self.backoff_s * (2 ** attempt) * (0.5 + random.random())
+                log_event(logger, logging.WARNING, "vlm_retry", backend=self.backend.name,
+                          attempt=attempt + 1, delay_s=round(delay, 2),
+                          error=type(exc).__name__)
+                await asyncio.sleep(delay)
+
+    async def _enqueue(self, image: Image.Image, prompt: str) -> str:
+        """Add an image to the open batch for `prompt` and wait for its text"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(prompt, [])
+        batch.append((image, future))
+        if len(batch) >= self.batch_size:
+            self._flush(prompt)
+        elif prompt not in self._timers:
+            self._timers[prompt] = loop.call_later(self.batch_window_s, self._flush, prompt)
+        return await future
+
+    def _flush(self, prompt: str):
+        timer = self._timers.pop(prompt, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(prompt, None)
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch, prompt))
+
+    async def _run_batch(self, batch: List[Tuple[Image.Image, asyncio.Future]], prompt: str):
+        try:
+            texts = await self._call([image for image, _ in batch], prompt)
+        except BaseException as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), text in zip(batch, texts):
+            if not future.done():
+                future.set_result(text)
+
+    # ------------------------------------------------------------ sync bridge
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._thread_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name="vlm-handler", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, image_input, prompt: Optional[str] = None,
+               content_hash: Optional[str] = None) -> PendingDescription:
+        """
+        Start describing an image without blocking
+
+        Returns:
+            PendingDescription; cached descriptions are already resolved
+        """
+        if isinstance(image_input, io.IOBase) or hasattr(image_input, 'read'):
+            image_input = image_input.read()  # Detach from the caller's file position
+        prompt = self.prompt_text(prompt)
+        key = self.request_key(content_hash or image_hash(image_input), prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count("requests", "cache_hits")
+            future: Future = Future()
+            future.set_result(cached)
+            return PendingDescription(key, future)
+        future = asyncio.run_coroutine_threadsafe(
+            self._describe_key(key, image_input, prompt), self._ensure_loop())
+        return PendingDescription(key, future)
+
+    def describe_sync(self, image_input, prompt: Optional[str] = None) -> str:
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(image_input, prompt).result()
+
+    def close(self):
+        """Stop the background event loop (if one was started)"""
+        with self._thread_lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout=5)
+                self._loop.close()
+                self._loop = self._thread = None
@@ -0,0 +1,43 @@
+"""
+Pattern library persistence across interrupted writes
+
+Run from the project root:
+    python -m pytest -q tests
+"""
+
+import numpy as np
+
+from src.pattern_library import PatternLibrary
+
+
+def _patterns(count, shape=(4, 4), seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 2, shape).astype(np.uint8) for _ in range(count)]
+
+
+def test_torn_index_line_does_not_lose_later_patterns(tmp_path):
+    first, *later = _patterns(4)
+    PatternLibrary(tmp_path).add(first, name="first")
+    index = tmp_path / "index.jsonl"
+    with open(index, "a") as f:
+        f.write('{"id": 1, "shape": [4, ')  # Crash mid-append
+
+    library = PatternLibrary(tmp_path)
+    assert len(library) == 1
+    library.add_many(later, names=["a", "b", "c"])
+
+    reopened = PatternLibrary(tmp_path)
+    assert [record.name for record in reopened] == ["first", "a", "b", "c"]
+    for matrix, name in zip(later, "abc"):
+        assert reopened.find(matrix).name == name
+        assert reopened.nearest(matrix)[0].record.name == name
+
+
+def test_append_after_unterminated_line(tmp_path):
+    first, second = _patterns(2)
+    PatternLibrary(tmp_path).add(first, name="first")
+    index = tmp_path / "index.jsonl"
+    index.write_bytes(index.read_bytes().rstrip(b"\n"))  # Complete record, no newline
+
+    PatternLibrary(tmp_path).add(second, name="second")
+    assert [record.name for record in PatternLibrary(tmp_path)] == ["first", "second"]